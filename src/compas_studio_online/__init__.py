@@ -1,10 +1,29 @@
 import os
-from .server import app, socketio
+
+# Heavy modules (Flask-SocketIO, jupyter_client) are imported on first use, so
+# importing the package is cheap and starts no threads.
+
+def __getattr__(name):
+    if name in ('app', 'socketio'):
+        from . import server
+        return getattr(server, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def start_server():
     """Start the compas-studio-online server."""
+    from . import startup
+    from . import server
+
     port = int(os.environ.get("PORT", 5001))
     debug = os.environ.get("FLASK_DEBUG", "True").lower() == "true"
+
+    # With debug on, werkzeug's reloader serves from a child process
+    # (WERKZEUG_RUN_MAIN set); the parent only watches files.
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        server.start_background_services()
+    startup.mark('ready')
+    timings = startup.report()
+    print(f"[Startup] Ready in {timings['total_ms']:.0f} ms: " + ", ".join(f"{k}={v:.0f}ms" for k, v in timings['phases_ms'].items()))
     
     # Use socketio.run instead of app.run to enable WebSocket support
-    socketio.run(app, host='0.0.0.0', port=port, debug=debug)
+    server.socketio.run(server.app, host='0.0.0.0', port=port, debug=debug, allow_unsafe_werkzeug=True)
@@ -0,0 +1,132 @@
+import importlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# --- AI EDIT ---
+# Code completions stream to the editor over Socket.IO:
+#
+#   client -> 'ai_edit'   {request_id, prompt, context, selection}
+#   server -> 'ai_token'  {request_id, text}                  as text is generated
+#   server -> 'ai_done'   {request_id, code, cancelled}       or 'ai_error' {request_id, error}
+#   client -> 'ai_cancel' {request_id}
+#
+# A backend is any object with stream(prompt, context, selection) yielding
+# text chunks; AI_BACKEND selects it ("mock", or "package.module:factory"
+# for a callable returning one). Completions run on their own pool of
+# AI_MAX_CONCURRENT threads, never on request or execution threads, and at
+# most AI_MAX_QUEUED more wait for a slot.
+
+AI_BACKEND = os.environ.get('AI_BACKEND', 'mock')
+AI_MAX_CONCURRENT = int(os.environ.get('AI_MAX_CONCURRENT', 2))
+AI_MAX_QUEUED = int(os.environ.get('AI_MAX_QUEUED', 16))
+AI_TIMEOUT = float(os.environ.get('AI_TIMEOUT', 120)) # seconds /api/ai_edit waits for a whole completion
+
+
+class MockBackend:
+    """Canned completions, streamed a few characters at a time like a model would."""
+
+    def __init__(self, delay=0.02, chunk=4):
+        self.delay = delay
+        self.chunk = chunk
+
+    def complete(self, prompt, context, selection):
+        if "box" in prompt.lower():
+            return "box = Box(Frame.worldXY(), 5, 5, 5)\n"
+        if "sphere" in prompt.lower():
+            return "sphere = Sphere(Point(0,0,0), 3.0)\n"
+        if "test" in prompt.lower():
+            return "# This is a test response from the AI assistant.\nprint('Hello from AI!')\n"
+        return f"# AI Generated Code for: {prompt}\n# Set AI_BACKEND to use a real model\n"
+
+    def stream(self, prompt, context, selection):
+        code = self.complete(prompt, context, selection)
+        for i in range(0, len(code), self.chunk):
+            time.sleep(self.delay)
+            yield code[i:i + self.chunk]
+
+
+def load_backend(spec=None):
+    """Build the backend selected by an AI_BACKEND spec."""
+    spec = spec or AI_BACKEND
+    if spec == 'mock':
+        return MockBackend()
+    module, _, attr = spec.partition(':')
+    if not attr:
+        raise ValueError(f"Unsupported AI_BACKEND: {spec}")
+    return getattr(importlib.import_module(module), attr)()
+
+
+class AIJobs:
+    """Running and queued completions, each cancellable by its request id."""
+
+    def __init__(self, backend, max_concurrent=AI_MAX_CONCURRENT, max_queued=AI_MAX_QUEUED):
+        self.backend = backend
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.pool = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='ai-edit')
+        self.lock = threading.Lock()
+        self.jobs = {}  # { request_id: {owner, cancelled, started} }
+        self.completed = 0
+        self.cancelled = 0
+
+    def submit(self, request_id, owner, prompt, context, selection, emit):
+        """Queue a completion; emit(event, payload) delivers its events. False if too busy."""
+        with self.lock:
+            queued = sum(1 for job in self.jobs.values() if not job['started'])
+            if request_id in self.jobs or queued >= self.max_queued:
+                return False
+            job = {'owner': owner, 'cancelled': threading.Event(), 'started': False}
+            self.jobs[request_id] = job
+        self.pool.submit(self._run, request_id, job, prompt, context, selection, emit)
+        return True
+
+    def cancel(self, request_id, owner=None):
+        with self.lock:
+            job = self.jobs.get(request_id)
+            if job is None or (owner is not None and job['owner'] != owner):
+                return False
+            job['cancelled'].set()
+            return True
+
+    def cancel_owner(self, owner):
+        """Cancel every completion of one client (e.g. on disconnect)."""
+        with self.lock:
+            for job in self.jobs.values():
+                if job['owner'] == owner:
+                    job['cancelled'].set()
+
+    def stats(self):
+        with self.lock:
+            running = sum(1 for job in self.jobs.values() if job['started'])
+            return {"backend": type(self.backend).__name__, "max_concurrent": self.max_concurrent,
+                    "running": running, "queued": len(self.jobs) - running,
+                    "completed": self.completed, "cancelled": self.cancelled}
+
+    def _run(self, request_id, job, prompt, context, selection, emit):
+        job['started'] = True
+        parts = []
+        stream = None
+        try:
+            if not job['cancelled'].is_set():
+                stream = self.backend.stream(prompt, context, selection)
+                for text in stream:
+                    if job['cancelled'].is_set():
+                        break
+                    if text:
+                        parts.append(text)
+                        emit('ai_token', {"request_id": request_id, "text": text})
+            cancelled = job['cancelled'].is_set()
+            emit('ai_done', {"request_id": request_id, "code": ''.join(parts), "cancelled": cancelled})
+        except Exception as e:
+            cancelled = False
+            print(f"[AI] Completion {request_id} failed: {e}")
+            emit('ai_error', {"request_id": request_id, "error": str(e)})
+        finally:
+            if stream is not None and hasattr(stream, 'close'):
+                stream.close() # Lets the backend drop its connection
+            with self.lock:
+                self.jobs.pop(request_id, None)
+                if cancelled: self.cancelled += 1
+                else: self.completed += 1
@@ -0,0 +1,451 @@
+import asyncio
+import contextlib
+import json
+import os
+import queue
+import time
+
+import socketio
+from jupyter_client import AsyncKernelClient
+
+from . import server
+
+# --- ASYNCIO SERVING PATH ---
+# Same editor API as server.py, but executions and Socket.IO run on one event
+# loop instead of a thread per request:
+#
+#   compas-studio-async            (or: uvicorn compas_studio_online.asgi:app)
+#
+# - /execute and the Socket.IO events are native coroutines. A run on a local
+#   Jupyter kernel goes through an AsyncKernelClient, so an in-flight run is
+#   a suspended coroutine, not a blocked OS thread.
+# - Every other route (projects, files, save, static) is the Flask app,
+#   mounted through asgiref's WSGI adapter.
+# - Kernels live in server.KERNELS, the registry of the Flask routes,
+#   hibernation and checkpoints, so both paths see the same kernels.
+# - Runs get the same limits as server._execute_in_kernel: the project's
+#   timeout, CPU budget and memory cap, interrupt/restart of runaway kernels.
+# - Project globals, exports and activity live in server.STORE, so the
+#   hibernation state files and store backends are shared with server.py.
+#
+# Needs the 'asgi' extra: pip install compas-web-viewport[asgi]
+
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+
+ASYNC_CLIENTS = {}   # { "project_id/filename": (kdata, AsyncKernelClient) } - over server.KERNELS entries
+FILE_LOCKS = {}      # { "project_id/filename": asyncio.Lock } - one run at a time per file
+PENDING_RUNS = {}    # { "project_id/filename": { payload, future } } - latest wins
+RUNNING_RUNS = {}    # { "project_id/filename": { dedupe, future } } - joined by identical requests
+WAKE_LOCKS = {}      # { project_id: asyncio.Lock }
+RUN_SLOTS = None     # asyncio.Semaphore, created on startup (needs the running loop)
+BACKGROUND_SLOTS = None # asyncio.Semaphore, caps background runs (see server.MAX_BACKGROUND_RUNS)
+
+
+# --- KERNEL MANAGEMENT ---
+async def get_kernel_async(project_id, filename):
+    """The file's kernel from server.KERNELS, started (pool, kernel host, checkpoint) on a thread."""
+    kdata = await asyncio.to_thread(server.get_kernel, project_id, filename)
+    if kdata is None:
+        raise RuntimeError(f"No kernel for {project_id}/{filename}")
+    return kdata
+
+
+def prune_async_clients():
+    """Close the clients of kernels that left the registry (hibernated, restarted, moved)."""
+    for key, (kdata, akc) in list(ASYNC_CLIENTS.items()):
+        if server.KERNELS.get(key) is not kdata:
+            del ASYNC_CLIENTS[key]
+            akc.stop_channels()
+
+
+def async_client(key, kdata):
+    """An AsyncKernelClient on the kernel of a registry entry, or None if it is not a local Jupyter kernel.
+
+    Kernel hosts and process kernels only have their blocking client.
+    """
+    prune_async_clients()
+    entry = ASYNC_CLIENTS.get(key)
+    if entry and entry[0] is kdata:
+        return entry[1]
+    connection_info = getattr(kdata['km'], 'get_connection_info', None)
+    if kdata.get('host') or connection_info is None:
+        return None
+    # Own session (ids), same key: a cloned session would repeat the blocking client's msg_ids
+    akc = AsyncKernelClient()
+    akc.load_connection_info(connection_info())
+    akc.start_channels()
+    ASYNC_CLIENTS[key] = (kdata, akc)
+    return akc
+
+
+@contextlib.asynccontextmanager
+async def exec_lock(kdata):
+    """Hold a kernel's exec_lock (a threading.Lock, shared with the threaded path) without blocking the loop."""
+    lock = kdata['exec_lock']
+    while not lock.acquire(blocking=False):
+        await asyncio.sleep(0.01)
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+# --- EXECUTION ---
+async def collect_kernel_output_async(kc, msg_id, timeout, km=None):
+    """Async server.collect_kernel_output: same result, 'timed_out' and 'kernel_died' flags."""
+    output_text_parts = []
+    error_text_parts = []
+    stream = server.OutputBuffer()
+    timed_out = kernel_died = False
+    deadline = time.monotonic() + timeout
+    next_check = time.monotonic() + 1.0
+
+    while True:
+        now = time.monotonic()
+        remaining = deadline - now
+        if remaining <= 0:
+            error_text_parts.append(f"[Server Timeout] Execution took longer than {timeout:g}s.")
+            timed_out = True
+            break
+        if km is not None and now > next_check:
+            next_check = now + 1.0
+            if not km.is_alive():
+                error_text_parts.append("[Kernel Died] The kernel process exited during execution.")
+                kernel_died = True
+                break
+        try:
+            msg = await kc.get_iopub_msg(timeout=min(remaining, 1.0))
+        except queue.Empty:
+            continue
+        except Exception as e:
+            error_text_parts.append(f"[Server Error]: {str(e)}")
+            break
+
+        if msg['parent_header'].get('msg_id') != msg_id:
+            continue
+        msg_type = msg['header']['msg_type']
+        content = msg['content']
+        if msg_type == 'stream':
+            stream.write(content['text'])
+        elif msg_type == 'execute_result':
+            if 'text/plain' in content['data']:
+                output_text_parts.append(content['data']['text/plain'])
+        elif msg_type == 'error':
+            error_text_parts.append('\n'.join(content.get('traceback', [])))
+        elif msg_type == 'status' and content['execution_state'] == 'idle':
+            break
+
+    result = server.build_result(stream, output_text_parts, error_text_parts)
+    if timed_out: result['timed_out'] = True
+    if kernel_died: result['kernel_died'] = True
+    return result
+
+
+@contextlib.asynccontextmanager
+async def run_slot(priority):
+    """A run slot; background runs first wait for one of the background slots."""
+    if priority == server.BACKGROUND:
+        async with BACKGROUND_SLOTS, RUN_SLOTS:
+            yield
+    else:
+        async with RUN_SLOTS:
+            yield
+
+
+def _prepare_run(project_id, filename, code, pre_import_code, profile, kdata, priority):
+    """Blocking setup of a run (store, project.json, worker pool, rlimits). Runs on a thread, under exec_lock."""
+    previous_exports = server.STORE.clear_file_exports(project_id, filename)
+    project_globals = server.STORE.get_globals(project_id)
+    fingerprint = server.snapshots.fingerprint(code, pre_import_code, project_globals)
+    limits = server.project_limits(project_id)
+    imports_code = code if filename == 'imports.py' else pre_import_code
+    full_code = server.build_run_code(project_globals, code, pre_import_code, profile=profile,
+                                      filename=filename, mesh_encoding=server.mesh_encoding(project_id),
+                                      cache_mb=limits['cache_mb'],
+                                      parallel=server.parallel_endpoint(project_id, kdata, code,
+                                                                        imports_code, limits))
+    if server.apply_limits(kdata, limits):
+        full_code = server.CPU_LIMIT_HANDLER + full_code
+    server.apply_priority(kdata, priority)
+    return previous_exports, fingerprint, limits, full_code
+
+
+async def _execute_in_kernel_async(project_id, filename, code, pre_import_code, profile=False,
+                                   priority=server.INTERACTIVE):
+    key = f"{project_id}/{filename}"
+    try:
+        kdata = await get_kernel_async(project_id, filename)
+    except Exception as e:
+        print(f"[Async] Error getting kernel: {e}")
+        return None
+
+    async with run_slot(priority), exec_lock(kdata):
+        # As in server._execute_in_kernel, the file's exports are only cleared
+        # once the run holds its kernel: other files keep reading them until then
+        previous_exports, fingerprint, limits, full_code = await asyncio.to_thread(
+            _prepare_run, project_id, filename, code, pre_import_code, profile, kdata, priority)
+        akc = async_client(key, kdata)
+        timeout = limits['timeout_seconds']
+        t0 = time.time()
+        if akc is not None:
+            msg_id = akc.execute(full_code)
+            result = await collect_kernel_output_async(akc, msg_id, timeout, kdata['km'])
+        else:
+            msg_id = kdata['kc'].execute(full_code)
+            result = await asyncio.to_thread(server.collect_kernel_output, kdata['kc'], msg_id,
+                                             timeout, kdata['km'])
+        timed_out = result.pop('timed_out', False)
+        kernel_died = result.pop('kernel_died', False)
+        if timed_out or kernel_died:
+            # Runaway or crashed run: free the kernel before anyone else uses it
+            outcome = await asyncio.to_thread(server.recover_kernel, key, kdata, msg_id)
+            result['error'] += f"\n[Server] The kernel was {outcome}; globals from the previous run were kept."
+
+        if timed_out or kernel_died or server.CPU_LIMIT_MESSAGE in result['error']:
+            # Stopped by a limit: keep the file's last good exports
+            await asyncio.to_thread(server.STORE.set_file_exports, project_id, filename, previous_exports)
+            print(f"[Limits] {key}: run stopped by a limit, previous exports restored")
+            result['success'] = False
+            return result
+        if profile:
+            server.attach_profile(result, (time.time() - t0) * 1000.0)
+        else:
+            result.pop('blocks', None)
+
+        if result.get('globals'):
+            await asyncio.to_thread(server.STORE.set_file_exports, project_id, filename, result['globals'])
+        server.LAST_RESULTS[key] = {'fingerprint': fingerprint, 'result': result}
+    await sio.emit('execution_result', server.shared_result(project_id, filename, result), room=project_id)
+    return result
+
+
+async def execute_async(project_id, filename, code, pre_import_code, profile=False, priority=server.INTERACTIVE):
+    """Run a file; while a run is pending for it, newer code replaces the older (latest wins).
+
+    A request identical to the run in progress shares that run's result.
+    """
+    key = f"{project_id}/{filename}"
+    dedupe = None if profile else server.run_fingerprint(project_id, filename, code, pre_import_code)
+    pending = PENDING_RUNS.get(key)
+    if pending:
+        pending['payload'] = (code, pre_import_code, profile)
+        pending['dedupe'] = dedupe
+        if priority == server.INTERACTIVE:
+            pending['priority'] = priority
+        return await asyncio.shield(pending['future'])
+
+    running = RUNNING_RUNS.get(key)
+    if dedupe is not None and running and running['dedupe'] == dedupe:
+        # Identical run in progress: share its result
+        return await asyncio.shield(running['future'])
+
+    future = asyncio.get_running_loop().create_future()
+    PENDING_RUNS[key] = {'payload': (code, pre_import_code, profile), 'dedupe': dedupe,
+                         'priority': priority, 'future': future}
+
+    async with FILE_LOCKS.setdefault(key, asyncio.Lock()):
+        # From here on newer requests queue behind us instead of replacing us
+        entry = PENDING_RUNS.pop(key)
+        RUNNING_RUNS[key] = {'dedupe': entry['dedupe'], 'future': future}
+        try:
+            result = await _execute_in_kernel_async(project_id, filename, *entry['payload'],
+                                                    priority=entry['priority'])
+        except Exception as e:
+            print(f"[Async] Error executing {filename}: {e}")
+            result = None
+        finally:
+            RUNNING_RUNS.pop(key, None)
+        future.set_result(result)
+    return result
+
+
+async def ensure_project_active_async(project_id):
+    server.update_activity(project_id)
+    if server.STORE.is_loaded(project_id):
+        return
+
+    async with WAKE_LOCKS.setdefault(project_id, asyncio.Lock()):
+        if server.STORE.is_loaded(project_id):
+            return
+        print(f"[Async] Waking up project {project_id}...")
+        server.STORE.load_project(project_id)
+        has_state = await asyncio.to_thread(server.load_project_state, project_id)
+        files = await asyncio.to_thread(server.find_project_files, project_id)
+        # Unchanged files are served from their snapshots (see server.ensure_project_active)
+        rerun = set()
+        while True:
+            fresh = await asyncio.to_thread(server.fresh_snapshots, project_id, files) if has_state else {}
+            stale = [(fname, code) for fname, code in files if fname not in fresh and fname not in rerun]
+            if not stale:
+                break
+            for fname, code in stale:
+                await execute_async(project_id, fname, code, server.pre_import_for(fname, files),
+                                    priority=server.BACKGROUND)
+                rerun.add(fname)
+
+
+# --- HIBERNATION ---
+# server.hibernation_monitor (a background service) hibernates projects from
+# the shared registry; this only closes the async clients of their kernels.
+async def client_monitor_async():
+    while True:
+        await asyncio.sleep(server.HIBERNATION_CHECK_INTERVAL)
+        prune_async_clients()
+
+
+async def on_startup():
+    global RUN_SLOTS, BACKGROUND_SLOTS
+    RUN_SLOTS = asyncio.Semaphore(server.MAX_CONCURRENT_RUNS)
+    BACKGROUND_SLOTS = asyncio.Semaphore(server.MAX_BACKGROUND_RUNS)
+    await asyncio.to_thread(server.start_background_services)
+    asyncio.get_running_loop().create_task(client_monitor_async())
+
+
+def shutdown_kernels():
+    for key, kdata in list(server.KERNELS.items()):
+        try:
+            kdata['km'].shutdown_kernel(now=True)
+        except Exception as e:
+            print(f"[Async] Error shutting down kernel {key}: {e}")
+    server.parallel.shutdown_all()
+
+
+async def on_shutdown():
+    for key, (_, akc) in list(ASYNC_CLIENTS.items()):
+        akc.stop_channels()
+    ASYNC_CLIENTS.clear()
+    await asyncio.to_thread(shutdown_kernels)
+
+
+# --- HTTP ---
+async def _read_json(receive):
+    body = b''
+    while True:
+        event = await receive()
+        body += event.get('body', b'')
+        if not event.get('more_body'):
+            break
+    return json.loads(body or b'{}')
+
+
+async def _send_json(send, payload, status=200):
+    body = json.dumps(payload).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def execute_route(scope, receive, send):
+    data = await _read_json(receive)
+    filename = data.get('filename')
+    code = data.get('code')
+    project_id = data.get('project', 'default')
+    priority = data.get('priority', server.INTERACTIVE)
+    if not filename or code is None:
+        return await _send_json(send, {"success": False, "error": "Missing filename or code"}, 400)
+    if priority not in server.PRIORITIES:
+        return await _send_json(send, {"success": False, "error": f"priority must be one of {', '.join(server.PRIORITIES)}"}, 400)
+
+    await ensure_project_active_async(project_id)
+    result = await execute_async(project_id, filename, code, data.get('pre_import_code', ''),
+                                 bool(data.get('profile', False)), priority)
+    if result:
+        await _send_json(send, result)
+    else:
+        await _send_json(send, {"success": False, "error": "Internal execution failed"}, 500)
+
+
+def _wsgi_fallback():
+    try:
+        from asgiref.wsgi import WsgiToAsgi
+    except ImportError:
+        raise RuntimeError("The async server needs asgiref: pip install compas-web-viewport[asgi]")
+    return WsgiToAsgi(server.app)
+
+
+FLASK_APP = _wsgi_fallback()
+
+
+async def http_app(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == '/execute' and scope['method'] == 'POST':
+        return await execute_route(scope, receive, send)
+    await FLASK_APP(scope, receive, send)
+
+
+async def warm_project_async(project_id):
+    """Wake a project and start kernels for the files it is likely to run."""
+    await ensure_project_active_async(project_id)
+    files = [f for f in server.likely_files(project_id) if f"{project_id}/{f}" not in server.KERNELS]
+    if files:
+        print(f"[Async] Warming kernels for {project_id}: {', '.join(files)}")
+        await asyncio.gather(*(get_kernel_async(project_id, f) for f in files), return_exceptions=True)
+
+
+# --- SOCKET EVENTS ---
+@sio.on('join')
+async def on_join(sid, data):
+    project = data.get('project')
+    if project:
+        await sio.enter_room(sid, project)
+        server.update_activity(project)
+        # Wake and warm in the background; the socket handshake does not wait for kernels
+        asyncio.get_running_loop().create_task(warm_project_async(project))
+        print(f"User joined project room: {project}")
+
+
+@sio.on('leave')
+async def on_leave(sid, data):
+    project = data.get('project')
+    if project:
+        await sio.leave_room(sid, project)
+        print(f"User left project room: {project}")
+
+
+@sio.on('code_change')
+async def on_code_change(sid, data):
+    project = data.get('project')
+    if project:
+        server.update_activity(project)
+        await sio.emit('code_update', data, room=project, skip_sid=sid)
+
+
+@sio.on('ai_edit')
+async def on_ai_edit(sid, data):
+    """Stream a completion back to the client; the backend runs on the AI thread pool."""
+    request_id = str(data.get('request_id') or '')
+    if not request_id:
+        return
+    loop = asyncio.get_running_loop()
+    def send(event, payload):
+        asyncio.run_coroutine_threadsafe(sio.emit(event, payload, to=sid), loop)
+    if not server.ai_jobs().submit(request_id, sid, data.get('prompt', ''), data.get('context', ''),
+                                   data.get('selection', ''), send):
+        await sio.emit('ai_error', {"request_id": request_id, "error": "AI is busy, try again shortly"}, to=sid)
+
+
+@sio.on('ai_cancel')
+async def on_ai_cancel(sid, data):
+    server.ai_jobs().cancel(str(data.get('request_id') or ''), sid)
+
+
+@sio.on('disconnect')
+async def on_disconnect(sid, *args):
+    if server.AI_JOBS is not None:
+        server.AI_JOBS.cancel_owner(sid)
+
+
+app = socketio.ASGIApp(sio, other_asgi_app=http_app, on_startup=on_startup, on_shutdown=on_shutdown)
+
+
+def start_async_server():
+    """Start the asyncio server (uvicorn)."""
+    try:
+        import uvicorn
+    except ImportError:
+        raise RuntimeError("The async server needs uvicorn: pip install compas-web-viewport[asgi]")
+    port = int(os.environ.get("PORT", 5001))
+    uvicorn.run(app, host='0.0.0.0', port=port, log_level='warning')
+
+
+if __name__ == '__main__':
+    start_async_server()
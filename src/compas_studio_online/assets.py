@@ -0,0 +1,215 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+
+# --- STATIC ASSETS ---
+# Only the files in ASSETS are served. build() writes a copy of each one named
+# after its content hash (editor.<hash>.js), plus .gz and, when the `brotli`
+# module is installed, .br copies, and a manifest. Pages are rewritten to load
+# the hashed scripts.
+#
+#   hashed URLs (/editor.<hash>.js)  Cache-Control: immutable, for a year
+#   pages and plain names            no-cache, revalidated with their ETag
+#
+# Run at image build time with `python -m compas_studio_online.assets`; the
+# server rebuilds on startup if the manifest does not match the sources. In
+# debug mode it also rebuilds whenever a source changes.
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS = ('index.html', 'editor.html', 'viewport.js', 'editor.js', 'app.js')
+PAGES = ('index.html', 'editor.html') # Fixed URLs, they reference the others
+BUILD_DIR = os.environ.get('ASSET_DIR') or os.path.join(SOURCE_DIR, 'build')
+MANIFEST = 'manifest.json'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz')) # In order of preference
+
+_LOCK = threading.Lock()
+_SERVED = {}   # { url name: {type, etag, cache, bodies: {encoding: bytes}} }
+_MTIMES = None # source mtimes the served assets were built from
+
+
+def _brotli():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def _hashed_name(name, digest):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}"
+
+
+def _source_digests(source_dir):
+    digests = {}
+    for name in ASSETS:
+        with open(os.path.join(source_dir, name), 'rb') as f:
+            digests[name] = _digest(f.read())
+    return digests
+
+
+def build(source_dir=SOURCE_DIR, out_dir=BUILD_DIR):
+    """Write fingerprinted and precompressed copies of every asset. Returns the manifest."""
+    os.makedirs(out_dir, exist_ok=True)
+    sources = {}
+    for name in ASSETS:
+        with open(os.path.join(source_dir, name), 'rb') as f:
+            sources[name] = f.read()
+
+    # Scripts first: pages embed their hashed names
+    outputs = {name: data for name, data in sources.items() if name not in PAGES}
+    hashed = {name: _hashed_name(name, _digest(data)) for name, data in outputs.items()}
+    for page in PAGES:
+        html = sources[page].decode('utf-8')
+        for name, target in hashed.items():
+            html = re.sub(rf'(\b(?:src|href)=")/?{re.escape(name)}(")', rf'\g<1>/{target}\g<2>', html)
+        outputs[page] = html.encode('utf-8')
+
+    brotli = _brotli()
+    files = {}
+    for name, data in outputs.items():
+        digest = _digest(data)
+        target = _hashed_name(name, digest)
+        copies = {'identity': data, 'gzip': gzip.compress(data, 9, mtime=0)}
+        if brotli:
+            copies['br'] = brotli.compress(data, quality=11)
+        encodings = []
+        for encoding, body in copies.items():
+            if encoding != 'identity' and len(body) >= len(data):
+                continue # Not worth it
+            suffix = dict(ENCODINGS).get(encoding, '')
+            with open(os.path.join(out_dir, target + suffix), 'wb') as f:
+                f.write(body)
+            if encoding != 'identity':
+                encodings.append(encoding)
+        files[name] = {"file": target, "etag": digest, "encodings": encodings,
+                       "type": mimetypes.guess_type(name)[0] or 'application/octet-stream'}
+
+    manifest = {"sources": {name: _digest(data) for name, data in sources.items()}, "files": files}
+    tmp = os.path.join(out_dir, MANIFEST + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+
+    # Drop copies of older builds
+    keep = {info['file'] + suffix for info in files.values() for suffix in ('', '.gz', '.br')}
+    for entry in os.scandir(out_dir):
+        if entry.name not in keep and entry.name != MANIFEST:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+    return manifest
+
+
+def _read_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _source_mtimes(source_dir):
+    return tuple(os.stat(os.path.join(source_dir, name)).st_mtime_ns for name in ASSETS)
+
+
+def load(source_dir=SOURCE_DIR, out_dir=BUILD_DIR):
+    """Load the built assets into memory, building them first if they are missing or stale."""
+    global _SERVED, _MTIMES
+    mtimes = _source_mtimes(source_dir)
+    manifest = _read_manifest(out_dir)
+    if not manifest or manifest.get('sources') != _source_digests(source_dir):
+        try:
+            manifest = build(source_dir, out_dir)
+        except OSError:
+            # Read-only install without a prebuilt manifest
+            out_dir = os.path.join(tempfile.gettempdir(), 'studio-assets')
+            manifest = build(source_dir, out_dir)
+        print(f"[Assets] Built {len(manifest['files'])} assets in {out_dir}")
+
+    served = {}
+    for name, info in manifest['files'].items():
+        bodies = {}
+        for encoding, suffix in (('identity', ''),) + ENCODINGS:
+            if encoding == 'identity' or encoding in info['encodings']:
+                with open(os.path.join(out_dir, info['file'] + suffix), 'rb') as f:
+                    bodies[encoding] = f.read()
+        asset = {"type": info['type'], "etag": info['etag'], "bodies": bodies}
+        # The plain name stays reachable (old pages, bookmarks) but must revalidate
+        served[name] = dict(asset, cache=REVALIDATE)
+        if name not in PAGES:
+            served[info['file']] = dict(asset, cache=IMMUTABLE)
+    _SERVED, _MTIMES = served, mtimes
+    return manifest
+
+
+def ensure_loaded(check_sources=True):
+    """Load the assets on first use; with check_sources, again after a source file changed."""
+    if _MTIMES is not None and not check_sources:
+        return
+    with _LOCK:
+        try:
+            current = _source_mtimes(SOURCE_DIR)
+        except OSError:
+            current = _MTIMES
+        if _MTIMES is None or current != _MTIMES:
+            load()
+
+
+def _accepted(accept_encoding):
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        token, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+def serve(name, accept_encoding='', if_none_match='', check_sources=False):
+    """(status, headers, body) for a listed asset, or None if `name` is not one.
+
+    check_sources (debug mode) picks up edited sources; otherwise the assets
+    loaded at startup are served as they are.
+    """
+    ensure_loaded(check_sources)
+    asset = _SERVED.get(name)
+    if asset is None:
+        return None
+    accepted = _accepted(accept_encoding)
+    encoding = next((e for e, _ in ENCODINGS if e in asset['bodies'] and (e in accepted or '*' in accepted)),
+                    'identity')
+    etag = f'"{asset["etag"]}"' if encoding == 'identity' else f'"{asset["etag"]}-{encoding}"'
+    headers = {"Cache-Control": asset['cache'], "ETag": etag, "Vary": "Accept-Encoding"}
+    tags = [t.strip().lstrip('W/').strip('"').split('-')[0] for t in (if_none_match or '').split(',')]
+    if asset['etag'] in tags or '*' in tags:
+        return 304, headers, b''
+    body = asset['bodies'][encoding]
+    headers["Content-Type"] = asset['type'] + ('; charset=utf-8' if asset['type'].startswith('text/') else '')
+    headers["Content-Length"] = str(len(body))
+    if encoding != 'identity':
+        headers["Content-Encoding"] = encoding
+    return 200, headers, body
+
+
+if __name__ == '__main__':
+    manifest = build()
+    for name, info in manifest['files'].items():
+        print(f"{name:12} -> {info['file']} ({', '.join(info['encodings']) or 'uncompressed'})")
@@ -0,0 +1,13 @@
+"""
+Load-generation benchmark for the execution path.
+
+Starts the Flask-SocketIO app in-process and drives it with simulated users:
+    python -m compas_studio_online.benchmark --users 20 --edits 30 --backend fake
+
+The 'fake' backend replaces KernelManager with an instant in-memory kernel so
+server-side overhead can be measured on its own. The 'jupyter' backend uses
+real local ipykernels, the 'process' backend plain worker processes
+(process_kernel.py); --compare runs both and prints them side by side.
+"""
+from .load import run_benchmark, format_report
+from .fake_kernel import FakeKernelManager, FakeKernelClient
@@ -0,0 +1,40 @@
+import argparse
+
+from .load import run_benchmark, format_report, format_comparison, write_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-generation benchmark for the compas-studio-online execution path.")
+    parser.add_argument('--users', type=int, default=10, help="Concurrent simulated users")
+    parser.add_argument('--edits', type=int, default=20, help="Slider edits (save + execute) per user")
+    parser.add_argument('--backend', choices=['fake', 'jupyter', 'process'], default='fake', help="Kernel backend")
+    parser.add_argument('--compare', action='store_true', help="Run the jupyter and process backends one after the other and compare them")
+    parser.add_argument('--think-time', type=float, default=0.0, help="Pause between edits (seconds)")
+    parser.add_argument('--fake-delay', type=float, default=0.0, help="Simulated compute time per run on the fake backend (seconds)")
+    parser.add_argument('--fake-meshes', type=int, default=20, help="Meshes returned per run on the fake backend")
+    parser.add_argument('--trace-memory', action='store_true', help="Also report the Python heap peak (slows the run down)")
+    parser.add_argument('--json', dest='json_path', help="Write the full report to this file")
+    args = parser.parse_args()
+
+    reports = []
+    for backend in (['jupyter', 'process'] if args.compare else [args.backend]):
+        report = run_benchmark(
+            users=args.users,
+            edits=args.edits,
+            backend=backend,
+            think_time=args.think_time,
+            fake_delay=args.fake_delay,
+            fake_meshes=args.fake_meshes,
+            trace_memory=args.trace_memory,
+        )
+        print(format_report(report))
+        print()
+        reports.append(report)
+    if len(reports) > 1:
+        print(format_comparison(reports))
+    if args.json_path:
+        write_report(reports if len(reports) > 1 else reports[0], args.json_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import json
+import queue
+import threading
+import time
+import uuid
+
+# Drop-in stand-ins for jupyter_client's KernelManager / BlockingKernelClient.
+# They implement only what server.py uses and answer every execute request
+# with a canned geometry payload, so a benchmark run with them measures the
+# server (routing, locking, code assembly, output parsing, JSON encoding)
+# and not the kernel.
+
+FAKE_MESH_COUNT = 20    # Meshes returned per run
+FAKE_DELAY = 0.0        # Simulated compute time per run (seconds)
+
+
+def _fake_geometry(count):
+    """Unit boxes laid out on a row, in the same shape kernel_utils.py emits."""
+    items = []
+    for i in range(count):
+        x = float(i)
+        vertices = [
+            [x, 0.0, 0.0], [x + 1, 0.0, 0.0], [x + 1, 1.0, 0.0], [x, 1.0, 0.0],
+            [x, 0.0, 1.0], [x + 1, 0.0, 1.0], [x + 1, 1.0, 1.0], [x, 1.0, 1.0],
+        ]
+        faces = [[0, 3, 2, 1], [4, 5, 6, 7], [0, 1, 5, 4], [1, 2, 6, 5], [2, 3, 7, 6], [3, 0, 4, 7]]
+        items.append({'name': f"boxes[{i}]", 'type': 'Mesh', 'data': {'vertices': vertices, 'faces': faces}, 'isGlobal': False})
+    return items
+
+
+class FakeKernelClient:
+    def __init__(self, manager):
+        self.manager = manager
+        self._iopub = queue.Queue()
+        self._payload = None
+
+    def start_channels(self):
+        pass
+
+    def stop_channels(self):
+        pass
+
+    def wait_for_ready(self, timeout=None):
+        pass
+
+    def execute(self, code, silent=False, **kwargs):
+        msg_id = uuid.uuid4().hex
+        threading.Thread(target=self._run, args=(msg_id,), daemon=True).start()
+        return msg_id
+
+    def _run(self, msg_id):
+        if self._payload is None:
+            self._payload = (
+                '<<<VP_DATA_START>>>\n'
+                + json.dumps(_fake_geometry(FAKE_MESH_COUNT))
+                + '\n<<<VP_DATA_END>>>\n<<<GLOBALS_START>>>\n{}\n<<<GLOBALS_END>>>\n'
+            )
+        self._emit(msg_id, 'status', {'execution_state': 'busy'})
+        if FAKE_DELAY:
+            time.sleep(FAKE_DELAY)
+        self._emit(msg_id, 'stream', {'name': 'stdout', 'text': self._payload})
+        self._emit(msg_id, 'status', {'execution_state': 'idle'})
+
+    def _emit(self, msg_id, msg_type, content):
+        self._iopub.put({
+            'header': {'msg_type': msg_type},
+            'parent_header': {'msg_id': msg_id},
+            'content': content,
+        })
+
+    def get_iopub_msg(self, timeout=None):
+        return self._iopub.get(timeout=timeout)
+
+
+class FakeKernelManager:
+    def __init__(self, kernel_name='python3', **kwargs):
+        self.kernel_name = kernel_name
+        self._alive = False
+        self._client = None
+
+    def start_kernel(self, **kwargs):
+        self._alive = True
+
+    def client(self):
+        if self._client is None:
+            self._client = FakeKernelClient(self)
+        return self._client
+
+    def is_alive(self):
+        return self._alive
+
+    def interrupt_kernel(self):
+        pass
+
+    def restart_kernel(self, now=False, **kwargs):
+        self._alive = True
+
+    def shutdown_kernel(self, now=False, restart=False):
+        self._alive = False
@@ -0,0 +1,252 @@
+import json
+import time
+import shutil
+import tempfile
+import threading
+import tracemalloc
+
+from . import fake_kernel
+from ..store import create_store
+
+# Slider-style edit target: only the '# range' value changes between runs,
+# exactly like dragging a slider with live coding on.
+SWEEP_TEMPLATE = (
+    "count = {value} # range(1, 40)\n"
+    "boxes = []\n"
+    "for i in range(count):\n"
+    "    boxes.append(Box(1, 1, 1, Frame(Point(i * 1.5, 0, 0))))\n"
+    "glb_count = count\n"
+)
+
+IMPORTS_CODE = "from compas.geometry import Box, Frame, Point, Vector\nimport math\n"
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list (ms)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def read_rss(pid='self'):
+    """Current and peak resident set size (bytes) of a process, from /proc."""
+    rss, peak = 0, 0
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith('VmHWM:'):
+                    peak = int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return rss, peak
+
+
+def kernel_pids(server):
+    pids = []
+    for kdata in list(server.KERNELS.values()):
+        try:
+            pid = kdata['km'].provisioner.pid
+        except AttributeError:
+            continue
+        if pid:
+            pids.append(pid)
+    return pids
+
+
+class Recorder:
+    """Thread-safe latency sink, grouped by operation name."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}   # { op: [ms, ...] }
+        self.errors = {}    # { op: count }
+
+    def record(self, op, elapsed, ok):
+        with self.lock:
+            self.samples.setdefault(op, []).append(elapsed * 1000.0)
+            if not ok:
+                self.errors[op] = self.errors.get(op, 0) + 1
+
+    def timed(self, op, fn):
+        start = time.perf_counter()
+        ok = False
+        try:
+            resp = fn()
+            ok = resp.status_code < 400
+            return resp
+        finally:
+            self.record(op, time.perf_counter() - start, ok)
+
+
+def simulate_user(server, recorder, user_index, edits, think_time, barrier):
+    client = server.app.test_client()
+    sio = server.socketio.test_client(server.app, flask_test_client=client)
+
+    barrier.wait()
+
+    resp = recorder.timed('create', lambda: client.post('/projects/create', json={"name": f"bench-{user_index}"}))
+    key = resp.get_json().get('key')
+    if not key:
+        return
+    sio.emit('join', {"project": key})
+
+    recorder.timed('files', lambda: client.get(f"/project/{key}/files"))
+
+    for step in range(edits):
+        code = SWEEP_TEMPLATE.format(value=1 + (step * 7 + user_index) % 39)
+
+        # Live edit broadcast, then autosave, then the live-coding run
+        sio.emit('code_change', {"project": key, "filename": "sweep.py", "content": code})
+        recorder.timed('save', lambda: client.post(f"/project/{key}/save", json={"filename": "sweep.py", "content": code}))
+        recorder.timed('execute', lambda: client.post('/execute', json={
+            "filename": "sweep.py",
+            "code": code,
+            "pre_import_code": IMPORTS_CODE,
+            "project": key,
+        }))
+
+        if step % 5 == 4:
+            recorder.timed('files', lambda: client.get(f"/project/{key}/files"))
+        if think_time:
+            time.sleep(think_time)
+
+    sio.emit('leave', {"project": key})
+    sio.disconnect()
+
+
+def run_benchmark(users=10, edits=20, backend='fake', think_time=0.0, fake_delay=0.0,
+                  fake_meshes=20, trace_memory=False):
+    """Drive the in-process app with concurrent simulated users and return a report dict."""
+    from .. import server
+
+    projects_dir = tempfile.mkdtemp(prefix='compas-bench-')
+    original_projects_dir = server.PROJECTS_DIR
+    original_km = server.KernelManager
+    # Caches of the real projects dir (catalog, sweeps, last results, globals) are set aside
+    original_state = (server.CATALOG, server.SWEEP_STORES, server.LAST_RESULTS, server.STORE)
+    server.PROJECTS_DIR = projects_dir
+    server.CATALOG = None
+    server.SWEEP_STORES = {}
+    server.LAST_RESULTS = {}
+    server.STORE = create_store(None)
+
+    if backend == 'fake':
+        fake_kernel.FAKE_DELAY = fake_delay
+        fake_kernel.FAKE_MESH_COUNT = fake_meshes
+        server.KernelManager = fake_kernel.FakeKernelManager
+    elif backend == 'process':
+        from ..process_kernel import ProcessKernelManager
+        server.KernelManager = ProcessKernelManager
+    elif backend == 'jupyter':
+        from jupyter_client import KernelManager
+        server.KernelManager = KernelManager
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+
+    if trace_memory:
+        tracemalloc.start()
+
+    recorder = Recorder()
+    barrier = threading.Barrier(users)
+    rss_before, _ = read_rss()
+    kernel_rss = 0
+
+    print(f"[Bench] {users} users x {edits} edits on '{backend}' kernels...")
+    start = time.perf_counter()
+    try:
+        threads = [
+            threading.Thread(target=simulate_user, args=(server, recorder, i, edits, think_time, barrier), daemon=True)
+            for i in range(users)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - start
+
+        # Measure kernels before they are torn down
+        kernel_rss = sum(read_rss(pid)[0] for pid in kernel_pids(server))
+    finally:
+        server.shutdown_all_kernels()
+        server.KernelManager = original_km
+        server.PROJECTS_DIR = original_projects_dir
+        server.CATALOG, server.SWEEP_STORES, server.LAST_RESULTS, server.STORE = original_state
+        shutil.rmtree(projects_dir, ignore_errors=True)
+
+    rss_after, rss_peak = read_rss()
+    traced_peak = None
+    if trace_memory:
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    total = sum(len(v) for v in recorder.samples.values())
+    report = {
+        "backend": backend,
+        "users": users,
+        "edits": edits,
+        "wall_seconds": wall,
+        "requests": total,
+        "throughput_rps": total / wall if wall else 0.0,
+        "operations": {},
+        "memory": {
+            "server_rss_before": rss_before,
+            "server_rss_after": rss_after,
+            "server_rss_peak": rss_peak,
+            "kernel_rss_total": kernel_rss,
+            "traced_peak": traced_peak,
+        },
+    }
+    for op, values in sorted(recorder.samples.items()):
+        report["operations"][op] = {
+            "count": len(values),
+            "errors": recorder.errors.get(op, 0),
+            "p50_ms": percentile(values, 50),
+            "p95_ms": percentile(values, 95),
+            "p99_ms": percentile(values, 99),
+            "max_ms": max(values),
+        }
+    return report
+
+
+def format_report(report):
+    mb = lambda b: f"{(b or 0) / (1024 * 1024):.1f} MB"
+    lines = [
+        f"backend={report['backend']} users={report['users']} edits={report['edits']}",
+        f"wall={report['wall_seconds']:.2f}s requests={report['requests']} throughput={report['throughput_rps']:.1f} req/s",
+        "",
+        f"{'operation':<12}{'count':>8}{'errors':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}",
+    ]
+    for op, s in report["operations"].items():
+        lines.append(
+            f"{op:<12}{s['count']:>8}{s['errors']:>8}{s['p50_ms']:>9.1f}ms{s['p95_ms']:>8.1f}ms{s['p99_ms']:>8.1f}ms{s['max_ms']:>8.1f}ms"
+        )
+    mem = report["memory"]
+    lines.append("")
+    lines.append(f"server rss: {mb(mem['server_rss_before'])} -> {mb(mem['server_rss_after'])} (peak {mb(mem['server_rss_peak'])})")
+    lines.append(f"kernel rss (total): {mb(mem['kernel_rss_total'])}")
+    if mem.get('traced_peak') is not None:
+        lines.append(f"python heap peak (tracemalloc): {mb(mem['traced_peak'])}")
+    return "\n".join(lines)
+
+
+def format_comparison(reports):
+    """Side-by-side latencies and kernel memory of runs on different backends."""
+    mb = lambda b: f"{(b or 0) / (1024 * 1024):.1f} MB"
+    names = [r['backend'] for r in reports]
+    lines = [f"{'':<20}" + ''.join(f"{n:>14}" for n in names)]
+    for op in ('execute', 'save', 'files'):
+        for stat in ('p50_ms', 'p95_ms'):
+            cells = [r['operations'].get(op, {}).get(stat) for r in reports]
+            lines.append(f"{op + ' ' + stat[:3]:<20}" + ''.join(f"{c:>12.1f}ms" if c is not None else f"{'-':>14}" for c in cells))
+    lines.append(f"{'throughput':<20}" + ''.join(f"{r['throughput_rps']:>10.1f} r/s" for r in reports))
+    lines.append(f"{'kernel rss':<20}" + ''.join(f"{mb(r['memory']['kernel_rss_total']):>14}" for r in reports))
+    return "\n".join(lines)
+
+
+def write_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
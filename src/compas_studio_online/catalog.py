@@ -0,0 +1,147 @@
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+
+# --- PROJECT CATALOG ---
+# An index of the projects in PROJECTS_DIR, in PROJECTS_DIR/.catalog.sqlite,
+# so listing projects and picking a key for a new one touch neither the
+# directory nor any project.json:
+#
+#   projects    key, name, created          indexed for sorted, paged listing
+#   free_keys   every unused 5-digit key, in random order; a new project
+#               takes the first one, a deleted project's key goes to the end
+#
+# create / rename / delete keep it in sync. rebuild() recreates it from disk;
+# it runs when the catalog is new, or with `python -m compas_studio_online.catalog`.
+
+CATALOG_DB = '.catalog.sqlite'
+KEY_RANGE = range(10000, 100000) # Project keys are 5 digits
+SORTS = {'created': 'created', 'name': 'name COLLATE NOCASE', 'key': 'key'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (key TEXT PRIMARY KEY, name TEXT NOT NULL, created REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS projects_created ON projects (created);
+CREATE INDEX IF NOT EXISTS projects_name ON projects (name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS free_keys (slot INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def read_project(path):
+    """(name, created) of a project directory from its project.json, falling back to the directory."""
+    name, created = os.path.basename(path), None
+    try:
+        with open(os.path.join(path, 'project.json'), 'r') as f:
+            meta = json.load(f)
+        name = meta.get('name') or name
+        created = meta.get('created')
+    except (OSError, ValueError, AttributeError):
+        pass
+    if not isinstance(created, (int, float)):
+        created = os.stat(path).st_ctime
+    return str(name), float(created)
+
+
+class ProjectCatalog:
+    def __init__(self, projects_dir):
+        self.projects_dir = projects_dir
+        self.path = os.path.join(projects_dir, CATALOG_DB)
+        self.local = threading.local()
+        os.makedirs(projects_dir, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+            built = conn.execute("SELECT value FROM meta WHERE name = 'built'").fetchone()
+        if not built:
+            self.rebuild()
+
+    def _conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.row_factory = sqlite3.Row
+            self.local.conn = conn
+        return conn
+
+    def rebuild(self):
+        """Re-index every project directory and refill the free keys. Returns the project count."""
+        projects = []
+        for entry in os.scandir(self.projects_dir):
+            if entry.is_dir() and not entry.name.startswith('.'):
+                projects.append((entry.name, *read_project(entry.path)))
+        used = {key for key, _, _ in projects}
+        free = [str(k) for k in KEY_RANGE if str(k) not in used]
+        random.shuffle(free)
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM projects")
+            conn.execute("DELETE FROM free_keys")
+            conn.executemany("INSERT INTO projects (key, name, created) VALUES (?, ?, ?)", projects)
+            conn.executemany("INSERT INTO free_keys (key) VALUES (?)", ((k,) for k in free))
+            conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('built', ?)", (str(len(projects)),))
+        print(f"[Catalog] Indexed {len(projects)} projects, {len(free)} free keys")
+        return len(projects)
+
+    def allocate_key(self):
+        """Take an unused project key, or None when all are taken."""
+        conn = self._conn()
+        while True:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE") # Worker processes share the catalog
+                row = conn.execute("SELECT slot, key FROM free_keys ORDER BY slot LIMIT 1").fetchone()
+                if row is None:
+                    return None
+                conn.execute("DELETE FROM free_keys WHERE slot = ?", (row['slot'],))
+            # A directory made behind the catalog's back keeps its key
+            if not os.path.exists(os.path.join(self.projects_dir, row['key'])):
+                return row['key']
+
+    def release_key(self, key):
+        """Give back a key that did not become a project (or no longer is one)."""
+        with self._conn() as conn:
+            conn.execute("INSERT OR IGNORE INTO free_keys (key) VALUES (?)", (key,))
+
+    def add(self, key, name, created):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO projects (key, name, created) VALUES (?, ?, ?)",
+                         (key, name, created))
+            conn.execute("DELETE FROM free_keys WHERE key = ?", (key,))
+
+    def rename(self, key, name):
+        with self._conn() as conn:
+            if conn.execute("UPDATE projects SET name = ? WHERE key = ?", (name, key)).rowcount == 0:
+                conn.execute("INSERT INTO projects (key, name, created) VALUES (?, ?, ?)",
+                             (key, *read_project(os.path.join(self.projects_dir, key))))
+
+    def remove(self, key):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM projects WHERE key = ?", (key,))
+        if key.isdigit() and int(key) in KEY_RANGE:
+            self.release_key(key)
+
+    def list(self, offset=0, limit=None, sort='created', descending=True, query=None):
+        """(total, [{key, name, created}]) of the projects matching `query`, one page of them."""
+        where, args = "", []
+        if query:
+            pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            where = " WHERE name LIKE ? ESCAPE '\\' OR key LIKE ? ESCAPE '\\'"
+            args = [pattern, pattern]
+        conn = self._conn()
+        total = conn.execute("SELECT COUNT(*) FROM projects" + where, args).fetchone()[0]
+        order = f"{SORTS.get(sort, SORTS['created'])} {'DESC' if descending else 'ASC'}, key"
+        sql = f"SELECT key, name, created FROM projects{where} ORDER BY {order} LIMIT ? OFFSET ?"
+        rows = conn.execute(sql, args + [-1 if limit is None else limit, offset]).fetchall()
+        return total, [dict(row) for row in rows]
+
+    def free_keys(self):
+        return self._conn().execute("SELECT COUNT(*) FROM free_keys").fetchone()[0]
+
+
+if __name__ == '__main__':
+    projects_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                       'projects')
+    ProjectCatalog(projects_dir).rebuild()
@@ -0,0 +1,45 @@
+import hashlib
+import os
+
+# --- NAMESPACE CHECKPOINTS ---
+# On hibernate each live kernel pickles its user namespace to
+# projects/<id>/.checkpoints/<file>.pkl (kernel_checkpoint.py), together
+# with the hash of the code that produced it. The next kernel started for
+# that file restores it before its first run; if that run's code has the same
+# hash, the run skips the namespace reset, so scripts that reuse existing
+# globals (`if 'mesh' not in globals(): ...`) do not recompute them after a
+# wake. Otherwise the reset drops the restored names as usual. A checkpoint
+# is consumed by its restore.
+#
+# The kernel writes and reads the file itself, so with KERNEL_HOSTS the
+# projects directory has to be shared with the hosts.
+
+CHECKPOINT_DIR = '.checkpoints'
+CHECKPOINT_CODE = None
+
+
+def code_hash(code, pre_import_code):
+    """Identifies the code a kernel namespace was built by (see build_run_code)."""
+    return hashlib.sha256(f"{pre_import_code}\0{code}".encode('utf-8')).hexdigest()[:24]
+
+
+def path_for(project_dir, filename):
+    name = hashlib.sha256(filename.encode('utf-8')).hexdigest()[:24] + '.pkl'
+    return os.path.abspath(os.path.join(project_dir, CHECKPOINT_DIR, name))
+
+
+def get_checkpoint_code():
+    global CHECKPOINT_CODE
+    if CHECKPOINT_CODE is None:
+        with open(os.path.join(os.path.dirname(__file__), 'kernel_checkpoint.py'), 'r') as f:
+            CHECKPOINT_CODE = f.read()
+    return CHECKPOINT_CODE
+
+
+def save_code(path):
+    """Kernel code that writes the checkpoint and reports it in a CHECKPOINT block."""
+    return get_checkpoint_code() + f"\n_vp_checkpoint_report(_vp_checkpoint_save, {path!r})\n"
+
+
+def restore_code(path):
+    return get_checkpoint_code() + f"\n_vp_checkpoint_report(_vp_checkpoint_restore, {path!r})\n"
@@ -0,0 +1,123 @@
+import ast
+import re
+
+# --- FILE DEPENDENCIES ---
+# Files share data only through glb_ globals, so the run order of a project
+# follows from which file assigns a glb_ name and which files read it.
+# imports.py runs before everything else.
+
+GLOBAL_PREFIX = 'glb_'
+GLOBAL_NAME = re.compile(r'\bglb_\w+')
+IMPORTS_FILE = 'imports.py'
+
+
+def global_names(code):
+    """(produced, consumed) glb_ names of a source file."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        # Unparseable files still run; read every mention conservatively
+        names = set(GLOBAL_NAME.findall(code))
+        return set(), names
+
+    produced, consumed = set(), set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id.startswith(GLOBAL_PREFIX):
+            if isinstance(node.ctx, ast.Load):
+                consumed.add(node.id)
+            else:
+                produced.add(node.id)
+        elif isinstance(node, ast.Global):
+            produced.update(n for n in node.names if n.startswith(GLOBAL_PREFIX))
+    # A file reading its own glb_ names does not depend on anyone for them
+    return produced, consumed - produced
+
+
+def build_graph(files):
+    """{ filename: set(filenames it waits for) } for [(filename, code)].
+
+    Every file waits for imports.py. Cycles are broken by keeping, inside
+    each cycle, only the edges that point to files earlier in the given order.
+    """
+    order = {fname: i for i, (fname, _) in enumerate(files)}
+    names = {fname: global_names(code) for fname, code in files}
+    producers = {}
+    for fname, (produced, _) in names.items():
+        for name in produced:
+            producers.setdefault(name, set()).add(fname)
+
+    graph = {}
+    for fname, (_, consumed) in names.items():
+        deps = set()
+        for name in consumed:
+            deps |= producers.get(name, set())
+        deps.discard(fname)
+        if fname != IMPORTS_FILE and IMPORTS_FILE in order:
+            deps.add(IMPORTS_FILE)
+        graph[fname] = deps
+
+    # Break cycles: drop back edges (to later files) between files of the same
+    # strongly connected component; files that merely depend on a cycle keep theirs
+    component = _components(graph)
+    for fname, deps in graph.items():
+        graph[fname] = {d for d in deps if component[d] != component[fname] or order[d] < order[fname]}
+    return graph
+
+
+def _components(graph):
+    """{ filename: root of its strongly connected component } (Tarjan's algorithm, iterative)."""
+    index, low, component = {}, {}, {}
+    stack, on_stack = [], set()
+    for root in graph:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph[root]))]
+        while work:
+            node, deps = work[-1]
+            for dep in deps:
+                if dep not in index:
+                    index[dep] = low[dep] = len(index)
+                    stack.append(dep)
+                    on_stack.add(dep)
+                    work.append((dep, iter(graph[dep])))
+                    break
+                if dep in on_stack:
+                    low[node] = min(low[node], index[dep])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component[member] = node
+                        if member == node:
+                            break
+    return component
+
+
+def critical_path(graph, durations):
+    """(path, total) of the slowest dependency chain, by measured durations."""
+    finish, via = {}, {}
+
+    def _finish(fname):
+        if fname not in finish:
+            deps = [d for d in graph.get(fname, ()) if d in durations]
+            prev = max(deps, key=_finish, default=None)
+            via[fname] = prev
+            finish[fname] = durations.get(fname, 0.0) + (_finish(prev) if prev else 0.0)
+        return finish[fname]
+
+    if not durations:
+        return [], 0.0
+    last = max(durations, key=_finish)
+    path, node = [], last
+    while node:
+        path.append(node)
+        node = via[node]
+    return path[::-1], finish[last]
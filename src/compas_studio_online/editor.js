@@ -73,9 +73,23 @@ const App = {
 
         // --- SOCKET SETUP ---
         if (typeof io !== 'undefined') {
-            this.socket = io();
+            // Websocket only: with several server workers there are no sticky sessions for polling
+            this.socket = io({ transports: ['websocket'] });
             this.socket.on('connect', () => console.log("Connected to WebSocket"));
             
+            this.socket.on('execution_result', (data) => {
+                // A run of this project finished (someone else's, or ours shared with the room)
+                if (data.project !== this.state.currentProjectName) return;
+                const node = this.findNodeByPath(data.filename);
+                if (!node || node.isRunning || node.lastRunId === data.result.run_id) return;
+                this.showRunResult(data.filename, node, data.result);
+            });
+
+            // Streamed AI completions (see runAICode)
+            this.socket.on('ai_token', (data) => this.onAIToken(data));
+            this.socket.on('ai_done', (data) => this.onAIDone(data));
+            this.socket.on('ai_error', (data) => this.onAIError(data));
+
             this.socket.on('code_update', (data) => {
                 // Ignore updates for other projects
                 if (data.project !== this.state.currentProjectName) return;
@@ -119,9 +133,6 @@ const App = {
         this.setupNavigation();
         
         console.log("System initialized.");
-
-        // Warmup
-        this.warmupKernel();
     },
 
     async loadProject(projectId) {
@@ -152,14 +163,16 @@ const App = {
                     });
                 });
                 this.viewport.fileObjects.clear();
+                this.viewport.fileIndex.clear();
             }
         }
 
         this.state.currentProjectName = projectId;
         console.log("Loading Project:", projectId);
         
-        // Join Socket Room
+        // Join Socket Room (the server warms kernels for the likely files on join)
         if (this.socket) this.socket.emit('join', { project: projectId });
+        else fetch(`/project/${encodeURIComponent(projectId)}/warm`, { method: 'POST' }).catch(() => {});
         
         // Load file structure from server
         await this.loadProjectFiles(projectId);
@@ -255,6 +268,7 @@ const App = {
 
                 this.state.root = newRoot;
                 this.renderExplorer();
+                await this.loadSnapshots();
                 this.runImports();
                 
                 // Load workspace state
@@ -270,6 +284,26 @@ const App = {
     },
 
 
+    async loadSnapshots() {
+        // Last output and geometry of unchanged files, shown before any kernel runs
+        try {
+            const res = await fetch(`/project/${encodeURIComponent(this.state.currentProjectName)}/snapshots`);
+            const data = await res.json();
+            if (!data.success) return;
+
+            Object.entries(data.files || {}).forEach(([path, result]) => {
+                const node = this.findNodeByPath(path);
+                if (!node) return;
+                let outText = result.output || "";
+                if (result.error) outText += `\n[Error]\n${result.error}`;
+                node.lastOutput = outText;
+                if (this.viewport) this.viewport.updateFileGeometry(path, result.geometry || [], result.spatial);
+            });
+        } catch (e) {
+            console.warn("Loading snapshots failed (non-critical):", e);
+        }
+    },
+
     async loadWorkspaceState() {
         if (!this.state.currentProjectName) return;
         try {
@@ -365,25 +399,6 @@ const App = {
         }
     },
 
-    async warmupKernel() {
-        console.log("Warming up kernel...");
-        try {
-            await fetch('/execute', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ 
-                    filename: 'warmup.py', 
-                    code: 'print("Kernel Warnup")', 
-                    pre_import_code: '',
-                    project: this.state.currentProjectName
-                })
-            });
-            console.log("Kernel warmed up.");
-        } catch (e) {
-            console.warn("Kernel warmup failed (non-critical):", e);
-        }
-    },
-
     async runImports() {
         console.log("Running imports...");
         const importsFile = this.state.root.children.find(child => child.name === 'imports.py');
@@ -522,7 +537,14 @@ const App = {
         importBtn.className = 'icon-btn';
         importBtn.onclick = () => this.importFile();
 
-        actions.append(newFileBtn, newFolderBtn, importBtn);
+        // Run All
+        const runAllBtn = document.createElement('span');
+        runAllBtn.innerText = '▶▶ ';
+        runAllBtn.title = "Run All Files";
+        runAllBtn.className = 'icon-btn';
+        runAllBtn.onclick = () => this.runProject();
+
+        actions.append(newFileBtn, newFolderBtn, importBtn, runAllBtn);
         toolbar.append(navContainer, actions);
         wrapper.appendChild(toolbar);
     },
@@ -1870,25 +1892,7 @@ const App = {
             });
 
             const data = await response.json();
-
-            // Handle Output
-            let outText = data.output || "";
-            
-            if (data.error) {
-                outText += `\n[Error]\n${data.error}`;
-                if (outElem) outElem.classList.add('error');
-            } else {
-                 if (outElem) outElem.classList.add('success');
-            }
-            
-            // Persist output state
-            node.lastOutput = outText;
-            if (outElem) outElem.innerText = outText || "[No output]";
-            
-            // Update 3D View
-            if (this.viewport) {
-                this.viewport.updateFileGeometry(path, data.geometry || []);
-            }
+            this.showRunResult(path, node, data);
 
         } catch (err) {
             if (outElem) {
@@ -1904,6 +1908,86 @@ const App = {
         }
     },
 
+    showRunResult(path, node, data) {
+        if (data.run_id) node.lastRunId = data.run_id;
+        const safeId = path.replace(/[^a-zA-Z0-9]/g, '_');
+        const outElem = document.getElementById(`output-${safeId}`);
+
+        // Handle Output
+        let outText = data.output || "";
+        
+        if (outElem) outElem.className = 'file-output';
+        if (data.error) {
+            outText += `\n[Error]\n${data.error}`;
+            if (outElem) outElem.classList.add('error');
+        } else {
+             if (outElem) outElem.classList.add('success');
+        }
+        if (data.cache) {
+            const c = data.cache;
+            outText += `\n[Cache] ${c.hits} hits, ${c.misses} misses, ${c.entries} entries (${(c.bytes / 1048576).toFixed(1)} MB)`;
+        }
+
+        // Persist output state
+        node.lastOutput = outText;
+        if (outElem) outElem.innerText = outText || "[No output]";
+        
+        // Update 3D View
+        if (this.viewport) {
+            this.viewport.updateFileGeometry(path, data.geometry || [], data.spatial);
+        }
+    },
+
+    async runProject() {
+        // Run every file on the server in dependency order; results stream back per file
+        if (!this.state.currentProjectName) return;
+
+        // Send unsaved editor contents along
+        const code = {};
+        Object.entries(this.state.editors).forEach(([path, editor]) => { code[path] = editor.getValue(); });
+
+        this.showNotification("Running project...", 'info');
+        try {
+            const res = await fetch(`/project/${encodeURIComponent(this.state.currentProjectName)}/run`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ code })
+            });
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                let newline;
+                while ((newline = buffer.indexOf('\n')) >= 0) {
+                    const line = buffer.slice(0, newline);
+                    buffer = buffer.slice(newline + 1);
+                    if (line.trim()) this.onProjectRunEvent(JSON.parse(line));
+                }
+            }
+        } catch (e) {
+            console.error("Project run failed:", e);
+            this.showNotification(`Project run failed: ${e.message}`, 'error');
+        }
+    },
+
+    onProjectRunEvent(event) {
+        if (event.type === 'file') {
+            const node = this.findNodeByPath(event.filename);
+            if (node) this.showRunResult(event.filename, node, event.result || {});
+        } else if (event.type === 'done') {
+            const c = event.counts;
+            const path = event.critical_path.files.join(' → ');
+            console.log(`Project run: ${event.total_ms} ms (serial ${event.serial_ms} ms), critical path ${path}`);
+            this.showNotification(`Ran ${c.ok + c.error} files in ${(event.total_ms / 1000).toFixed(1)}s` +
+                (c.error || c.skipped ? ` (${c.error} failed, ${c.skipped} skipped)` : ''), c.error ? 'warning' : 'success');
+        } else if (event.type === 'error') {
+            this.showNotification(event.error, 'error');
+        }
+    },
+
     // Window Setup for Splitter is already in init() -> setupSplitter()
 
     setupSplitter() {
@@ -2157,13 +2241,132 @@ App.runAICode = async function(editor, prompt) {
     if (!prompt) return;
     
     this.closeAIWidget(editor);
-    this.showNotification("Asking AI...", 'info');
     
     const model = editor.getModel();
     const selection = editor.getSelection();
     const context = model.getValue();
     const selectedText = model.getValueInRange(selection);
-    
+
+    if (!this.socket) return this.runAICodeOnce(editor, prompt, context, selection, selectedText);
+    if (this._aiJob) this.cancelAICode();
+
+    // Tokens replace the selection (or go in at the cursor) as they arrive
+    const start = selection.isEmpty() ? editor.getPosition() : selection.getStartPosition();
+    if (!selection.isEmpty()) {
+        editor.executeEdits('ai-edit', [{ range: selection, text: '', forceMoveMarkers: true }]);
+    }
+    const job = {
+        id: Date.now().toString(36) + Math.random().toString(36).slice(2, 8),
+        editor: editor,
+        model: model,
+        offset: model.getOffsetAt(start),
+        length: 0,
+        cancelled: false
+    };
+    this._aiJob = job;
+    this.showAIProgress(editor, start);
+    this.socket.emit('ai_edit', { request_id: job.id, prompt, context, selection: selectedText });
+};
+
+App.onAIToken = function(data) {
+    const job = this._aiJob;
+    if (!job || job.id !== data.request_id || job.cancelled) return;
+    if (job.model.isDisposed()) return this.cancelAICode();
+
+    const pos = job.model.getPositionAt(job.offset + job.length);
+    const before = job.model.getValueLength();
+    job.model.pushEditOperations([], [{
+        range: new monaco.Range(pos.lineNumber, pos.column, pos.lineNumber, pos.column),
+        text: data.text,
+        forceMoveMarkers: true
+    }], () => null);
+    job.length += job.model.getValueLength() - before;
+};
+
+App.onAIDone = function(data) {
+    const job = this._aiJob;
+    if (!job || job.id !== data.request_id) return;
+    this.finishAICode();
+    if (data.cancelled) {
+        this.showNotification("AI Generation Stopped", 'info');
+    } else if (data.code) {
+        this.showNotification("AI Generation Complete", 'success');
+    } else {
+        this.showNotification("AI returned no code", 'warning');
+    }
+};
+
+App.onAIError = function(data) {
+    const job = this._aiJob;
+    if (!job || job.id !== data.request_id) return;
+    this.finishAICode();
+    this.showNotification("AI Error: " + data.error, 'error');
+};
+
+App.cancelAICode = function() {
+    const job = this._aiJob;
+    if (!job) return;
+    job.cancelled = true;
+    if (this.socket) this.socket.emit('ai_cancel', { request_id: job.id });
+    this.finishAICode();
+};
+
+App.finishAICode = function() {
+    const job = this._aiJob;
+    if (!job) return;
+    if (this._aiProgress) {
+        job.editor.removeContentWidget(this._aiProgress);
+        this._aiProgress = null;
+    }
+    this._aiJob = null;
+};
+
+App.showAIProgress = function(editor, position) {
+    const domNode = document.createElement('div');
+    domNode.className = 'ai-widget';
+    domNode.style.background = '#ffffff';
+    domNode.style.border = '1px solid #007acc';
+    domNode.style.boxShadow = '0 2px 8px rgba(0,0,0,0.15)';
+    domNode.style.padding = '4px 8px';
+    domNode.style.borderRadius = '4px';
+    domNode.style.display = 'flex';
+    domNode.style.alignItems = 'center';
+    domNode.style.gap = '8px';
+    domNode.style.fontSize = '11px';
+    domNode.style.color = '#007acc';
+
+    const label = document.createElement('span');
+    label.innerText = '✨ Generating...';
+
+    const stopBtn = document.createElement('button');
+    stopBtn.innerText = 'Stop';
+    stopBtn.style.padding = '2px 8px';
+    stopBtn.style.background = '#f0f0f0';
+    stopBtn.style.border = '1px solid #ccc';
+    stopBtn.style.borderRadius = '2px';
+    stopBtn.style.cursor = 'pointer';
+    stopBtn.onclick = () => this.cancelAICode();
+
+    domNode.append(label, stopBtn);
+
+    const widget = {
+        getId: () => 'ai.progress.widget',
+        getDomNode: () => domNode,
+        getPosition: () => {
+            return {
+                position: position,
+                preference: [monaco.editor.ContentWidgetPositionPreference.ABOVE]
+            };
+        }
+    };
+
+    this._aiProgress = widget;
+    editor.addContentWidget(widget);
+};
+
+App.runAICodeOnce = async function(editor, prompt, context, selection, selectedText) {
+    // Without a socket: one request, the whole completion at once
+    this.showNotification("Asking AI...", 'info');
     try {
         const response = await fetch('/api/ai_edit', {
             method: 'POST',
@@ -2191,6 +2394,8 @@ App.runAICode = async function(editor, prompt) {
              }]);
              
              this.showNotification("AI Generation Complete", 'success');
+        } else if (data.error) {
+             this.showNotification("AI Error: " + data.error, 'error');
         } else {
              this.showNotification("AI returned no code", 'warning');
         }
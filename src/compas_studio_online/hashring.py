@@ -0,0 +1,56 @@
+import bisect
+import hashlib
+import threading
+
+# Consistent hash ring used to place projects on kernel hosts.
+# Each host gets VNODES points on the ring; a project belongs to the first
+# point clockwise from hash(project_id). Adding or removing a host only moves
+# the projects that land on its points.
+
+VNODES = 64
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    def __init__(self, nodes=(), vnodes=VNODES):
+        self.vnodes = vnodes
+        self.lock = threading.Lock()
+        self.points = []  # sorted hashes
+        self.owners = {}  # { hash: node }
+        self.nodes = set()
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        with self.lock:
+            if node in self.nodes:
+                return
+            self.nodes.add(node)
+            for i in range(self.vnodes):
+                h = _hash(f"{node}#{i}")
+                self.owners[h] = node
+                bisect.insort(self.points, h)
+
+    def remove(self, node):
+        with self.lock:
+            if node not in self.nodes:
+                return
+            self.nodes.discard(node)
+            for i in range(self.vnodes):
+                h = _hash(f"{node}#{i}")
+                if self.owners.get(h) == node:
+                    del self.owners[h]
+                    idx = bisect.bisect_left(self.points, h)
+                    if idx < len(self.points) and self.points[idx] == h:
+                        self.points.pop(idx)
+
+    def get(self, key):
+        """Node responsible for key, or None if the ring is empty."""
+        with self.lock:
+            if not self.points:
+                return None
+            idx = bisect.bisect(self.points, _hash(key)) % len(self.points)
+            return self.owners[self.points[idx]]
@@ -0,0 +1,73 @@
+
+import re
+import json
+import types
+import pickle
+import importlib
+
+# This code is injected into the Jupyter Kernel to save or restore the
+# user namespace when a project hibernates (see checkpoints.py). The hash of
+# the code of the last run is saved with it; restoring sets _vp_restored_hash
+# so the next run of the same code keeps the restored names.
+# Picklable values are stored by value, modules by name. Functions and
+# classes defined in user code cannot be restored without their source and
+# are listed as skipped, together with anything else that failed to pickle.
+
+_VP_INTERNAL = re.compile(r'^(__.*__|_\d*|__+|_i+\d*|_(oh|ih|dh)|In|Out|get_ipython|exit|quit|_vp.*|_serialize_\w+|_spatial_index|_VPProfiler|studio)$')
+
+def _vp_checkpoint_save(path):
+    _modules = {}
+    _values = {}
+    _skipped = []
+    for _name, _obj in list(globals().items()):
+        if _VP_INTERNAL.match(_name):
+            continue
+        if isinstance(_obj, types.ModuleType):
+            _modules[_name] = _obj.__name__
+            continue
+        if getattr(_obj, '__module__', None) == '__main__' and isinstance(_obj, (type, types.FunctionType)):
+            _skipped.append({'name': _name, 'reason': 'defined in user code'})
+            continue
+        try:
+            _values[_name] = pickle.dumps(_obj, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            _skipped.append({'name': _name, 'reason': f"{type(_obj).__name__}: {e}"[:200]})
+
+    with open(path, 'wb') as f:
+        pickle.dump({'modules': _modules, 'values': _values, 'skipped': _skipped,
+                     'code_hash': globals().get('_vp_code_hash')}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return {
+        'saved': sorted(_values),
+        'modules': sorted(_modules),
+        'skipped': _skipped,
+        'bytes': sum(len(v) for v in _values.values()),
+    }
+
+def _vp_checkpoint_restore(path):
+    with open(path, 'rb') as f:
+        _data = pickle.load(f)
+    _restored = []
+    _skipped = list(_data.get('skipped', []))
+    for _name, _module in _data.get('modules', {}).items():
+        try:
+            globals()[_name] = importlib.import_module(_module)
+            _restored.append(_name)
+        except Exception as e:
+            _skipped.append({'name': _name, 'reason': f"import {_module}: {e}"[:200]})
+    for _name, _blob in _data.get('values', {}).items():
+        try:
+            globals()[_name] = pickle.loads(_blob)
+            _restored.append(_name)
+        except Exception as e:
+            _skipped.append({'name': _name, 'reason': f"unpickle: {e}"[:200]})
+    if _data.get('code_hash'):
+        globals()['_vp_restored_hash'] = _data['code_hash']
+    return {'restored': sorted(_restored), 'skipped': _skipped}
+
+def _vp_checkpoint_report(op, path):
+    print('<<<CHECKPOINT_START>>>')
+    try:
+        print(json.dumps(op(path)))
+    except Exception as e:
+        print(json.dumps({'error': str(e)}))
+    print('<<<CHECKPOINT_END>>>')
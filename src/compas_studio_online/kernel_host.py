@@ -0,0 +1,291 @@
+import argparse
+import json
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+# --- KERNEL HOST DAEMON ---
+# Owns Jupyter kernels on behalf of one or more web servers:
+#
+#   python -m compas_studio_online.kernel_host --port 6001
+#
+# Protocol: one TCP connection per request, newline-delimited JSON.
+#   -> {"op": "start", "key": "12345/main.py"}
+#   <- {"ok": true}
+# "execute" streams every IOPub message of the run as its own line and ends
+# with {"done": true}. Messages are trimmed to the fields server.py reads.
+# It carries the run's "timeout" (the project's timeout_seconds). The server
+# interrupts or restarts a run that exceeds it; if it does not (e.g. it went
+# away), the host does so itself HOST_TIMEOUT_MARGIN seconds later.
+#
+# Ops: ping, list, start, alive, execute, interrupt, restart, shutdown, drain
+
+EXECUTE_TIMEOUT = 30        # seconds, for runs that name no timeout
+HOST_TIMEOUT_MARGIN = 10    # seconds the host waits past a run's timeout for the server to act
+INTERRUPT_GRACE = 5         # seconds an interrupted run gets before the kernel is restarted
+
+
+class KernelHost:
+    def __init__(self):
+        self.kernels = {} # { key: { km, kc, exec_lock, generation } }
+        self.start_locks = {} # { key: Lock } - one start at a time per kernel, kernels boot in parallel
+        self.lock = threading.Lock()
+        self.draining = False
+
+    def start(self, key):
+        from jupyter_client import KernelManager
+        with self.lock:
+            start_lock = self.start_locks.setdefault(key, threading.Lock())
+        with start_lock:
+            kdata = self.kernels.get(key)
+            if kdata and kdata['km'].is_alive():
+                return
+            if self.draining:
+                raise RuntimeError("Host is draining")
+            print(f"[KernelHost] Starting kernel for {key}...")
+            km = KernelManager(kernel_name='python3')
+            km.start_kernel()
+            kc = km.client()
+            kc.start_channels()
+            kc.wait_for_ready(timeout=60)
+            # generation: bumped by a restart, ends the stream of the run it cut short
+            self.kernels[key] = {"km": km, "kc": kc, "exec_lock": threading.Lock(), "generation": 0}
+
+    def get(self, key):
+        kdata = self.kernels.get(key)
+        if not kdata:
+            raise KeyError(f"No kernel for {key}")
+        return kdata
+
+    def alive(self, key):
+        kdata = self.kernels.get(key)
+        return bool(kdata and kdata['km'].is_alive())
+
+    def shutdown(self, key):
+        with self.lock:
+            kdata = self.kernels.pop(key, None)
+        if kdata:
+            try:
+                kdata['kc'].stop_channels()
+                kdata['km'].shutdown_kernel(now=True)
+            except Exception as e:
+                print(f"[KernelHost] Error shutting down {key}: {e}")
+
+    def restart(self, key):
+        kdata = self.get(key)
+        kdata['generation'] += 1 # The run in progress stops streaming and lets go of the kernel
+        with kdata['exec_lock']:
+            self._restart(kdata)
+
+    def _restart(self, kdata):
+        kdata['km'].restart_kernel(now=True)
+        kdata['kc'].wait_for_ready(timeout=60)
+
+    def execute(self, key, code, msg_id, send, timeout=None):
+        """Run code and pass each IOPub message of the run to send().
+
+        Past timeout + HOST_TIMEOUT_MARGIN the run is interrupted, and the
+        kernel restarted if it is still busy INTERRUPT_GRACE seconds later.
+        """
+        kdata = self.get(key)
+        kc = kdata['kc']
+
+        def reply(msg_type, content):
+            send({'header': {'msg_type': msg_type}, 'parent_header': {'msg_id': msg_id}, 'content': content})
+
+        with kdata['exec_lock']:
+            generation = kdata['generation']
+            kernel_msg_id = kc.execute(code)
+            deadline = time.time() + (timeout or EXECUTE_TIMEOUT) + HOST_TIMEOUT_MARGIN
+            interrupted = False
+            while kdata['generation'] == generation:
+                if time.time() > deadline:
+                    if interrupted:
+                        print(f"[KernelHost] Restarting {key}: still busy after the interrupt")
+                        self._restart(kdata)
+                        reply('error', {'traceback': ["[Kernel Host] The run exceeded its timeout; the kernel was restarted."]})
+                        reply('status', {'execution_state': 'idle'})
+                        return
+                    print(f"[KernelHost] Interrupting {key}: run exceeded its timeout")
+                    kdata['km'].interrupt_kernel()
+                    interrupted = True
+                    deadline = time.time() + INTERRUPT_GRACE
+                try:
+                    msg = kc.get_iopub_msg(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if msg['parent_header'].get('msg_id') != kernel_msg_id:
+                    continue
+                msg_type = msg['header']['msg_type']
+                reply(msg_type, msg['content'])
+                if msg_type == 'status' and msg['content'].get('execution_state') == 'idle':
+                    return
+
+
+HOST = KernelHost()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def send(self, payload):
+        self.wfile.write((json.dumps(payload, default=str) + '\n').encode('utf-8'))
+        self.wfile.flush()
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            req = json.loads(line)
+            op = req.get('op')
+            key = req.get('key')
+            if op == 'ping':
+                self.send({"ok": True, "kernels": len(HOST.kernels), "draining": HOST.draining})
+            elif op == 'list':
+                self.send({"ok": True, "keys": list(HOST.kernels.keys())})
+            elif op == 'start':
+                HOST.start(key)
+                self.send({"ok": True})
+            elif op == 'alive':
+                self.send({"ok": True, "alive": HOST.alive(key)})
+            elif op == 'execute':
+                HOST.execute(key, req['code'], req['msg_id'], self.send, req.get('timeout'))
+                self.send({"done": True})
+            elif op == 'interrupt':
+                HOST.get(key)['km'].interrupt_kernel()
+                self.send({"ok": True})
+            elif op == 'restart':
+                HOST.restart(key)
+                self.send({"ok": True})
+            elif op == 'shutdown':
+                HOST.shutdown(key)
+                self.send({"ok": True})
+            elif op == 'drain':
+                HOST.draining = True
+                self.send({"ok": True, "kernels": len(HOST.kernels)})
+            else:
+                self.send({"ok": False, "error": f"Unknown op: {op}"})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            try:
+                self.send({"ok": False, "error": str(e)})
+            except OSError:
+                pass
+
+
+class ThreadedServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kernel host daemon for compas-studio-online.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6001)
+    args = parser.parse_args()
+
+    server = ThreadedServer((args.host, args.port), RequestHandler)
+    print(f"[KernelHost] Listening on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    finally:
+        for key in list(HOST.kernels.keys()):
+            HOST.shutdown(key)
+
+
+# --- CLIENT SIDE ---
+# Stand-ins for KernelManager / BlockingKernelClient that talk to a host, so
+# the server's execution path (kc.execute + collect_kernel_output) is unchanged.
+
+def rpc(address, payload, timeout=90):
+    host, port = address.rsplit(':', 1)
+    with socket.create_connection((host, int(port)), timeout=timeout) as conn:
+        conn.sendall((json.dumps(payload) + '\n').encode('utf-8'))
+        reader = conn.makefile('r', encoding='utf-8')
+        reply = json.loads(reader.readline() or '{}')
+    if not reply.get('ok'):
+        raise RuntimeError(reply.get('error', f"Kernel host {address} failed"))
+    return reply
+
+
+class RemoteKernelClient:
+    def __init__(self, manager):
+        self.manager = manager
+        self._iopub = queue.Queue()
+
+    def start_channels(self):
+        pass
+
+    def stop_channels(self):
+        pass
+
+    def wait_for_ready(self, timeout=None):
+        pass # The host only answers 'start' once the kernel is ready
+
+    def execute(self, code, **kwargs):
+        import uuid
+        msg_id = uuid.uuid4().hex
+        threading.Thread(target=self._stream, args=(code, msg_id), daemon=True).start()
+        return msg_id
+
+    def _stream(self, code, msg_id):
+        host, port = self.manager.address.rsplit(':', 1)
+        timeout = self.manager.timeout or EXECUTE_TIMEOUT
+        request = {"op": "execute", "key": self.manager.key, "code": code, "msg_id": msg_id, "timeout": timeout}
+        try:
+            # A quiet run sends nothing until it ends, or until the host frees the kernel
+            with socket.create_connection((host, int(port)),
+                                          timeout=timeout + HOST_TIMEOUT_MARGIN + INTERRUPT_GRACE + 90) as conn:
+                conn.sendall((json.dumps(request) + '\n').encode('utf-8'))
+                for line in conn.makefile('r', encoding='utf-8'):
+                    msg = json.loads(line)
+                    if msg.get('done'):
+                        break
+                    if 'error' in msg and 'header' not in msg:
+                        raise RuntimeError(msg['error'])
+                    self._iopub.put(msg)
+        except Exception as e:
+            self._iopub.put({'header': {'msg_type': 'error'}, 'parent_header': {'msg_id': msg_id},
+                             'content': {'traceback': [f"[Kernel Host Error] {e}"]}})
+            self._iopub.put({'header': {'msg_type': 'status'}, 'parent_header': {'msg_id': msg_id},
+                             'content': {'execution_state': 'idle'}})
+
+    def get_iopub_msg(self, timeout=None):
+        return self._iopub.get(timeout=timeout)
+
+
+class RemoteKernelManager:
+    def __init__(self, address, key):
+        self.address = address
+        self.key = key
+        self.timeout = None # seconds a run may take, sent with each execute (see server.apply_limits)
+        self._client = None
+
+    def start_kernel(self, **kwargs):
+        rpc(self.address, {"op": "start", "key": self.key})
+
+    def client(self):
+        if self._client is None:
+            self._client = RemoteKernelClient(self)
+        return self._client
+
+    def is_alive(self):
+        try:
+            return rpc(self.address, {"op": "alive", "key": self.key}, timeout=5)['alive']
+        except Exception:
+            return False
+
+    def interrupt_kernel(self):
+        rpc(self.address, {"op": "interrupt", "key": self.key})
+
+    def restart_kernel(self, now=False, **kwargs):
+        rpc(self.address, {"op": "restart", "key": self.key})
+
+    def shutdown_kernel(self, now=False, restart=False):
+        rpc(self.address, {"op": "shutdown", "key": self.key})
+
+
+if __name__ == '__main__':
+    main()
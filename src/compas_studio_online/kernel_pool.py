@@ -0,0 +1,94 @@
+import queue
+import threading
+import time
+
+# --- KERNEL POOL ---
+# A few kernels started ahead of time so waking a project or opening a new
+# file does not wait for a kernel process to boot. Pooled kernels can run a
+# preload snippet (e.g. "import compas") while they wait. get_kernel() takes
+# one and the pool refills itself in the background.
+
+
+class KernelPool:
+    def __init__(self, factory, size=1, preload=''):
+        self.factory = factory  # () -> (km, kc), ready for execute
+        self.size = size
+        self.preload = preload
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.filling = 0
+        self.started = False
+        self.hits = 0
+        self.misses = 0
+
+    def start(self):
+        self.started = True
+        self._refill()
+
+    def take(self):
+        """A ready (km, kc) pair, or None if the pool is empty or disabled."""
+        pooled = None
+        while pooled is None:
+            try:
+                km, kc = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            if km.is_alive():
+                pooled = (km, kc)
+            else:
+                kc.stop_channels()
+        with self.lock:
+            if pooled: self.hits += 1
+            else: self.misses += 1
+        self._refill()
+        return pooled
+
+    def shutdown(self):
+        self.started = False
+        while True:
+            try:
+                km, kc = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                kc.stop_channels()
+                km.shutdown_kernel(now=True)
+            except Exception as e:
+                print(f"[KernelPool] Error shutting down pooled kernel: {e}")
+
+    def stats(self):
+        return {"size": self.size, "idle": self.idle.qsize(), "starting": self.filling,
+                "hits": self.hits, "misses": self.misses}
+
+    def _refill(self):
+        if not self.started:
+            return
+        with self.lock:
+            missing = max(0, self.size - self.idle.qsize() - self.filling)
+            self.filling += missing
+        for _ in range(missing):
+            threading.Thread(target=self._start_one, daemon=True).start()
+
+    def _start_one(self):
+        try:
+            km, kc = self.factory()
+            if self.preload:
+                self._run(kc, self.preload)
+            self.idle.put((km, kc))
+        except Exception as e:
+            print(f"[KernelPool] Failed to start pooled kernel: {e}")
+        finally:
+            with self.lock:
+                self.filling -= 1
+
+    def _run(self, kc, code, timeout=120):
+        msg_id = kc.execute(code)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                msg = kc.get_iopub_msg(timeout=1)
+            except queue.Empty:
+                continue
+            if (msg['parent_header'].get('msg_id') == msg_id and msg['header']['msg_type'] == 'status'
+                    and msg['content'].get('execution_state') == 'idle'):
+                return
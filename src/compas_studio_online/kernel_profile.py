@@ -0,0 +1,144 @@
+
+import sys as _vp_sys
+import json as _vp_json
+import time as _vp_time
+import linecache as _vp_linecache
+import threading as _vp_threading
+
+# This code is injected into the Jupyter Kernel before the user's code when
+# /execute is called with "profile": true. It samples the main thread's stack
+# while the user section runs, then reports a compact call tree, folded
+# (flamegraph) stacks and a user / compas / other time breakdown.
+
+class _VPProfiler:
+    INTERVAL = 0.001  # seconds between samples
+    MAX_DEPTH = 40
+    MIN_SHARE = 0.01  # prune tree nodes below 1% of samples
+    MAX_FOLDED = 200
+
+    def __init__(self, filename, source):
+        self.filename = filename
+        # The user code is exec'd from a string; register it so tracebacks show its lines
+        _vp_linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+        self.stacks = {}  # { (frame, ...): count }
+        self.samples = 0
+        self.target = _vp_threading.get_ident()
+        self.running = False
+        self.user_ms = None
+        self.introspection_ms = None
+
+    def _label(self, code):
+        fname = code.co_filename
+        if fname == self.filename:
+            return f"{code.co_name} ({fname}:{code.co_firstlineno})"
+        short = fname.replace('\\', '/').rsplit('/', 2)
+        return f"{code.co_name} ({'/'.join(short[-2:])})"
+
+    def _category(self, code):
+        fname = code.co_filename.replace('\\', '/')
+        if fname == self.filename:
+            return 'user'
+        if '/compas/' in fname or '/compas_' in fname:
+            return 'compas'
+        return 'other'
+
+    def _sample(self):
+        frame = _vp_sys._current_frames().get(self.target)
+        codes = []
+        while frame is not None and len(codes) < self.MAX_DEPTH:
+            # Import machinery frames only add noise between modules
+            if not frame.f_code.co_filename.startswith('<frozen'):
+                codes.append(frame.f_code)
+            frame = frame.f_back
+        # Keep the user section only: drop kernel machinery above the outermost user frame
+        for i in range(len(codes) - 1, -1, -1):
+            if codes[i].co_filename == self.filename:
+                codes = codes[:i + 1]
+                break
+        else:
+            return
+        key = tuple(reversed(codes))
+        self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.samples += 1
+
+    def _loop(self):
+        while self.running:
+            self._sample()
+            _vp_time.sleep(self.INTERVAL)
+
+    def start(self):
+        self.switch_interval = _vp_sys.getswitchinterval()
+        _vp_sys.setswitchinterval(self.INTERVAL)  # let the sampler in while user code holds the GIL
+        self.running = True
+        self.t0 = _vp_time.perf_counter()
+        self.thread = _vp_threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.user_ms = (_vp_time.perf_counter() - self.t0) * 1000.0
+        self.running = False
+        self.thread.join()
+        _vp_sys.setswitchinterval(self.switch_interval)
+
+    def begin_introspection(self):
+        self.t1 = _vp_time.perf_counter()
+
+    def end_introspection(self):
+        self.introspection_ms = (_vp_time.perf_counter() - self.t1) * 1000.0
+
+    def report(self):
+        total = max(self.samples, 1)
+        ms_per_sample = (self.user_ms or 0.0) / total
+
+        # Category of the innermost frame decides where a sample's time went
+        breakdown = {'user': 0, 'compas': 0, 'other': 0}
+        for stack, count in self.stacks.items():
+            inner = 'other'
+            for code in reversed(stack):
+                inner = self._category(code)
+                if inner != 'other':
+                    break
+            breakdown[inner] += count
+
+        # Call tree in d3-flame-graph format: { name, value, children }
+        root = {'name': self.filename, 'value': 0, 'children': {}}
+        for stack, count in self.stacks.items():
+            node = root
+            node['value'] += count
+            for code in stack:
+                label = self._label(code)
+                child = node['children'].get(label)
+                if child is None:
+                    child = node['children'][label] = {'name': label, 'value': 0, 'children': {}}
+                child['value'] += count
+                node = child
+
+        def _compact(node):
+            children = [_compact(c) for c in node['children'].values() if c['value'] / total >= self.MIN_SHARE]
+            children.sort(key=lambda c: -c['value'])
+            out = {'name': node['name'], 'value': node['value']}
+            if children:
+                out['children'] = children
+            return out
+
+        folded = sorted(self.stacks.items(), key=lambda kv: -kv[1])[:self.MAX_FOLDED]
+        return {
+            'mode': 'sampling',
+            'interval_ms': self.INTERVAL * 1000.0,
+            'samples': self.samples,
+            'user_ms': round(self.user_ms or 0.0, 2),
+            'introspection_ms': None if self.introspection_ms is None else round(self.introspection_ms, 2),
+            'breakdown_ms': {k: round(v * ms_per_sample, 2) for k, v in breakdown.items()},
+            'tree': _compact(root),
+            'folded': [';'.join(self._label(c) for c in stack) + f" {count}" for stack, count in folded],
+        }
+
+    def emit(self):
+        print('<<<PROFILE_START>>>')
+        try:
+            print(_vp_json.dumps(self.report()))
+        except Exception as e:
+            print(_vp_json.dumps({'error': str(e)}))
+        print('<<<PROFILE_END>>>')
@@ -0,0 +1,304 @@
+
+import sys as _vp_sys
+
+# This code is injected into the Jupyter Kernel at the start of every run. It
+# provides the `studio` module to user code:
+#
+#   bricks = studio.parallel_map(make_brick, positions)
+#                                           [make_brick(p) for p in positions] on the
+#                                           project's worker processes, in order
+#   bricks = studio.parallel_map_chunked(make_bricks, positions, chunksize=500)
+#                                           make_bricks(list of positions) -> list
+#
+#   @studio.cache
+#   def base_mesh(path, n): ...             keyed on the function's code and arguments
+#
+#   terrain = studio.cached('terrain', load_terrain, path)
+#                                           keyed on 'terrain' and the arguments
+#
+# The module lives in sys.modules, so its cache survives the namespace reset
+# of each run. Values are kept in LRU order up to _vp_cache_mb megabytes per
+# kernel (set by build_run_code) and returned as is: treat them as read-only.
+# The hits and misses of a run are reported in the CACHE block.
+#
+# Mapped functions must be pure: they run in other processes (see
+# parallel.py), with imports.py loaded but none of the script's state other
+# than the globals, defaults and closure values they use, which are copied.
+# Classes they use must come from imports.py or a module. Without workers
+# (_vp_parallel is None, e.g. on remote kernel hosts) the map runs here.
+
+def _vp_install_studio():
+    import sys
+    import json
+    import types
+    import pickle
+    import struct
+    import socket
+    import marshal
+    import hashlib
+    import functools
+    import collections
+
+    _PLAIN = (type(None), bool, int, float, complex, str, bytes)
+    _OPAQUE = (types.ModuleType, type, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+    def _plain(value):
+        if isinstance(value, _PLAIN):
+            return True
+        if isinstance(value, (tuple, frozenset)):
+            return all(_plain(v) for v in value)
+        return False
+
+    def _key(parts):
+        # Plain values are their own key; anything else (lists, numpy arrays,
+        # compas objects) is keyed on the digest of its pickle, so an equal
+        # object built again in the next run still hits.
+        if _plain(parts):
+            return parts
+        try:
+            return ('pickle', hashlib.sha1(pickle.dumps(parts, protocol=4)).hexdigest())
+        except Exception as e:
+            raise TypeError(f"studio cache arguments must be picklable: {e}") from None
+
+    def _code_digest(code, h=None):
+        # Bytecode, constants and names only: moving a function to another
+        # line does not invalidate its entries, editing its body does.
+        h = h or hashlib.sha1()
+        h.update(code.co_code)
+        h.update(repr(code.co_names).encode())
+        for const in code.co_consts:
+            if isinstance(const, types.CodeType):
+                _code_digest(const, h)
+            else:
+                h.update(repr(const).encode())
+        return h
+
+    def _sizeof(value, max_objects=1000000):
+        """Estimated bytes held by a value (numpy arrays count their buffer)."""
+        seen = set()
+        stack = [value]
+        total = 0
+        while stack and len(seen) < max_objects:
+            obj = stack.pop()
+            if id(obj) in seen or isinstance(obj, _OPAQUE):
+                continue
+            seen.add(id(obj))
+            nbytes = getattr(obj, 'nbytes', None)
+            if isinstance(nbytes, int):
+                total += nbytes
+                continue
+            total += sys.getsizeof(obj, 64)
+            if isinstance(obj, dict):
+                stack.extend(obj.keys())
+                stack.extend(obj.values())
+            elif isinstance(obj, (list, tuple, set, frozenset)):
+                stack.extend(obj)
+            else:
+                attrs = getattr(obj, '__dict__', None)
+                if isinstance(attrs, dict):
+                    stack.append(attrs)
+        return total
+
+    class _Cache:
+        def __init__(self):
+            self.entries = collections.OrderedDict()  # { key: (value, bytes) }, least recently used first
+            self.bytes = 0
+            self.limit = 0
+            self.hits = self.misses = self.evicted = 0  # of the current run
+
+        def begin_run(self, limit_mb):
+            self.hits = self.misses = self.evicted = 0
+            self.limit = int(max(0, limit_mb or 0) * 1024 * 1024)
+            self._trim()
+
+        def get(self, key, compute):
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            value = compute()
+            size = _sizeof(value)
+            if size <= self.limit:
+                self.entries[key] = (value, size)
+                self.bytes += size
+                self._trim()
+            return value
+
+        def clear(self):
+            self.entries.clear()
+            self.bytes = 0
+
+        def _trim(self):
+            while self.entries and self.bytes > self.limit:
+                _, (_, size) = self.entries.popitem(last=False)
+                self.bytes -= size
+                self.evicted += 1
+
+        def stats(self):
+            return {"hits": self.hits, "misses": self.misses, "evicted": self.evicted,
+                    "entries": len(self.entries), "bytes": self.bytes, "limit_bytes": self.limit}
+
+    store = _Cache()
+
+    def cached(key, fn, *args, **kwargs):
+        """fn(*args, **kwargs), computed once per kernel for this key and these arguments."""
+        return store.get(_key((key, args, tuple(sorted(kwargs.items())))), lambda: fn(*args, **kwargs))
+
+    def cache(fn):
+        """Decorator: keep the function's results across runs, keyed on its code and arguments."""
+        prefix = (fn.__module__, fn.__qualname__, _code_digest(fn.__code__).hexdigest())
+        defaults = _key((fn.__defaults__, tuple(sorted((fn.__kwdefaults__ or {}).items()))))
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            parts = (prefix, defaults, args, tuple(sorted(kwargs.items())))
+            return store.get(_key(parts), lambda: fn(*args, **kwargs))
+        return wrapper
+
+    def clear_cache():
+        """Drop every cached value of this kernel."""
+        store.clear()
+
+    # --- parallel map ---
+    _HEADER = struct.Struct('>IB')  # frames of parallel.py
+    settings = {'parallel': None}
+
+    def _send(conn, kind, body=b''):
+        conn.sendall(_HEADER.pack(len(body), kind[0]) + body)
+
+    def _recv_exact(conn, n):
+        buf = bytearray()
+        while len(buf) < n:
+            part = conn.recv(min(n - len(buf), 1 << 20))
+            if not part:
+                raise RuntimeError("The parallel workers stopped")
+            buf += part
+        return bytes(buf)
+
+    def _recv(conn):
+        length, kind = _HEADER.unpack(_recv_exact(conn, _HEADER.size))
+        return bytes([kind]), _recv_exact(conn, length) if length else b''
+
+    def _names(code, out):
+        out.update(code.co_names)
+        for const in code.co_consts:
+            if isinstance(const, types.CodeType):
+                _names(const, out)
+        return out
+
+    def _dump_callable(fn):
+        # Script functions go by value (code + what they use), anything else by pickle
+        table = {}
+
+        def ref(value):
+            if isinstance(value, types.FunctionType) and value.__module__ == '__main__':
+                return ('fn', function(value))
+            if isinstance(value, types.ModuleType):
+                return ('module', value.__name__)
+            return ('value', value)
+
+        def function(f):
+            key = id(f)
+            if key not in table:
+                table[key] = None  # A recursive function refers to itself
+                glb = f.__globals__
+                table[key] = {
+                    'code': marshal.dumps(f.__code__), 'name': f.__name__, 'qualname': f.__qualname__,
+                    'globals': {n: ref(glb[n]) for n in _names(f.__code__, set()) if n in glb},
+                    'defaults': None if f.__defaults__ is None else tuple(ref(v) for v in f.__defaults__),
+                    'kwdefaults': {k: ref(v) for k, v in (f.__kwdefaults__ or {}).items()},
+                    'closure': [None if _empty(c) else ref(c.cell_contents) for c in f.__closure__ or ()],
+                }
+            return key
+
+        root = ref(fn)
+        try:
+            return pickle.dumps((sys.hexversion, root, table), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            raise TypeError(f"parallel_map needs a function and values it can copy to the workers: {e}") from None
+
+    def _empty(cell):
+        try:
+            cell.cell_contents
+            return False
+        except ValueError:
+            return True
+
+    def _map(fn, items, chunksize, chunked):
+        items = list(items)
+        endpoint = settings['parallel']
+        workers = endpoint['workers'] if endpoint else 1
+        chunksize = max(1, int(chunksize or -(-len(items) // (workers * 4))))
+        chunks = [items[i:i + chunksize] for i in range(0, len(items), chunksize)]
+        conn = None
+        if endpoint is not None and len(chunks) > 1:
+            payload = _dump_callable(fn)
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                conn.connect(endpoint['socket'])
+            except OSError:
+                conn.close()
+                conn = None # The pool is gone (server restarted): run here
+        if conn is None:
+            if not chunked:
+                return [fn(item) for item in items]
+            return [result for chunk in chunks for result in fn(chunk)]
+
+        try:
+            _send(conn, b'K' if chunked else b'M', payload)
+            for chunk in chunks:
+                _send(conn, b'C', pickle.dumps(chunk, protocol=pickle.HIGHEST_PROTOCOL))
+            _send(conn, b'G')
+            results = []
+            while True:
+                kind, body = _recv(conn)
+                if kind == b'R':
+                    output, part = pickle.loads(body)
+                    if output:
+                        print(output, end='')
+                    results.extend(part)
+                elif kind == b'T':
+                    raise RuntimeError("parallel_map failed in a worker:\n" + body.decode('utf-8', 'replace'))
+                else:
+                    return results
+        finally:
+            conn.close()
+
+    def parallel_map(fn, items, chunksize=None):
+        """[fn(item) for item in items], computed on the project's worker processes."""
+        return _map(fn, items, chunksize, False)
+
+    def parallel_map_chunked(fn, items, chunksize=None):
+        """fn(chunk) for consecutive chunks of items, each returning a list; joined in order."""
+        return _map(fn, items, chunksize, True)
+
+    def _begin_run(cache_mb, parallel):
+        store.begin_run(cache_mb)
+        settings['parallel'] = parallel
+
+    def _report():
+        stats = store.stats()
+        if not (stats['hits'] or stats['misses'] or stats['entries']):
+            return # Scripts that never use the cache get no block
+        print('<<<CACHE_START>>>')
+        print(json.dumps(stats))
+        print('<<<CACHE_END>>>')
+
+    studio = types.ModuleType('studio', "Helpers for COMPAS Studio scripts.")
+    studio.cache = cache
+    studio.cached = cached
+    studio.clear_cache = clear_cache
+    studio.parallel_map = parallel_map
+    studio.parallel_map_chunked = parallel_map_chunked
+    studio._store = store
+    studio._begin_run = _begin_run
+    studio._report = _report
+    sys.modules['studio'] = studio
+
+
+if 'studio' not in _vp_sys.modules:
+    _vp_install_studio()
+studio = _vp_sys.modules['studio']
+studio._begin_run(globals().get('_vp_cache_mb'), globals().get('_vp_parallel'))
@@ -3,6 +3,8 @@ import json
 import inspect
 import pickle
 import base64
+import math
+import sys
 
 # This code is injected into the Jupyter Kernel to Introspect variables
 # and serialize them for the frontend.
@@ -20,14 +22,60 @@ def _serialize_compass_data():
                 return str(obj)
 
     _vp_objects = []
-    
+    _encoding = globals().get('_vp_mesh_encoding') or {}
+
+    # Compact mesh encoding (set per project, see mesh_encoding() on the server):
+    # positions quantized to `bits` per coordinate within the mesh's bounding
+    # box, packed as little-endian uint16; faces as one byte stream of
+    # varint(face size) followed by the zigzag varint delta of each index.
+    def _quantize(_v, _f, bits):
+        from array import array
+        _lo = [min(float(p[i]) for p in _v) for i in range(3)]
+        _hi = [max(float(p[i]) for p in _v) for i in range(3)]
+        _steps = (1 << bits) - 1
+        _k = [_steps / (h - l) if h > l else 0.0 for l, h in zip(_lo, _hi)]
+        _q = array('H', [int(round((float(p[i]) - _lo[i]) * _k[i])) for p in _v for i in range(3)])
+        if sys.byteorder == 'big': _q.byteswap()
+
+        _out = bytearray()
+        def _varint(n):
+            while n >= 0x80:
+                _out.append((n & 0x7f) | 0x80)
+                n >>= 7
+            _out.append(n)
+        _prev = 0
+        for _face in _f:
+            _varint(len(_face))
+            for _idx in _face:
+                _d = int(_idx) - _prev
+                _prev = int(_idx)
+                _varint(_d * 2 if _d >= 0 else -_d * 2 - 1)
+
+        return {'encoding': 'quantized', 'bits': bits, 'count': len(_v), 'min': _lo, 'max': _hi,
+                'positions': base64.b64encode(_q.tobytes()).decode('ascii'),
+                'faces': base64.b64encode(bytes(_out)).decode('ascii')}
+
+    def _pack(_v, _f):
+        _bits = _encoding.get('bits')
+        if _bits and _v and len(_v) >= _encoding.get('min_vertices', 0):
+            return _quantize(_v, _f, _bits)
+        return {'vertices': [list(pt) for pt in _v], 'faces': _f}
+
+    # Axis-aligned bounds [minx, miny, minz, maxx, maxy, maxz] of either encoding
+    def _bbox(data):
+        if data.get('encoding') == 'quantized':
+            return list(data['min']) + list(data['max'])
+        _v = data['vertices']
+        if not _v: return None
+        return [min(p[i] for p in _v) for i in range(3)] + [max(p[i] for p in _v) for i in range(3)]
+
     # Helper to get mesh data
     def _get_mesh_data(obj):
         # Try standard mesh/shape method
         if hasattr(obj, 'to_vertices_and_faces'):
             try:
                 _v, _f = obj.to_vertices_and_faces()
-                return {'vertices': [list(pt) for pt in _v], 'faces': _f}
+                return _pack(_v, _f)
             except: pass
         
         # Try converting Primitive/Shape to Mesh
@@ -35,7 +83,7 @@ def _serialize_compass_data():
             from compas.datastructures import Mesh
             _m = Mesh.from_shape(obj)
             _v, _f = _m.to_vertices_and_faces()
-            return {'vertices': [list(pt) for pt in _v], 'faces': _f}
+            return _pack(_v, _f)
         except: pass
         return None
 
@@ -50,7 +98,7 @@ def _serialize_compass_data():
         if data:
             # Check if global
             _is_global = name.startswith('glb_')
-            return [{'name': name, 'type': 'Mesh', 'data': data, 'isGlobal': _is_global}]
+            return [{'name': name, 'type': 'Mesh', 'data': data, 'isGlobal': _is_global, 'bbox': _bbox(data)}]
             
         # 2. Handle Lists/Tuples
         if isinstance(obj, (list, tuple)):
@@ -79,6 +127,51 @@ def _serialize_compass_data():
 
     return _vp_objects
 
+def _spatial_index(items, leaf_size=8):
+    # Bounds of the whole file plus a BVH over its items, so the viewport can
+    # cull and pick hierarchically. Nodes are flat:
+    #   [minx, miny, minz, maxx, maxy, maxz, left, right]   inner node (child node indices)
+    #   [minx, miny, minz, maxx, maxy, maxz, -1 - start, n]  leaf (slice of 'items')
+    # 'items' lists geometry indices in leaf order.
+    _boxes = [it.get('bbox') for it in items]
+    _ids = [i for i, b in enumerate(_boxes) if b]
+    if not _ids: return {}
+
+    def _union(ids):
+        return ([min(_boxes[i][k] for i in ids) for k in range(3)] +
+                [max(_boxes[i][k] for i in ids) for k in range(3, 6)])
+
+    # Node boxes only need ~6 significant digits of the scene size; round them outwards
+    _root = _union(_ids)
+    _extent = max(_root[k + 3] - _root[k] for k in range(3)) or 1.0
+    _digits = max(0, 6 - int(math.floor(math.log10(_extent))))
+    _scale = 10 ** _digits
+    def _outwards(box):
+        return ([round(math.floor(v * _scale) / _scale, _digits) for v in box[:3]] +
+                [round(math.ceil(v * _scale) / _scale, _digits) for v in box[3:]])
+
+    _nodes, _order = [], []
+    def _build(ids):
+        box = _outwards(_union(ids))
+        node = len(_nodes)
+        _nodes.append(None)
+        if len(ids) <= leaf_size:
+            _nodes[node] = box + [-1 - len(_order), len(ids)]
+            _order.extend(ids)
+            return node
+        # Median split along the longest axis of the item centres
+        centres = {i: [_boxes[i][k] + _boxes[i][k + 3] for k in range(3)] for i in ids}
+        axis = max(range(3), key=lambda k: max(c[k] for c in centres.values()) - min(c[k] for c in centres.values()))
+        ids = sorted(ids, key=lambda i: centres[i][axis])
+        mid = len(ids) // 2
+        left = _build(ids[:mid])
+        right = _build(ids[mid:])
+        _nodes[node] = box + [left, right]
+        return node
+
+    _build(_ids)
+    return {'bounds': _nodes[0][:6], 'bvh': {'nodes': _nodes, 'items': _order}}
+
 def _serialize_globals():
     _new_globals = {}
     _prev_injected = globals().get('_injected_globals', set()) 
@@ -99,16 +192,26 @@ def _serialize_globals():
                 pass
     return _new_globals
 
+_vp_items = []
 print('<<<VP_DATA_START>>>')
 try:
-    print(json.dumps(_serialize_compass_data()))
+    _vp_items = _serialize_compass_data()
+    print(json.dumps(_vp_items))
 except Exception as e:
     print(json.dumps({"error": str(e), "trace": "Serialization Failed"}))
 print('<<<VP_DATA_END>>>')
 
+print('<<<VP_INDEX_START>>>')
+try:
+    print(json.dumps(_spatial_index(_vp_items)))
+except Exception:
+    print(json.dumps({}))
+print('<<<VP_INDEX_END>>>')
+del _vp_items
+
 print('<<<GLOBALS_START>>>')
 try:
     print(json.dumps(_serialize_globals()))
-except Exception as e:
+except Exception:
     print(json.dumps({}))
 print('<<<GLOBALS_END>>>')
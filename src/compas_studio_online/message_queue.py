@@ -0,0 +1,81 @@
+import re
+import threading
+
+import socketio
+
+# Socket.IO message queue for running several worker processes on one machine.
+#
+# python-socketio's own ZmqManager needs eventlet, which does not mix with our
+# threading async mode, so this is a plain pyzmq version of it. Every worker
+# PUSHes to the broker's sink and SUBscribes to its publisher:
+#
+#   SOCKETIO_MESSAGE_QUEUE=zmq+tcp://127.0.0.1:5555+5556
+#
+# Any other URL (redis://, amqp://, ...) is handed to Flask-SocketIO as-is.
+
+URL_PATTERN = re.compile(r'^zmq\+tcp://(?P<host>[^:]+):(?P<sink>\d+)\+(?P<pub>\d+)$')
+
+
+def parse_url(url):
+    match = URL_PATTERN.match(url)
+    if not match:
+        raise ValueError(f"Unexpected message queue URL: {url}")
+    host = match.group('host')
+    return f"tcp://{host}:{match.group('sink')}", f"tcp://{host}:{match.group('pub')}"
+
+
+class LocalQueueManager(socketio.PubSubManager):
+    name = 'localzmq'
+
+    def __init__(self, url, channel='flask-socketio', write_only=False, logger=None, json=None):
+        import zmq
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        sink_url, pub_url = parse_url(url)
+        context = zmq.Context.instance()
+
+        # zmq sockets are not thread safe; emits can come from any request thread
+        self.sink_lock = threading.Lock()
+        self.sink = context.socket(zmq.PUSH)
+        self.sink.connect(sink_url)
+
+        self.sub = None
+        if not write_only:
+            self.sub = context.socket(zmq.SUB)
+            self.sub.setsockopt_string(zmq.SUBSCRIBE, '')
+            self.sub.connect(pub_url)
+
+    def _publish(self, data):
+        packed = self.json.dumps({'channel': self.channel, 'data': data}).encode('utf-8')
+        with self.sink_lock:
+            self.sink.send(packed)
+
+    def _listen(self):
+        while True:
+            try:
+                message = self.json.loads(self.sub.recv())
+            except ValueError:
+                continue
+            if message.get('channel') == self.channel:
+                yield message['data']
+
+
+def run_broker(url):
+    """Forward everything from the sink to the publisher. Blocks forever."""
+    import zmq
+    sink_url, pub_url = parse_url(url)
+    context = zmq.Context.instance()
+    sink = context.socket(zmq.PULL)
+    sink.bind(sink_url.replace('tcp://localhost', 'tcp://127.0.0.1'))
+    pub = context.socket(zmq.PUB)
+    pub.bind(pub_url.replace('tcp://localhost', 'tcp://127.0.0.1'))
+    print(f"[MessageQueue] Broker running ({sink_url} -> {pub_url})")
+    zmq.proxy(sink, pub)
+
+
+def socketio_options(url):
+    """SocketIO() keyword arguments for a SOCKETIO_MESSAGE_QUEUE value."""
+    if not url:
+        return {}
+    if url.startswith('zmq+'):
+        return {'client_manager': LocalQueueManager(url)}
+    return {'message_queue': url}
@@ -0,0 +1,166 @@
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+
+# --- RUN OUTPUT BUFFER ---
+# Collects the stream output of one kernel run as it arrives. Marker blocks
+# (<<<NAME_START>>> ... <<<NAME_END>>>) are split off chunk by chunk and
+# parsed once at their end tag; everything else is user output. User output
+# is kept in memory up to MEMORY_LIMIT characters, after which the whole log
+# goes to a file in SPILL_DIR and only its head and tail stay in memory.
+# The response then carries head + tail and the log id for /output/<id>.
+
+MARKERS = ('VP_DATA', 'VP_INDEX', 'GLOBALS', 'PROFILE', 'CHECKPOINT', 'SWEEP', 'CACHE')
+MEMORY_LIMIT = int(os.environ.get('OUTPUT_MEMORY_LIMIT', 1024 * 1024))
+HEAD_CHARS = int(os.environ.get('OUTPUT_HEAD_CHARS', 32 * 1024))
+TAIL_CHARS = int(os.environ.get('OUTPUT_TAIL_CHARS', 32 * 1024))
+SPILL_DIR = os.environ.get('OUTPUT_SPILL_DIR') or os.path.join(tempfile.gettempdir(), 'studio-output')
+LOG_TTL = int(os.environ.get('OUTPUT_LOG_TTL', 3600)) # seconds a spilled log can be fetched
+LOG_ID = re.compile(r'^[0-9a-f]{32}$')
+
+_START_TAGS = {f'<<<{name}_START>>>': name for name in MARKERS}
+_LONGEST_TAG = max(len(tag) for tag in _START_TAGS)
+
+
+class OutputBuffer:
+    def __init__(self):
+        self.blocks = {}       # { name: parsed JSON (None if malformed) }
+        self.block = None      # name of the block being read
+        self.block_parts = []
+        self.pending = ''      # a possibly split tag carried to the next chunk
+        self.skip_newline = False
+        self.parts = []        # user output while in memory
+        self.size = 0          # user output characters
+        self.head = ''
+        self.tail = ''
+        self.log_id = None
+        self.log = None
+
+    # --- input ---
+    def write(self, text):
+        data = self.pending + text
+        self.pending = ''
+        while data:
+            if self.block is None:
+                if self.skip_newline:
+                    self.skip_newline = False
+                    if data.startswith('\n'):
+                        data = data[1:]
+                        continue
+                i = data.find('<<<')
+                if i == -1:
+                    # Keep a trailing '<' or '<<' in case a tag starts there
+                    keep = len(data) - len(data.rstrip('<'))
+                    self._user(data[:len(data) - keep])
+                    self.pending = data[len(data) - keep:]
+                    return
+                self._user(data[:i])
+                data = data[i:]
+                tag = next((t for t in _START_TAGS if data.startswith(t)), None)
+                if tag:
+                    self.block = _START_TAGS[tag]
+                    data = data[len(tag):]
+                elif len(data) < _LONGEST_TAG and any(t.startswith(data) for t in _START_TAGS):
+                    self.pending = data
+                    return
+                else:
+                    self._user('<<<')
+                    data = data[3:]
+            else:
+                end = f'<<<{self.block}_END>>>'
+                j = data.find(end)
+                if j == -1:
+                    safe = max(0, len(data) - len(end) + 1)
+                    self.block_parts.append(data[:safe])
+                    self.pending = data[safe:]
+                    return
+                self.block_parts.append(data[:j])
+                try:
+                    self.blocks[self.block] = json.loads(''.join(self.block_parts))
+                except ValueError:
+                    self.blocks[self.block] = None
+                self.block, self.block_parts = None, []
+                self.skip_newline = True
+                data = data[j + len(end):]
+
+    def close(self):
+        """Flush what is left: an unterminated block counts as user output."""
+        if self.block is not None:
+            self._user(f'<<<{self.block}_START>>>' + ''.join(self.block_parts))
+            self.block, self.block_parts = None, []
+        if self.pending:
+            self._user(self.pending)
+            self.pending = ''
+        if self.log:
+            self.log.close()
+
+    def _user(self, text):
+        if not text:
+            return
+        self.size += len(text)
+        if len(self.head) < HEAD_CHARS:
+            self.head += text[:HEAD_CHARS - len(self.head)]
+        self.tail += text
+        if len(self.tail) > 2 * TAIL_CHARS:
+            self.tail = self.tail[-TAIL_CHARS:]
+        if self.log:
+            self.log.write(text)
+            return
+        self.parts.append(text)
+        if self.size > MEMORY_LIMIT:
+            self._spill()
+
+    def _spill(self):
+        os.makedirs(SPILL_DIR, exist_ok=True)
+        prune_logs()
+        self.log_id = uuid.uuid4().hex
+        self.log = open(log_path(self.log_id), 'w', encoding='utf-8')
+        self.log.write(''.join(self.parts))
+        self.parts = []
+
+    # --- output ---
+    def text(self):
+        """User output: all of it, or head and tail once it spilled."""
+        if not self.log_id:
+            return ''.join(self.parts)
+        omitted = self.size - len(self.head) - min(len(self.tail), TAIL_CHARS)
+        return (self.head +
+                f"\n[... {omitted} characters omitted, full output: /output/{self.log_id} ...]\n" +
+                self.tail[-TAIL_CHARS:])
+
+    def info(self):
+        """Handle of the spilled log for the response, or None."""
+        if not self.log_id:
+            return None
+        return {"id": self.log_id, "url": f"/output/{self.log_id}", "chars": self.size,
+                "bytes": os.path.getsize(log_path(self.log_id))}
+
+
+def log_path(log_id):
+    return os.path.join(SPILL_DIR, f'{log_id}.log')
+
+
+def read_log(log_id, offset=0, length=MEMORY_LIMIT):
+    """(bytes, total size) of a byte range of a spilled log, or None."""
+    if not LOG_ID.match(log_id or ''):
+        return None
+    try:
+        with open(log_path(log_id), 'rb') as f:
+            total = os.fstat(f.fileno()).st_size
+            f.seek(offset)
+            return f.read(length), total
+    except OSError:
+        return None
+
+
+def prune_logs():
+    cutoff = time.time() - LOG_TTL
+    try:
+        for entry in os.scandir(SPILL_DIR):
+            if entry.name.endswith('.log') and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+    except OSError:
+        pass
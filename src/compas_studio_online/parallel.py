@@ -0,0 +1,479 @@
+import builtins
+import contextlib
+import hashlib
+import importlib
+import io
+import json
+import marshal
+import os
+import pickle
+import queue
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import types
+
+from .process_kernel import read_frame, write_frame, PACKAGE_PARENT
+from . import resources
+
+# --- PARALLEL MAP ---
+# studio.parallel_map / studio.parallel_map_chunked (kernel_studio.py) send
+# their work to a pool of plain Python worker processes per project. Every
+# worker has the project's imports.py loaded in its __main__, runs niced like
+# background kernels and gets the project's memory and CPU limits; the number
+# of workers is the project's "parallel_workers" limit.
+#
+#   kernel -> pool     M map (function) or K chunked map, C chunk (pickled
+#                      list of items) per chunk, G end of chunks
+#   pool -> kernel     R (output, results) of each chunk in order, T traceback
+#                      of the first failed chunk, D done
+#
+#   pool -> worker     I init (imports.py, cpu_seconds), L load function
+#                      (digest + payload), X run (digest, chunked, chunk), Q quit
+#   worker -> pool     R result, T traceback
+#
+# A kernel reaches its project's pool through a Unix socket in SOCKET_DIR.
+# The pool relays pickled chunks as opaque bytes; only workers unpickle them.
+# Functions defined in the user's script cannot be pickled by reference, so
+# the kernel sends them by value: their code object (marshal) with the
+# globals, defaults and closure values they use.
+
+SOCKET_DIR = os.environ.get('PARALLEL_SOCKET_DIR') or os.path.join(tempfile.gettempdir(), 'studio-parallel')
+IDLE_TIMEOUT = int(os.environ.get('PARALLEL_IDLE_TIMEOUT', 300)) # seconds before an idle worker exits
+FUNCTION_CACHE = 32 # functions a worker keeps loaded (the pool mirrors the same rule)
+CPU_LIMIT_MESSAGE = "CPU time limit exceeded in a parallel worker"
+
+MAP, MAP_CHUNKED, CHUNK, END = b'M', b'K', b'C', b'G'
+INIT, LOAD, RUN, QUIT = b'I', b'L', b'X', b'Q'
+RESULT, TRACEBACK, DONE = b'R', b'T', b'D'
+
+POOLS = {}  # { project_id: ProjectPool }
+POOLS_LOCK = threading.Lock()
+
+
+# --- WORKER SIDE ---
+def load_function(payload, namespace):
+    """Rebuild a callable sent by the kernel; script functions get their globals in `namespace`."""
+    version, root, table = pickle.loads(payload)
+    if version != sys.hexversion:
+        raise RuntimeError("The kernel and the parallel workers run different Python versions")
+    built = {}
+    for key, spec in table.items():
+        code = marshal.loads(spec['code'])
+        closure = tuple(types.CellType() for _ in code.co_freevars) or None
+        fn = types.FunctionType(code, namespace, spec['name'], None, closure)
+        fn.__qualname__ = spec['qualname']
+        built[key] = fn
+
+    def value(ref):
+        kind, v = ref
+        if kind == 'fn':
+            return built[v]
+        if kind == 'module':
+            return importlib.import_module(v)
+        return v
+
+    for key, spec in table.items():
+        fn = built[key]
+        for name, ref in spec['globals'].items():
+            try:
+                namespace[name] = value(ref)
+            except ImportError:
+                pass # e.g. `studio`: only there if the function really uses it
+        if spec['defaults'] is not None:
+            fn.__defaults__ = tuple(value(r) for r in spec['defaults'])
+        if spec['kwdefaults']:
+            fn.__kwdefaults__ = {k: value(r) for k, r in spec['kwdefaults'].items()}
+        for cell, ref in zip(fn.__closure__ or (), spec['closure']):
+            if ref is not None:
+                cell.cell_contents = value(ref)
+    return value(root)
+
+
+class _Worker:
+    def __init__(self, conn):
+        self.conn = conn
+        self.running = False
+        self.cpu_seconds = 0
+        self.functions = {} # { digest: [payload, function or None] }
+        self.module = types.ModuleType('__main__')
+        self.module.__dict__['__builtins__'] = builtins
+        sys.modules['__main__'] = self.module # imports.py classes unpickle from here
+        sys.stdin = None
+        signal.signal(signal.SIGINT, self._on_interrupt)
+        signal.signal(signal.SIGXCPU, self._on_cpu_limit)
+
+    def _on_interrupt(self, signum, frame):
+        # The pool interrupts a chunk whose map was abandoned
+        if self.running:
+            raise KeyboardInterrupt
+
+    def _on_cpu_limit(self, signum, frame):
+        self._set_cpu_budget(None)
+        raise RuntimeError(CPU_LIMIT_MESSAGE)
+
+    def _set_cpu_budget(self, seconds):
+        import resource
+        soft = resource.RLIM_INFINITY
+        if seconds:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            soft = int(usage.ru_utime + usage.ru_stime + seconds) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, resource.RLIM_INFINITY))
+
+    def serve(self):
+        while True:
+            frame = read_frame(self.conn)
+            if frame is None or frame[0] == QUIT:
+                return
+            kind, body = frame
+            if kind == INIT:
+                settings = json.loads(body)
+                self.cpu_seconds = settings.get('cpu_seconds') or 0
+                write_frame(self.conn, *self.run_imports(settings.get('imports') or ''))
+            elif kind == LOAD:
+                if len(self.functions) >= FUNCTION_CACHE:
+                    self.functions.clear()
+                self.functions[body[:20]] = [body[20:], None]
+            elif kind == RUN:
+                write_frame(self.conn, *self.run(body[:20], body[20] == 1, body[21:]))
+
+    def run_imports(self, code):
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                exec(compile(code, 'imports.py', 'exec'), self.module.__dict__)
+            return RESULT, b''
+        except BaseException as e:
+            return TRACEBACK, _format_exception(e)
+
+    def run(self, digest, chunked, chunk):
+        out = io.StringIO()
+        try:
+            entry = self.functions[digest]
+            if entry[1] is None:
+                # Each function gets its own copy of the imports.py namespace
+                entry[1] = load_function(entry[0], dict(self.module.__dict__))
+            fn = entry[1]
+            items = pickle.loads(chunk)
+            self._set_cpu_budget(self.cpu_seconds)
+            self.running = True
+            try:
+                with contextlib.redirect_stdout(out):
+                    results = list(fn(items)) if chunked else [fn(item) for item in items]
+            finally:
+                self.running = False
+                self._set_cpu_budget(None)
+            return RESULT, pickle.dumps((out.getvalue(), results), protocol=pickle.HIGHEST_PROTOCOL)
+        except BaseException as e:
+            self.running = False
+            return TRACEBACK, out.getvalue().encode('utf-8', 'replace') + _format_exception(e)
+
+
+def _format_exception(e):
+    # The traceback starts in the user's code: drop the worker's own frames
+    report = traceback.TracebackException(type(e), e, e.__traceback__)
+    report.stack = traceback.StackSummary.from_list([f for f in report.stack if f.filename != __file__])
+    return ''.join(report.format()).encode('utf-8', 'replace')
+
+
+def main(fd):
+    conn = socket.socket(fileno=fd)
+    try:
+        _Worker(conn).serve()
+    finally:
+        conn.close()
+
+
+# --- POOL SIDE ---
+WORKER_ENTRY = "import sys; from compas_studio_online.parallel import main; main(int(sys.argv[1]))"
+
+
+class _Task:
+    __slots__ = ('digest', 'payload', 'chunked', 'chunk', 'state', 'outcome', 'done')
+
+    def __init__(self, digest, payload, chunked, chunk):
+        self.digest = digest
+        self.payload = payload
+        self.chunked = chunked
+        self.chunk = chunk
+        self.state = 'queued' # -> running -> finished, or cancelled
+        self.outcome = None
+        self.done = threading.Event()
+
+    def finish(self, kind, body):
+        self.outcome = (kind, body)
+        self.done.set()
+
+
+class _Slot(threading.Thread):
+    """One worker process of a pool, fed from the pool's task queue."""
+
+    def __init__(self, pool):
+        super().__init__(daemon=True, name=f'parallel-{pool.project_id}')
+        self.pool = pool
+        self.proc = None
+        self.conn = None
+        self.generation = None
+        self.known = set() # function digests the worker has loaded
+        self.task = None
+        self.retired = False
+
+    def run(self):
+        idle_since = time.time()
+        while not self.retired:
+            try:
+                task = self.pool.tasks.get(timeout=1)
+            except queue.Empty:
+                if self.proc is not None and time.time() - idle_since > IDLE_TIMEOUT:
+                    self.stop()
+                continue
+            if not self.pool.begin(self, task):
+                continue
+            try:
+                outcome = self.execute(task)
+            except OSError:
+                outcome = None
+            if outcome is None:
+                self.stop()
+                outcome = (TRACEBACK, b"[Worker Exited] A parallel worker exited while running this chunk "
+                                      b"(memory limit?)")
+            self.pool.end(self, task, outcome)
+            idle_since = time.time()
+        self.stop()
+
+    def execute(self, task):
+        if self.proc is None or self.proc.poll() is not None or self.generation != self.pool.generation:
+            self.launch()
+        if task.digest not in self.known:
+            if len(self.known) >= FUNCTION_CACHE:
+                self.known.clear()
+            self.known.add(task.digest)
+            write_frame(self.conn, LOAD, task.digest + task.payload)
+        write_frame(self.conn, RUN, task.digest + bytes([task.chunked]) + task.chunk)
+        return read_frame(self.conn)
+
+    def launch(self):
+        self.stop()
+        generation, settings = self.pool.generation, self.pool.settings
+        parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(p for p in (PACKAGE_PARENT, env.get('PYTHONPATH')) if p)
+        try:
+            self.proc = subprocess.Popen([sys.executable, '-c', WORKER_ENTRY, str(child.fileno())],
+                                         pass_fds=(child.fileno(),), stdin=subprocess.DEVNULL, env=env,
+                                         start_new_session=True)
+        finally:
+            child.close()
+        self.conn, self.generation, self.known = parent, generation, set()
+        try:
+            resources.set_cpu_priority(self.proc.pid, settings['nice'], batch=True)
+            if settings['memory_mb']:
+                resources.set_memory_limit(self.proc.pid, int(settings['memory_mb'] * 2**20))
+        except (OSError, ValueError, ImportError) as e:
+            print(f"[Parallel] Could not limit worker {self.proc.pid}: {e}")
+        write_frame(parent, INIT, json.dumps({"imports": settings['imports'],
+                                              "cpu_seconds": settings['cpu_seconds']}).encode('utf-8'))
+        reply = read_frame(parent)
+        if reply is None:
+            raise OSError("Parallel worker did not start")
+        if reply[0] == TRACEBACK:
+            print(f"[Parallel] imports.py failed in a worker of {self.pool.project_id}:\n"
+                  f"{reply[1].decode('utf-8', 'replace')}")
+
+    def interrupt(self):
+        proc = self.proc
+        if proc is not None and proc.poll() is None:
+            proc.send_signal(signal.SIGINT)
+
+    def stop(self):
+        proc, conn = self.proc, self.conn
+        self.proc = self.conn = None
+        if proc is None:
+            return
+        try:
+            write_frame(conn, QUIT)
+            proc.wait(timeout=2)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        conn.close()
+
+
+class ProjectPool:
+    """The worker processes of one project and the socket its kernels reach them on."""
+
+    def __init__(self, project_id, settings):
+        self.project_id = project_id
+        self.settings = settings
+        self.generation = 0
+        self.tasks = queue.Queue()
+        self.lock = threading.Lock()
+        self.slots = [_Slot(self) for _ in range(settings['workers'])]
+        for slot in self.slots:
+            slot.start()
+        os.makedirs(SOCKET_DIR, mode=0o700, exist_ok=True)
+        self.path = os.path.join(SOCKET_DIR, f"{project_id}-{os.getpid()}.sock")
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self.listener.listen(16)
+        threading.Thread(target=self._accept, daemon=True, name=f'parallel-accept-{project_id}').start()
+
+    def endpoint(self):
+        return {"socket": self.path, "workers": len(self.slots)}
+
+    def configure(self, settings):
+        """New imports.py or limits: workers restart with them before their next chunk."""
+        with self.lock:
+            if settings == self.settings:
+                return
+            self.settings = settings
+            self.generation += 1
+            if settings['workers'] != len(self.slots):
+                for slot in self.slots[settings['workers']:]:
+                    slot.retired = True
+                self.slots = self.slots[:settings['workers']]
+                while len(self.slots) < settings['workers']:
+                    slot = _Slot(self)
+                    self.slots.append(slot)
+                    slot.start()
+
+    def close(self):
+        with contextlib.suppress(OSError):
+            self.listener.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+        with self.lock:
+            for slot in self.slots:
+                slot.retired = True
+        while True:
+            try:
+                task = self.tasks.get_nowait()
+            except queue.Empty:
+                break
+            self.cancel([task])
+
+    # Task states change under the pool lock: a task is either started by a
+    # slot or cancelled, never both
+    def begin(self, slot, task):
+        with self.lock:
+            if task.state != 'queued':
+                return False
+            task.state = 'running'
+            slot.task = task
+            return True
+
+    def end(self, slot, task, outcome):
+        with self.lock:
+            slot.task = None
+            task.state = 'finished'
+        task.finish(*outcome)
+
+    def cancel(self, tasks):
+        with self.lock:
+            for task in tasks:
+                if task.state == 'queued':
+                    task.state = 'cancelled'
+                    task.finish(TRACEBACK, b"[Cancelled]")
+                elif task.state == 'running':
+                    slot = next((s for s in self.slots if s.task is task), None)
+                    if slot is not None:
+                        slot.interrupt()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return # Closed
+            threading.Thread(target=self._serve, args=(conn,), daemon=True,
+                             name=f'parallel-map-{self.project_id}').start()
+
+    def _serve(self, conn):
+        tasks = []
+        order = queue.Queue()
+        sender = threading.Thread(target=self._send_results, args=(conn, order, tasks), daemon=True)
+        try:
+            frame = read_frame(conn)
+            if frame is None or frame[0] not in (MAP, MAP_CHUNKED):
+                return
+            kind, payload = frame
+            digest = hashlib.sha1(payload).digest()
+            sender.start()
+            while True:
+                frame = read_frame(conn)
+                if frame is None or frame[0] == END:
+                    break
+                task = _Task(digest, payload, kind == MAP_CHUNKED, frame[1])
+                tasks.append(task)
+                order.put(task)
+                self.tasks.put(task)
+            order.put(None)
+            if frame is not None:
+                read_frame(conn) # Returns once the kernel is done with us (or interrupted)
+        except OSError:
+            order.put(None)
+        finally:
+            self.cancel(tasks)
+            if sender.is_alive():
+                sender.join()
+            conn.close()
+
+    def _send_results(self, conn, order, tasks):
+        failed = False
+        while True:
+            task = order.get()
+            if task is None:
+                break
+            task.done.wait()
+            if failed:
+                continue
+            kind, body = task.outcome
+            try:
+                write_frame(conn, kind, body)
+            except OSError:
+                failed = True
+            if kind == TRACEBACK:
+                failed = True
+            if failed:
+                self.cancel(list(tasks))
+        if not failed:
+            with contextlib.suppress(OSError):
+                write_frame(conn, DONE)
+
+
+def endpoint(project_id, settings):
+    """{socket, workers} for a project's kernels, starting or reconfiguring its pool.
+
+    settings: {imports, workers, nice, memory_mb, cpu_seconds}.
+    """
+    with POOLS_LOCK:
+        pool = POOLS.get(project_id)
+        if pool is None:
+            pool = POOLS[project_id] = ProjectPool(project_id, settings)
+        else:
+            pool.configure(settings)
+        return pool.endpoint()
+
+
+def shutdown(project_id):
+    with POOLS_LOCK:
+        pool = POOLS.pop(project_id, None)
+    if pool is not None:
+        pool.close()
+
+
+def shutdown_all():
+    with POOLS_LOCK:
+        pools = list(POOLS.values())
+        POOLS.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,322 @@
+import ast
+import builtins
+import linecache
+import os
+import queue
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import types
+import uuid
+from collections import deque
+
+# --- PROCESS KERNEL ---
+# A plain Python worker process per file instead of an ipykernel: no ZMQ
+# channels, no message signing, no IOPub status traffic. The server and the
+# worker share a Unix socket pair and exchange length-prefixed frames:
+#
+#   [4-byte big-endian body length][1-byte kind][body]
+#
+#   server -> worker   X execute (code), S execute silently, Q quit
+#   worker -> server   R ready, O stdout, E stderr, V value of the last
+#                      expression, T traceback, I idle (run finished)
+#
+# The code runs in a fresh __main__ module like IPython's user namespace, so
+# the reset, injection and introspection code of build_run_code behaves the
+# same. ProcessKernelManager / ProcessKernelClient below stand in for
+# jupyter_client's KernelManager / BlockingKernelClient and turn the frames
+# back into IOPub-shaped messages for collect_kernel_output.
+
+HEADER = struct.Struct('>IB')
+EXECUTE, EXECUTE_SILENT, QUIT = b'X', b'S', b'Q'
+READY, STDOUT, STDERR, VALUE, TRACEBACK, IDLE = b'R', b'O', b'E', b'V', b'T', b'I'
+FLUSH_CHARS = 64 * 1024 # stdout is sent in chunks of at most this many characters ...
+FLUSH_INTERVAL = 0.05   # ... or at least this often (seconds) while a run prints
+CELL = '<cell>'
+
+
+def write_frame(conn, kind, body=b''):
+    conn.sendall(HEADER.pack(len(body), kind[0]) + body)
+
+
+def _recv_exact(conn, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    while n:
+        got = conn.recv_into(view[len(buf) - n:], n)
+        if not got:
+            return None
+        n -= got
+    return bytes(buf)
+
+
+def read_frame(conn):
+    """(kind, body) of the next frame, or None once the other side is gone."""
+    header = _recv_exact(conn, HEADER.size)
+    if header is None:
+        return None
+    length, kind = HEADER.unpack(header)
+    body = _recv_exact(conn, length) if length else b''
+    if body is None:
+        return None
+    return bytes([kind]), body
+
+
+# --- WORKER SIDE ---
+class _Worker:
+    def __init__(self, conn):
+        self.conn = conn
+        self.running = False
+        self.module = types.ModuleType('__main__')
+        self.module.__dict__['__builtins__'] = builtins
+        sys.modules['__main__'] = self.module # pickle finds user classes here
+        sys.stdout = _Stream(self, STDOUT)
+        sys.stderr = _Stream(self, STDERR)
+        sys.stdin = None # input() fails instead of blocking, like a kernel without stdin
+        signal.signal(signal.SIGINT, self._on_interrupt)
+
+    def _on_interrupt(self, signum, frame):
+        # Interrupts only stop user code, never the frame loop
+        if self.running:
+            raise KeyboardInterrupt
+
+    def send(self, kind, body=b''):
+        # A frame is never cut in half by an interrupt; it is raised right after
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGINT})
+        try:
+            write_frame(self.conn, kind, body)
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGINT})
+
+    def serve(self):
+        self.send(READY)
+        while True:
+            frame = read_frame(self.conn)
+            if frame is None or frame[0] == QUIT:
+                return
+            kind, body = frame
+            self.run(body.decode('utf-8'), display=kind == EXECUTE)
+            self.send(IDLE)
+
+    def run(self, code, display=True):
+        namespace = self.module.__dict__
+        linecache.cache[CELL] = (len(code), None, code.splitlines(True), CELL)
+        self.running = True
+        try:
+            tree = ast.parse(code, CELL)
+            last = None
+            if display and tree.body and isinstance(tree.body[-1], ast.Expr):
+                last = ast.Expression(tree.body.pop().value)
+            exec(compile(tree, CELL, 'exec'), namespace)
+            if last is not None:
+                value = eval(compile(last, CELL, 'eval'), namespace)
+                if value is not None:
+                    self._flush()
+                    self.send(VALUE, repr(value).encode('utf-8', 'replace'))
+        except BaseException as e:
+            self.running = False
+            self._flush()
+            # The traceback starts in the user's code: drop the worker's own frames
+            tb = None if isinstance(e, SyntaxError) and e.filename == CELL else e.__traceback__
+            report = traceback.TracebackException(type(e), e, tb)
+            report.stack = traceback.StackSummary.from_list([f for f in report.stack if f.filename != __file__])
+            self.send(TRACEBACK, ''.join(report.format()).encode('utf-8', 'replace'))
+        finally:
+            self.running = False
+            self._flush()
+
+    def _flush(self):
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+class _Stream:
+    """sys.stdout / sys.stderr of the worker: text batched into frames."""
+
+    encoding = 'utf-8'
+    errors = 'replace'
+
+    def __init__(self, worker, kind):
+        self.worker = worker
+        self.kind = kind
+        self.parts = []
+        self.size = 0
+        self.last = time.monotonic()
+
+    def write(self, text):
+        if not isinstance(text, str):
+            raise TypeError(f"write() argument must be str, not {type(text).__name__}")
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= FLUSH_CHARS or time.monotonic() - self.last >= FLUSH_INTERVAL:
+            self.flush()
+        return len(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        self.last = time.monotonic()
+        if not self.parts:
+            return
+        text = ''.join(self.parts)
+        self.parts, self.size = [], 0
+        self.worker.send(self.kind, text.encode('utf-8', 'replace'))
+
+    def isatty(self):
+        return False
+
+    def writable(self):
+        return True
+
+
+def main(fd):
+    conn = socket.socket(fileno=fd)
+    try:
+        _Worker(conn).serve()
+    finally:
+        conn.close()
+
+
+# --- SERVER SIDE ---
+WORKER_ENTRY = "import sys; from compas_studio_online.process_kernel import main; main(int(sys.argv[1]))"
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ProcessKernelClient:
+    def __init__(self, manager):
+        self.manager = manager
+        self._iopub = queue.Queue()
+        self._send_lock = threading.Lock()
+        self._conn = None
+        self._pending = deque() # msg ids sent to the worker, in order
+        self._ready = threading.Event()
+
+    def _attach(self, conn, proc):
+        """Read from a (new) worker process; runs sent to an older one are answered there."""
+        self._conn = conn
+        self._pending = deque()
+        self._ready = threading.Event()
+        threading.Thread(target=self._read, args=(conn, proc, self._pending, self._ready), daemon=True,
+                         name='process-kernel-reader').start()
+
+    def start_channels(self):
+        if self._conn is None and self.manager.conn is not None:
+            self._attach(self.manager.conn, self.manager.proc)
+
+    def stop_channels(self):
+        pass # The reader ends with the worker's socket
+
+    def wait_for_ready(self, timeout=None):
+        if not self._ready.wait(timeout):
+            raise RuntimeError("Worker process did not start")
+
+    def execute(self, code, silent=False, **kwargs):
+        msg_id = uuid.uuid4().hex
+        with self._send_lock:
+            self._pending.append(msg_id)
+            write_frame(self._conn, EXECUTE_SILENT if silent else EXECUTE, code.encode('utf-8'))
+        return msg_id
+
+    def get_iopub_msg(self, timeout=None):
+        return self._iopub.get(timeout=timeout)
+
+    def _put(self, msg_id, msg_type, content):
+        self._iopub.put({'header': {'msg_type': msg_type}, 'parent_header': {'msg_id': msg_id}, 'content': content})
+
+    def _read(self, conn, proc, pending, ready):
+        while True:
+            try:
+                frame = read_frame(conn)
+            except OSError:
+                frame = None
+            if frame is None:
+                break
+            kind, body = frame
+            if kind == READY:
+                ready.set()
+                continue
+            msg_id = pending[0] if pending else None
+            if kind == IDLE:
+                if pending: pending.popleft()
+                self._put(msg_id, 'status', {'execution_state': 'idle'})
+            elif kind in (STDOUT, STDERR):
+                self._put(msg_id, 'stream', {'name': 'stdout' if kind == STDOUT else 'stderr',
+                                             'text': body.decode('utf-8', 'replace')})
+            elif kind == VALUE:
+                self._put(msg_id, 'execute_result', {'data': {'text/plain': body.decode('utf-8', 'replace')}})
+            elif kind == TRACEBACK:
+                self._put(msg_id, 'error', {'traceback': [body.decode('utf-8', 'replace')]})
+        # The worker is gone: let is_alive() see it, then finish the runs it still owed
+        try:
+            proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            pass
+        while pending:
+            msg_id = pending.popleft()
+            self._put(msg_id, 'error', {'traceback': ["[Worker Exited] The worker process exited during execution."]})
+            self._put(msg_id, 'status', {'execution_state': 'idle'})
+
+
+class ProcessKernelManager:
+    def __init__(self, kernel_name=None, **kwargs):
+        self.proc = None
+        self.conn = None
+        self.provisioner = types.SimpleNamespace(pid=None) # resources.kernel_pid reads provisioner.pid
+        self._client = None
+
+    def start_kernel(self, **kwargs):
+        parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(p for p in (PACKAGE_PARENT, env.get('PYTHONPATH')) if p)
+        try:
+            self.proc = subprocess.Popen([sys.executable, '-c', WORKER_ENTRY, str(child.fileno())],
+                                         pass_fds=(child.fileno(),), stdin=subprocess.DEVNULL, env=env,
+                                         start_new_session=True)
+        finally:
+            child.close()
+        self.conn = parent
+        self.provisioner.pid = self.proc.pid
+        if self._client is not None:
+            self._client._attach(parent, self.proc)
+
+    def client(self):
+        if self._client is None:
+            self._client = ProcessKernelClient(self)
+        return self._client
+
+    def is_alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def interrupt_kernel(self):
+        if self.is_alive():
+            self.proc.send_signal(signal.SIGINT)
+
+    def restart_kernel(self, now=False, **kwargs):
+        self._stop(now)
+        self.start_kernel()
+
+    def shutdown_kernel(self, now=False, restart=False):
+        self._stop(now)
+
+    def _stop(self, now):
+        proc, conn = self.proc, self.conn
+        if proc is None:
+            return
+        if not now and proc.poll() is None:
+            try:
+                write_frame(conn, QUIT)
+                proc.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        conn.close()
+        self.proc = self.conn = None
@@ -0,0 +1,124 @@
+import os
+
+# --- HOST RESOURCES ---
+# Memory readings from /proc (Linux). Every function returns None where
+# /proc is not available, and callers fall back to time-based behaviour.
+
+
+def memory_info():
+    """(available_bytes, total_bytes) of the host, or None."""
+    try:
+        values = {}
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                key, rest = line.split(':', 1)
+                values[key] = int(rest.split()[0]) * 1024
+        return values['MemAvailable'], values['MemTotal']
+    except (OSError, KeyError, ValueError, IndexError):
+        return None
+
+
+def _children(pid):
+    pids = []
+    try:
+        for tid in os.listdir(f'/proc/{pid}/task'):
+            with open(f'/proc/{pid}/task/{tid}/children', 'r') as f:
+                pids.extend(int(p) for p in f.read().split())
+    except (OSError, ValueError):
+        pass
+    return pids
+
+
+def process_rss(pid, include_children=True):
+    """Resident memory of a process (and its descendants) in bytes, or None."""
+    if not pid:
+        return None
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            rss = next((int(line.split()[1]) * 1024 for line in f if line.startswith('VmRSS:')), 0)
+    except (OSError, ValueError, IndexError):
+        return None
+    if include_children:
+        for child in _children(pid):
+            rss += process_rss(child) or 0
+    return rss
+
+
+def kernel_pid(km):
+    """OS pid of a local Jupyter kernel, or None (remote or not started)."""
+    provisioner = getattr(km, 'provisioner', None)
+    return getattr(provisioner, 'pid', None)
+
+
+def process_cpu_time(pid):
+    """User + system CPU seconds a process has used so far, or None."""
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def set_cpu_budget(pid, seconds):
+    """Let a process use `seconds` more CPU time before it gets SIGXCPU.
+
+    Only the soft limit moves; the hard limit stays unlimited so the budget
+    can be renewed for every run without privileges.
+    """
+    import resource
+    used = process_cpu_time(pid)
+    if used is None:
+        return False
+    soft = int(used + seconds) + 1
+    resource.prlimit(pid, resource.RLIMIT_CPU, (soft, resource.RLIM_INFINITY))
+    return True
+
+
+def set_memory_limit(pid, limit_bytes):
+    """Cap a process's data segment (heap and anonymous mappings) at limit_bytes."""
+    import resource
+    resource.prlimit(pid, resource.RLIMIT_DATA, (limit_bytes, limit_bytes))
+    return True
+
+
+def can_raise_priority():
+    """Whether this process may lower a nice value again (root or RLIMIT_NICE)."""
+    try:
+        import resource
+        if os.geteuid() == 0:
+            return True
+        # RLIMIT_NICE allows nice values down to 20 - soft limit
+        soft = resource.getrlimit(resource.RLIMIT_NICE)[0]
+        return soft == resource.RLIM_INFINITY or soft >= 20
+    except (AttributeError, ImportError, OSError):
+        return False
+
+
+def set_cpu_priority(pid, nice=0, batch=False):
+    """Set the nice value and scheduler policy of every thread of a process.
+
+    batch=True selects SCHED_BATCH (no wakeup preemption of interactive
+    processes); switching between SCHED_BATCH and SCHED_OTHER needs no
+    privileges. Raising the nice value never does either, lowering it does
+    (see can_raise_priority). Returns False where this is not supported.
+    """
+    policy = getattr(os, 'SCHED_BATCH' if batch else 'SCHED_OTHER', None)
+    if policy is None or not hasattr(os, 'sched_setscheduler'):
+        return False
+    try:
+        tids = [int(t) for t in os.listdir(f'/proc/{pid}/task')]
+    except (OSError, ValueError):
+        tids = [pid]
+    ok = False
+    for tid in tids:
+        try:
+            os.sched_setscheduler(tid, policy, os.sched_param(0))
+            os.setpriority(os.PRIO_PROCESS, tid, nice)
+            ok = True
+        except ProcessLookupError:
+            continue # Thread exited
+        except PermissionError:
+            # Nice could not be lowered; the policy switch above still applies
+            ok = True
+    return ok
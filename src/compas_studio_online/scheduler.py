@@ -0,0 +1,250 @@
+import threading
+import time
+from collections import deque
+
+# Execution scheduler shared by every kernel.
+#
+# - At most one pending run per file ("project_id/filename"). A newer request
+#   replaces the payload of the pending one (latest wins) and every caller
+#   attached to it receives the result of the newest code.
+# - At most one running run per file; a file that is busy keeps its pending
+#   run until the current one finishes.
+# - Projects are served round-robin, so one project with many files cannot
+#   starve the others when all worker slots are busy.
+# - Single flight: a request whose `dedupe` key matches the run in progress
+#   for its file (same code and inputs) joins that run instead of queueing
+#   a repeat, as long as nothing newer is pending.
+# - Interactive runs (a user waiting on the result) go before background runs
+#   (wake-up re-runs, batch runs), and at most `max_background` background
+#   runs execute at once, so some workers are always free for interactive
+#   work. A pending background run is promoted when an interactive request
+#   joins it.
+
+RECENT_WAITS = 500 # Wait samples kept for percentiles
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+
+class RunTicket:
+    """Handle shared by every caller waiting on the same pending run."""
+
+    def __init__(self, project_id, filename, payload, dedupe=None, priority=INTERACTIVE):
+        self.project_id = project_id
+        self.filename = filename
+        self.key = f"{project_id}/{filename}"
+        self.payload = payload
+        self.dedupe = dedupe
+        self.priority = priority
+        self.callers = 1
+        self.enqueued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """The result, or None if the run has not finished `timeout` seconds after it started."""
+        if timeout is None:
+            self._done.wait()
+            return self.result
+        # Time in the queue does not count: it is bounded by the runs ahead
+        while not self._done.is_set():
+            started_at = self.started_at
+            if started_at is None:
+                self._done.wait(1.0)
+            elif not self._done.wait(max(0.0, started_at + timeout - time.time())):
+                return None
+        return self.result
+
+    @property
+    def wait_time(self):
+        if self.started_at is None:
+            return time.time() - self.enqueued_at
+        return self.started_at - self.enqueued_at
+
+
+class ExecutionScheduler:
+    def __init__(self, run_fn, max_workers=4, max_background=None):
+        self.run_fn = run_fn # (project_id, filename, *payload, priority=...) -> result
+        self.max_workers = max_workers
+        self.max_background = max_background if max_background is not None else max(1, max_workers // 2)
+        self.cond = threading.Condition()
+        self.pending = {}        # { key: RunTicket } - not started yet
+        self.running = {}        # { key: RunTicket }
+        self.project_queues = {} # { project_id: deque([key, ...]) }
+        self.rotation = deque()  # project ids with pending work, in service order
+        self.workers = []
+
+        # Stats
+        self.recent_waits = {INTERACTIVE: deque(maxlen=RECENT_WAITS), BACKGROUND: deque(maxlen=RECENT_WAITS)}
+        self.project_stats = {}  # { project_id: {runs, coalesced, wait_total, wait_max, run_total} }
+
+    # --- PUBLIC API ---
+    def submit(self, project_id, filename, *payload, dedupe=None, priority=INTERACTIVE):
+        """Queue a run for a file and return its ticket (latest wins)."""
+        with self.cond:
+            self._ensure_workers()
+            key = f"{project_id}/{filename}"
+            ticket = self.pending.get(key)
+            if ticket:
+                # Replace the older pending payload. Its callers get the newer result.
+                ticket.payload = payload
+                ticket.dedupe = dedupe
+                ticket.callers += 1
+                if priority == INTERACTIVE:
+                    ticket.priority = INTERACTIVE
+                self._stats_for(project_id)['coalesced'] += 1
+                return ticket
+
+            running = self.running.get(key)
+            if dedupe is not None and running is not None and running.dedupe == dedupe:
+                # The same run is already in progress: share its result
+                running.callers += 1
+                self._stats_for(project_id)['shared'] += 1
+                return running
+
+            ticket = RunTicket(project_id, filename, payload, dedupe, priority)
+            self.pending[key] = ticket
+            self.project_queues.setdefault(project_id, deque()).append(key)
+            if project_id not in self.rotation:
+                self.rotation.append(project_id)
+            self.cond.notify()
+            return ticket
+
+    def run(self, project_id, filename, *payload, dedupe=None, priority=INTERACTIVE, timeout=None):
+        """Submit and block until the (possibly coalesced or shared) run finishes.
+
+        Returns None if the run is still going `timeout` seconds after it started.
+        """
+        ticket = self.submit(project_id, filename, *payload, dedupe=dedupe, priority=priority)
+        result = ticket.wait(timeout)
+        if result is None:
+            if ticket.started_at is not None and not ticket._done.is_set():
+                print(f"[Scheduler] Gave up waiting on {ticket.key} after {timeout:g}s")
+            return None
+        # Callers of a shared run each get their own copy to annotate
+        result = dict(result)
+        result['queue'] = {
+            "wait_ms": round(ticket.wait_time * 1000.0, 1),
+            "callers": ticket.callers,
+            "priority": ticket.priority,
+        }
+        return result
+
+    def queue_depth(self, project_id=None):
+        with self.cond:
+            if project_id is None:
+                return len(self.pending)
+            return len(self.project_queues.get(project_id, ()))
+
+    def stats(self):
+        """Snapshot of queue depth and wait times, for the /scheduler endpoint."""
+        with self.cond:
+            now = time.time()
+            def pct(samples, p):
+                waits = sorted(samples)
+                return round(waits[min(len(waits) - 1, int(p / 100.0 * len(waits)))] * 1000.0, 1) if waits else 0.0
+            classes = {}
+            for priority, samples in self.recent_waits.items():
+                classes[priority] = {
+                    "queued": sum(1 for t in self.pending.values() if t.priority == priority),
+                    "running": sum(1 for t in self.running.values() if t.priority == priority),
+                    "wait_p50_ms": pct(samples, 50),
+                    "wait_p95_ms": pct(samples, 95),
+                    "wait_max_ms": pct(samples, 100),
+                }
+            all_waits = list(self.recent_waits[INTERACTIVE]) + list(self.recent_waits[BACKGROUND])
+            projects = {}
+            for pid, s in self.project_stats.items():
+                projects[pid] = {
+                    "queued": len(self.project_queues.get(pid, ())),
+                    "running": sum(1 for t in self.running.values() if t.project_id == pid),
+                    "runs": s['runs'],
+                    "coalesced": s['coalesced'],
+                    "shared": s['shared'],
+                    "wait_avg_ms": round(s['wait_total'] / s['runs'] * 1000.0, 1) if s['runs'] else 0.0,
+                    "wait_max_ms": round(s['wait_max'] * 1000.0, 1),
+                    "kernel_seconds": round(s['run_total'], 3),
+                }
+            return {
+                "workers": self.max_workers,
+                "max_background": self.max_background,
+                "queued": len(self.pending),
+                "running": len(self.running),
+                "oldest_wait_ms": round(max((now - t.enqueued_at for t in self.pending.values()), default=0.0) * 1000.0, 1),
+                "wait_p50_ms": pct(all_waits, 50),
+                "wait_p95_ms": pct(all_waits, 95),
+                "interactive": classes[INTERACTIVE],
+                "background": classes[BACKGROUND],
+                "projects": projects,
+            }
+
+    # --- INTERNALS ---
+    def _stats_for(self, project_id):
+        if project_id not in self.project_stats:
+            self.project_stats[project_id] = {'runs': 0, 'coalesced': 0, 'shared': 0, 'wait_total': 0.0, 'wait_max': 0.0, 'run_total': 0.0}
+        return self.project_stats[project_id]
+
+    def _ensure_workers(self):
+        # Started lazily so importing the server does not spawn threads
+        while len(self.workers) < self.max_workers:
+            t = threading.Thread(target=self._worker, daemon=True, name=f"exec-worker-{len(self.workers)}")
+            self.workers.append(t)
+            t.start()
+
+    def _next_ticket(self):
+        """Pick the next runnable ticket: interactive first, background while under its cap."""
+        ticket = self._next_of({INTERACTIVE})
+        if ticket is None:
+            background = sum(1 for t in self.running.values() if t.priority == BACKGROUND)
+            if background < self.max_background:
+                ticket = self._next_of({BACKGROUND})
+        return ticket
+
+    def _next_of(self, priorities):
+        """Next runnable ticket of the given classes, round-robin over projects. Caller holds cond."""
+        for _ in range(len(self.rotation)):
+            project_id = self.rotation[0]
+            queue = self.project_queues[project_id]
+            for key in queue:
+                if key in self.running or self.pending[key].priority not in priorities:
+                    continue # File busy (its pending run waits) or another class
+                queue.remove(key)
+                self.rotation.popleft()
+                if queue:
+                    self.rotation.append(project_id) # Back of the line
+                else:
+                    del self.project_queues[project_id]
+                return self.pending.pop(key)
+            self.rotation.rotate(-1)
+        return None
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                ticket = self._next_ticket()
+                while ticket is None:
+                    self.cond.wait()
+                    ticket = self._next_ticket()
+                ticket.started_at = time.time()
+                self.running[ticket.key] = ticket
+
+            result = None
+            try:
+                result = self.run_fn(ticket.project_id, ticket.filename, *ticket.payload, priority=ticket.priority)
+            except Exception as e:
+                print(f"[Scheduler] Run for {ticket.key} failed: {e}")
+            finally:
+                ticket.finished_at = time.time()
+                with self.cond:
+                    del self.running[ticket.key]
+                    s = self._stats_for(ticket.project_id)
+                    s['runs'] += 1
+                    s['wait_total'] += ticket.wait_time
+                    s['wait_max'] = max(s['wait_max'], ticket.wait_time)
+                    s['run_total'] += ticket.finished_at - ticket.started_at
+                    self.recent_waits[ticket.priority].append(ticket.wait_time)
+                    # A pending run for this file may have become runnable
+                    self.cond.notify_all()
+                ticket.result = result
+                ticket._done.set()
@@ -1,21 +1,39 @@
-from flask import Flask, jsonify, request, send_from_directory
+from . import startup
+from flask import Flask, Response, abort, jsonify, request
 from flask_cors import CORS
+startup.mark('import_flask')
 from flask_socketio import SocketIO, join_room, leave_room, emit
-from jupyter_client import KernelManager
+startup.mark('import_socketio')
 import queue
 import time
 import os
 import json
-import base64
 import pickle 
 import threading
+import itertools
 import shutil
-import random
+import uuid
+import urllib.request
+import urllib.error
+
+from .scheduler import ExecutionScheduler, INTERACTIVE, BACKGROUND
+from .store import create_store
+from .message_queue import socketio_options
+from .hashring import HashRing
+from .kernel_host import RemoteKernelManager, rpc
+from .kernel_pool import KernelPool
+from . import snapshots, checkpoints, resources, dependencies, sweeps, assets, ai, parallel
+from .catalog import ProjectCatalog
+from .output_buffer import OutputBuffer, read_log
+startup.mark('import_modules')
 
 app = Flask(__name__)
 CORS(app)
 # Force threading mode to avoid ZMQ blocking eventlet loop
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+# With several worker processes, room broadcasts go through SOCKETIO_MESSAGE_QUEUE
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading',
+                    **socketio_options(os.environ.get('SOCKETIO_MESSAGE_QUEUE')))
+startup.mark('create_app')
 
 # --- CONFIG ---
 PORT = int(os.environ.get('PORT', 5001))
@@ -24,34 +42,162 @@ STATIC_FOLDER = os.path.dirname(os.path.abspath(__file__))
 PROJECTS_DIR = os.path.join(STATIC_FOLDER, 'projects')
 
 # --- GLOBAL STORE ---
-# Keyed by Project ID
-GLOBAL_VARIABLES = {} # { project_id: { var: b64, ... } }
-FILE_EXPORTS = {}     # { project_id: { file: [vars], ... } }
+# Project globals, file exports and activity live in the state store (see store.py)
+# so several worker processes can share them. Kernels stay in the owning process.
+STORE = create_store(os.environ.get('STATE_STORE'))
+startup.mark('create_store')
 KERNELS = {}          # { "project_id/filename": { km, kc, lock } }
 KERNEL_LOCKS = {}     # { "project_id/filename": Lock }
 BASE_LOCK = threading.Lock() 
+LAST_RESULTS = {}     # { "project_id/filename": { fingerprint, result } } - snapshotted on hibernate
+
+# jupyter_client is heavy to import; loaded on the first kernel start
+KernelManager = None
+
+# --- WORKER PROCESSES ---
+# Set by workers.py when running more than one process. Each project's kernels
+# live in exactly one worker; other workers forward its executions there.
+WORKER_ID = os.environ.get('WORKER_ID')
+WORKER_STALE_AFTER = 15 # seconds without heartbeat before a worker's projects are taken over
+
+# --- KERNEL HOSTS ---
+# KERNEL_HOSTS="127.0.0.1:6001,127.0.0.1:6002" runs kernels in kernel_host.py
+# daemons instead of this process. Projects are placed by consistent hashing
+# on project_id, so all kernels of a project share a host.
+KERNEL_HOSTS = [h.strip() for h in os.environ.get('KERNEL_HOSTS', '').split(',') if h.strip()]
+KERNEL_RING = HashRing(KERNEL_HOSTS)
+
+# --- EXECUTION BACKEND ---
+# EXECUTION_BACKEND selects what runs a file locally:
+#   jupyter   an ipykernel per file (default)
+#   process   a plain Python worker process per file (process_kernel.py),
+#             framed messages over a Unix socket, no ZMQ or message signing
+# Both provide the KernelManager / BlockingKernelClient subset the server
+# uses: km.start_kernel, client, is_alive, interrupt_kernel, restart_kernel,
+# shutdown_kernel, provisioner.pid and kc.start_channels, stop_channels,
+# wait_for_ready, execute, get_iopub_msg. kernel_host.py and the benchmark's
+# fake kernel plug in the same way.
+EXECUTION_BACKEND = os.environ.get('EXECUTION_BACKEND', 'jupyter')
+
+# --- KERNEL POOL ---
+# Local kernels started ahead of time (see kernel_pool.py); filled once
+# background services start.
+KERNEL_POOL_SIZE = int(os.environ.get('KERNEL_POOL_SIZE', 1))
+KERNEL_POOL_PRELOAD = os.environ.get('KERNEL_POOL_PRELOAD', 'import compas')
 
 # --- HIBERNATION MANAGEMENT ---
-PROJECT_ACTIVITY = {} # { project_id: timestamp }
-HIBERNATION_TIMEOUT = 1800 # 30 minutes (seconds)
-HIBERNATION_CHECK_INTERVAL = 60 # Check every minute
+# The idle timeout follows the host's available memory (MemAvailable / MemTotal):
+#   below MEMORY_LOW_WATERMARK   pressure: idle projects are hibernated now, most
+#                                idle x largest kernels first, until enough is freed
+#   above MEMORY_HIGH_WATERMARK  plentiful: projects stay warm for HIBERNATION_RELAXED_TIMEOUT
+#   otherwise                    HIBERNATION_TIMEOUT
+HIBERNATION_TIMEOUT = int(os.environ.get('HIBERNATION_TIMEOUT', 1800)) # 30 minutes (seconds)
+HIBERNATION_RELAXED_TIMEOUT = int(os.environ.get('HIBERNATION_RELAXED_TIMEOUT', 4 * 3600))
+HIBERNATION_MIN_IDLE = int(os.environ.get('HIBERNATION_MIN_IDLE', 60)) # never evict projects used this recently
+HIBERNATION_CHECK_INTERVAL = int(os.environ.get('HIBERNATION_CHECK_INTERVAL', 15))
+MEMORY_LOW_WATERMARK = float(os.environ.get('MEMORY_LOW_WATERMARK', 0.15))
+MEMORY_HIGH_WATERMARK = float(os.environ.get('MEMORY_HIGH_WATERMARK', 0.5))
+
+# --- EXECUTION SCHEDULING ---
+# Runs are interactive (a user waits on them) or background (wake-up re-runs,
+# project runs, warm-up, sweeps). Background runs are capped at
+# MAX_BACKGROUND_RUNS at once and their local kernels run under SCHED_BATCH,
+# plus BACKGROUND_NICE when the server may lower the nice value again.
+MAX_CONCURRENT_RUNS = int(os.environ.get('MAX_CONCURRENT_RUNS', max(2, os.cpu_count() or 2)))
+MAX_BACKGROUND_RUNS = int(os.environ.get('MAX_BACKGROUND_RUNS', max(1, MAX_CONCURRENT_RUNS // 2)))
+BACKGROUND_NICE = int(os.environ.get('BACKGROUND_NICE', 10))
+RENICE_ALLOWED = resources.can_raise_priority()
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+# --- EXECUTION LIMITS ---
+# A run that exceeds its timeout is interrupted; if the kernel does not come
+# back within INTERRUPT_GRACE seconds it is restarted. Local kernels can also
+# get a CPU-time budget per run (SIGXCPU, raised as an error in the kernel)
+# and a memory cap (RLIMIT_DATA). 0 disables a limit. A project overrides
+# the defaults with "limits": {"timeout_seconds", "cpu_seconds", "memory_mb"}
+# in its project.json.
+EXECUTION_TIMEOUT = float(os.environ.get('EXECUTION_TIMEOUT', 30))
+INTERRUPT_GRACE = float(os.environ.get('INTERRUPT_GRACE', 5))
+KERNEL_CPU_LIMIT = float(os.environ.get('KERNEL_CPU_LIMIT', 0))        # seconds per run
+KERNEL_MEMORY_LIMIT_MB = int(os.environ.get('KERNEL_MEMORY_LIMIT_MB', 0))
+STUDIO_CACHE_MB = float(os.environ.get('STUDIO_CACHE_MB', 256))         # studio.cache values kept per kernel
+PARALLEL_WORKERS = int(os.environ.get('PARALLEL_WORKERS', min(4, os.cpu_count() or 1))) # studio.parallel_map, < 2 = in the kernel
+
+# Compact mesh payloads: positions quantized to this many bits (8-16, 0 = plain JSON).
+# Projects override it with "geometry": {"quantize_bits": n} in project.json.
+# Predictive warm-up: kernels for the files a user is about to run
+WARMUP_MAX_FILES = int(os.environ.get('WARMUP_MAX_FILES', 4))          # per project
+WARMUP_BOOT_PROJECTS = int(os.environ.get('WARMUP_BOOT_PROJECTS', 2))  # most recent projects warmed at boot
+WARMUP_BOOT_WINDOW = int(os.environ.get('WARMUP_BOOT_WINDOW', 24 * 3600)) # only projects used this recently
+ACTIVITY_FILE = '.activity.json' # in PROJECTS_DIR, last activity of every project across restarts
+
+MESH_QUANTIZE_BITS = int(os.environ.get('MESH_QUANTIZE_BITS', 0))
+MESH_QUANTIZE_MIN_VERTICES = int(os.environ.get('MESH_QUANTIZE_MIN_VERTICES', 64)) # smaller meshes stay plain
+
+# Installed in the kernel when a CPU budget is set: turn SIGXCPU into an error
+# and lift the soft limit so the idle kernel is not signalled again.
+CPU_LIMIT_MESSAGE = "CPU time limit exceeded"
+CPU_LIMIT_HANDLER = f"""import signal as _vp_signal, resource as _vp_resource
+def _vp_on_cpu_limit(signum, frame):
+    _vp_resource.setrlimit(_vp_resource.RLIMIT_CPU, (_vp_resource.RLIM_INFINITY, _vp_resource.RLIM_INFINITY))
+    raise RuntimeError("{CPU_LIMIT_MESSAGE}")
+_vp_signal.signal(_vp_signal.SIGXCPU, _vp_on_cpu_limit)
+"""
 
 def update_activity(project_id):
     if project_id and project_id != 'default':
-        PROJECT_ACTIVITY[project_id] = time.time()
+        STORE.touch(project_id)
+
+def project_owner_address(project_id):
+    """Internal address of the worker owning this project's kernels, or None if it is us."""
+    if not WORKER_ID:
+        return None
+    owner, address = STORE.claim_project(project_id, WORKER_ID, stale_after=WORKER_STALE_AFTER)
+    if owner == WORKER_ID or not address:
+        return None
+    return address
+
+def _owner_request(address, path, payload):
+    return urllib.request.Request(
+        f"http://{address}{path}",
+        data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json', 'X-Studio-Forwarded': '1'}
+    )
+
+def forward_to_owner(address, path, payload):
+    """Replay a JSON POST on the owning worker. Returns (body, status)."""
+    req = _owner_request(address, path, payload)
+    try:
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            return json.loads(resp.read()), resp.status
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read() or b'{}'), e.code
+    except Exception as e:
+        print(f"[Workers] Forwarding {path} to {address} failed: {e}")
+        return {"success": False, "error": "Owning worker unreachable"}, 502
+
+def forward_stream_to_owner(address, path, payload):
+    """Replay a streaming (NDJSON) POST on the owning worker, yielding its lines."""
+    try:
+        with urllib.request.urlopen(_owner_request(address, path, payload), timeout=600) as resp:
+            for line in resp:
+                yield line.decode('utf-8')
+    except Exception as e:
+        print(f"[Workers] Forwarding {path} to {address} failed: {e}")
+        yield json.dumps({"type": "error", "error": "Owning worker unreachable"}) + '\n'
 
 def get_project_state_file(project_id):
     return os.path.join(PROJECTS_DIR, project_id, '.state.pkl')
 
 def save_project_state(project_id):
     """Save global variables to disk for a specific project."""
-    if project_id not in GLOBAL_VARIABLES: return
+    if not STORE.is_loaded(project_id): return
     
     path = get_project_state_file(project_id)
     try:
         data = {
-            'vars': GLOBAL_VARIABLES.get(project_id, {}),
-            'exports': FILE_EXPORTS.get(project_id, {})
+            'vars': STORE.get_globals(project_id),
+            'exports': STORE.get_exports(project_id)
         }
         with open(path, 'wb') as f:
             pickle.dump(data, f)
@@ -59,26 +205,76 @@ def save_project_state(project_id):
     except Exception as e:
         print(f"[Hibernation] Failed to save state for {project_id}: {e}")
 
+    save_project_snapshots(project_id)
+
+def read_project_state(project_id):
+    """The saved {'vars', 'exports'} of a project, or None."""
+    path = get_project_state_file(project_id)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
 def load_project_state(project_id):
     """Load global variables from disk for a specific project."""
-    path = get_project_state_file(project_id)
-    if os.path.exists(path):
+    try:
+        data = read_project_state(project_id)
+        if data is None:
+            return False
+        STORE.load_project(project_id, data.get('vars', {}), data.get('exports', {}))
+        print(f"[Hibernation] State loaded for {project_id}")
+        return True
+    except Exception as e:
+        print(f"[Hibernation] Failed to load state for {project_id}: {e}")
+    return False
+
+def save_project_snapshots(project_id):
+    """Write the last result of each file that ran since the project woke up."""
+    project_dir = os.path.join(PROJECTS_DIR, project_id)
+    prefix = f"{project_id}/"
+    for key in [k for k in LAST_RESULTS if k.startswith(prefix)]:
+        entry = LAST_RESULTS.pop(key, None)
+        if not entry: continue
         try:
-            with open(path, 'rb') as f:
-                data = pickle.load(f)
-                GLOBAL_VARIABLES[project_id] = data.get('vars', {})
-                FILE_EXPORTS[project_id] = data.get('exports', {})
-            print(f"[Hibernation] State loaded for {project_id}")
-            return True
+            snapshots.save(project_dir, key[len(prefix):], entry['fingerprint'], entry['result'])
         except Exception as e:
-            print(f"[Hibernation] Failed to load state for {project_id}: {e}")
-    return False
+            print(f"[Snapshots] Failed to save {key}: {e}")
 
-def hibernate_project(project_id):
+def pre_import_for(filename, files):
+    """The pre-import code a file runs with: imports.py, except for imports.py itself."""
+    if filename == 'imports.py':
+        return ""
+    return next((code for fname, code in files if fname == 'imports.py'), "")
+
+def fresh_snapshots(project_id, files=None):
+    """{ filename: result } for every file whose snapshot still matches its inputs."""
+    if files is None:
+        files = find_project_files(project_id)
+    if STORE.is_loaded(project_id):
+        project_globals, exports = STORE.get_globals(project_id), STORE.get_exports(project_id)
+    else:
+        try:
+            data = read_project_state(project_id) or {}
+        except Exception:
+            data = {}
+        project_globals, exports = data.get('vars', {}), data.get('exports', {})
+
+    project_dir = os.path.join(PROJECTS_DIR, project_id)
+    fresh = {}
+    for fname, code in files:
+        entry = LAST_RESULTS.get(f"{project_id}/{fname}") or snapshots.load(project_dir, fname)
+        if not entry: continue
+        fp = snapshots.fingerprint(code, pre_import_for(fname, files), project_globals, exports.get(fname, []))
+        if entry['fingerprint'] == fp:
+            fresh[fname] = {k: entry['result'].get(k) for k in snapshots.SNAPSHOT_FIELDS}
+    return fresh
+
+def hibernate_project(project_id, reason=None):
     """Shut down kernels and clear memory for an idle project."""
-    print(f"[Hibernation] Hibernating project {project_id}...")
+    print(f"[Hibernation] Hibernating project {project_id}{f' ({reason})' if reason else ''}...")
     
     # 1. Save State
+    checkpoint_project(project_id)
     save_project_state(project_id)
     
     # 2. Shutdown Kernels
@@ -101,40 +297,107 @@ def hibernate_project(project_id):
             if key in KERNEL_LOCKS:
                 del KERNEL_LOCKS[key]
                 
+    parallel.shutdown(project_id)
+
     # 3. Clear Memory
-    if project_id in GLOBAL_VARIABLES: del GLOBAL_VARIABLES[project_id]
-    if project_id in FILE_EXPORTS: del FILE_EXPORTS[project_id]
-    if project_id in PROJECT_ACTIVITY: del PROJECT_ACTIVITY[project_id]
+    STORE.drop_project(project_id)
+    if WORKER_ID:
+        STORE.release_project(project_id, WORKER_ID)
     
     print(f"[Hibernation] Project {project_id} is now dormant.")
 
-def ensure_project_active(project_id):
-    """Wake up project if dormant."""
+def run_checkpoint_op(kc, code):
+    """Run checkpoint save/restore code in a kernel and return its report."""
+    msg_id = kc.execute(code)
+    result = collect_kernel_output(kc, msg_id)
+    report = result.get('blocks', {}).get('CHECKPOINT')
+    if report is None:
+        report = {"error": result['error'] or "No checkpoint report"}
+    return report
+
+def checkpoint_project(project_id):
+    """Checkpoint the user namespace of every live kernel of a project."""
+    project_dir = os.path.join(PROJECTS_DIR, project_id)
+    prefix = f"{project_id}/"
+    for key, kdata in [(k, v) for k, v in list(KERNELS.items()) if k.startswith(prefix)]:
+        path = checkpoints.path_for(project_dir, key[len(prefix):])
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with kdata['exec_lock']:
+                report = run_checkpoint_op(kdata['kc'], checkpoints.save_code(path))
+        except Exception as e:
+            report = {"error": str(e)}
+        if 'error' in report:
+            print(f"[Checkpoint] Failed for {key}: {report['error']}")
+            continue
+        skipped = ', '.join(s['name'] for s in report['skipped']) or 'nothing'
+        print(f"[Checkpoint] {key}: {len(report['saved'])} values ({report['bytes']} bytes), "
+              f"{len(report['modules'])} modules; skipped {skipped}")
+
+def restore_checkpoint(project_id, filename, kc):
+    """Load a file's namespace checkpoint into a freshly started kernel, once."""
+    path = checkpoints.path_for(os.path.join(PROJECTS_DIR, project_id), filename)
+    if not os.path.exists(path):
+        return
+    report = run_checkpoint_op(kc, checkpoints.restore_code(path))
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    if 'error' in report:
+        print(f"[Checkpoint] Restore failed for {project_id}/{filename}: {report['error']}")
+    else:
+        print(f"[Checkpoint] Restored {len(report['restored'])} names into {project_id}/{filename}"
+              f"{'; skipped ' + ', '.join(s['name'] for s in report['skipped']) if report['skipped'] else ''}")
+
+def ensure_project_active(project_id, rerun=True):
+    """Wake up project if dormant.
+
+    rerun=False only restores the saved state, for callers that run the
+    files themselves right after (see run_project).
+    """
     update_activity(project_id)
     
     # If already in memory, good to go
-    if project_id in GLOBAL_VARIABLES:
+    if STORE.is_loaded(project_id):
         return
 
     print(f"[Hibernation] Waking up project {project_id}...")
     
     # 1. Load State
     # Initialize empty first
-    GLOBAL_VARIABLES[project_id] = {}
-    FILE_EXPORTS[project_id] = {}
+    STORE.load_project(project_id)
     
     has_state = load_project_state(project_id)
+    if not rerun:
+        return
     
-    # 2. Re-Execute All Files
-    # We walk the directory and execute every .py file
-    # This restores local variables/functions and regenerates geometry
+    # 2. Re-Execute Changed Files
+    # Files whose snapshot still matches (same code, same inputs) keep their
+    # restored exports and start their kernel on the next edit or run.
+    # Everything else is re-run to regenerate its exports and geometry.
+    # A re-run can change globals other files read, so check again after each
+    # pass; every file runs at most once.
+    files = find_project_files(project_id)
+    rerun = set()
+    while True:
+        fresh = fresh_snapshots(project_id, files) if has_state else {}
+        stale = [(fname, code) for fname, code in files if fname not in fresh and fname not in rerun]
+        if not stale:
+            break
+        for fname, code in stale:
+            print(f"[Hibernation] Re-running {fname}...")
+            internal_execute(project_id, fname, code, pre_import_for(fname, files), priority=BACKGROUND)
+            rerun.add(fname)
+    skipped = len(files) - len(rerun)
+    if skipped:
+        print(f"[Hibernation] {skipped} file(s) unchanged, kernels start on their next run.")
+
+def find_project_files(project_id):
+    """(rel_path, code) for every .py file of a project, imports.py first."""
     project_path = os.path.join(PROJECTS_DIR, project_id)
-    if not os.path.exists(project_path): return
+    if not os.path.exists(project_path): return []
 
-    # Helper to find execution logic (we re-use a simplified version of execute_code logic because we can't call route handler easily)
-    # Actually, we can just instantiate kernels and run code.
-    
-    # Find imports.py first?
     files_to_run = []
     imports_file = None
     
@@ -160,17 +423,142 @@ def ensure_project_active(project_id):
     # Prepend imports.py
     if imports_file:
         files_to_run.insert(0, imports_file)
-    
-    # Run them
-    for fname, code in files_to_run:
-        print(f"[Hibernation] Re-running {fname}...")
-        # We need to construct the payload for execute_internal
-        # But we don't have execute_internal extracted yet.
-        # Let's extract core execution logic from the route to a function.
-        internal_execute(project_id, fname, code, "")
+    return files_to_run
 
-def internal_execute(project_id, filename, code, pre_import_code):
-    """Core execution logic shared by route and wake-up."""
+def internal_execute(project_id, filename, code, pre_import_code, profile=False, priority=INTERACTIVE):
+    """Core execution logic shared by route and wake-up.
+
+    Runs go through the scheduler: one pending run per file, latest wins, and
+    identical requests share the run in progress (profiled runs never do).
+    """
+    dedupe = None if profile else run_fingerprint(project_id, filename, code, pre_import_code)
+    # A run frees its kernel within its timeout, plus recover_kernel's interrupt grace and restart
+    timeout = project_limits(project_id)['timeout_seconds'] + INTERRUPT_GRACE + 60
+    return SCHEDULER.run(project_id, filename, code, pre_import_code, profile, dedupe=dedupe, priority=priority,
+                         timeout=timeout)
+
+def run_fingerprint(project_id, filename, code, pre_import_code):
+    """Identity of a run: its code, imports and the global values it reads."""
+    own_exports = STORE.get_exports(project_id).get(filename, [])
+    fp = snapshots.fingerprint(code, pre_import_code, STORE.get_globals(project_id), own_exports)
+    return json.dumps(fp, sort_keys=True)
+
+def shared_result(project_id, filename, result):
+    """Tag a run's result and build the execution_result event for the project room.
+
+    Collaborators get new output and geometry without running the file
+    themselves; the run_id lets the requesting client skip its own run.
+    """
+    result['run_id'] = uuid.uuid4().hex[:12]
+    return {"project": project_id, "filename": filename,
+            "result": {k: v for k, v in result.items() if k not in ('globals', 'blocks')}}
+
+def project_limits(project_id):
+    """Execution limits of a project: env defaults, overridden by project.json."""
+    limits = {
+        "timeout_seconds": EXECUTION_TIMEOUT,
+        "cpu_seconds": KERNEL_CPU_LIMIT,
+        "memory_mb": KERNEL_MEMORY_LIMIT_MB,
+        "cache_mb": STUDIO_CACHE_MB,
+        "parallel_workers": PARALLEL_WORKERS,
+    }
+    try:
+        with open(os.path.join(PROJECTS_DIR, project_id, 'project.json'), 'r') as f:
+            overrides = json.load(f).get('limits', {})
+        limits.update({k: v for k, v in overrides.items() if k in limits and isinstance(v, (int, float))})
+    except (OSError, ValueError, AttributeError):
+        pass
+    return limits
+
+def parallel_endpoint(project_id, kdata, code, imports_code, limits):
+    """Where a local kernel's studio.parallel_map reaches the project's worker pool, or None."""
+    workers = int(limits['parallel_workers'])
+    if workers < 2 or kdata.get('host'):
+        return None # One worker is no faster than the kernel; remote kernels cannot reach this pool
+    if 'parallel_map' not in code and 'parallel_map' not in imports_code:
+        return None # Runs that never map do not start a pool (the map would run in the kernel anyway)
+    try:
+        return parallel.endpoint(project_id, {
+            "imports": imports_code, "workers": workers, "nice": BACKGROUND_NICE,
+            "memory_mb": limits['memory_mb'], "cpu_seconds": limits['cpu_seconds']})
+    except OSError as e:
+        print(f"[Parallel] No worker pool for {project_id}: {e}")
+        return None
+
+def mesh_encoding(project_id):
+    """Mesh encoding settings of a project for the kernel's serializer, or None for plain JSON."""
+    bits = MESH_QUANTIZE_BITS
+    try:
+        with open(os.path.join(PROJECTS_DIR, project_id, 'project.json'), 'r') as f:
+            bits = int(json.load(f).get('geometry', {}).get('quantize_bits', bits))
+    except (OSError, ValueError, TypeError, AttributeError):
+        pass
+    if not bits:
+        return None
+    return {"bits": max(8, min(16, bits)), "min_vertices": MESH_QUANTIZE_MIN_VERTICES}
+
+def apply_limits(kdata, limits):
+    """Renew the CPU budget and set the memory cap of a local kernel before a run (remote: the timeout)."""
+    pid = resources.kernel_pid(kdata['km'])
+    if not pid:
+        if kdata.get('host'):
+            kdata['km'].timeout = limits['timeout_seconds'] # The kernel host enforces it too
+        return False # Remote kernels: only the timeout applies
+    try:
+        if limits['memory_mb'] and kdata.get('memory_limit') != limits['memory_mb']:
+            resources.set_memory_limit(pid, int(limits['memory_mb'] * 2**20))
+            kdata['memory_limit'] = limits['memory_mb']
+        if limits['cpu_seconds']:
+            return resources.set_cpu_budget(pid, limits['cpu_seconds'])
+    except (OSError, ValueError, ImportError) as e:
+        print(f"[Limits] Could not limit kernel {pid}: {e}")
+    return False
+
+def apply_priority(kdata, priority):
+    """Set a local kernel's CPU priority for the class of its next run."""
+    pid = resources.kernel_pid(kdata['km'])
+    if not pid or kdata.get('priority', INTERACTIVE) == priority:
+        return
+    background = priority == BACKGROUND
+    # Without the right to lower it again, leave the nice value alone
+    nice = BACKGROUND_NICE if background and RENICE_ALLOWED else 0
+    try:
+        if resources.set_cpu_priority(pid, nice, batch=background):
+            kdata['priority'] = priority
+    except OSError as e:
+        print(f"[Priority] Could not reprioritize kernel {pid}: {e}")
+
+def recover_kernel(key, kdata, msg_id):
+    """Free a kernel stuck in a run: interrupt, then restart. Returns what it took."""
+    km, kc = kdata['km'], kdata['kc']
+    if km.is_alive():
+        try:
+            km.interrupt_kernel()
+            late = collect_kernel_output(kc, msg_id, timeout=INTERRUPT_GRACE, km=km)
+            if not late.get('timed_out') and not late.get('kernel_died'):
+                return 'interrupted'
+        except Exception as e:
+            print(f"[Limits] Interrupt failed for {key}: {e}")
+    try:
+        km.restart_kernel(now=True)
+        kc.wait_for_ready(timeout=60)
+        kdata.pop('memory_limit', None) # New process, limits are set again on the next run
+        kdata.pop('priority', None)
+        return 'restarted'
+    except Exception as e:
+        # Drop it; the next run starts a fresh kernel
+        print(f"[Limits] Restart failed for {key}: {e}")
+        with BASE_LOCK:
+            if KERNELS.get(key) is kdata:
+                del KERNELS[key]
+        try:
+            km.shutdown_kernel(now=True)
+        except Exception:
+            pass
+        return 'replaced'
+
+def _execute_in_kernel(project_id, filename, code, pre_import_code, profile=False, priority=INTERACTIVE):
+    """Run one file in its kernel. Only called by the scheduler."""
     try:
         kdata = get_kernel(project_id, filename)
     except Exception as e:
@@ -181,16 +569,10 @@ def internal_execute(project_id, filename, code, pre_import_code):
     
     kc = kdata['kc']
     exec_lock = kdata['exec_lock']
-    
-    # Ensure project stores exist
-    if project_id not in GLOBAL_VARIABLES: GLOBAL_VARIABLES[project_id] = {}
-    if project_id not in FILE_EXPORTS: FILE_EXPORTS[project_id] = {}
-    current_project_globals = GLOBAL_VARIABLES[project_id]
 
-    if not exec_lock.acquire(timeout=40): 
-        print(f"Failed to acquire lock for {filename}")
-        return None
-         
+    # The scheduler never runs the same file twice at once, so this only
+    # waits on out-of-band users of the kernel.
+    exec_lock.acquire()
     try:
         # Check if socket is alive?
         try:
@@ -198,33 +580,45 @@ def internal_execute(project_id, filename, code, pre_import_code):
         except: pass 
 
         # 1. Manage Exports - Clear old globals from this file
-        if filename in FILE_EXPORTS[project_id]:
-            for var_name in FILE_EXPORTS[project_id][filename]:
-                current_project_globals.pop(var_name, None)
-        FILE_EXPORTS[project_id][filename] = [] # Reset for this run
-
-        # Construct Code
-        reset_code = "for n in [k for k in globals().keys() if not k.startswith('_')]: del globals()[n]"
-        inject_code = ["import pickle, base64", "_injected_globals = set()"]
-        for name, b64_str in current_project_globals.items():
-            inject_code.append(f"try:\n    {name} = pickle.loads(base64.b64decode('{b64_str}'.encode('ascii')))\n    _injected_globals.add('{name}')\nexcept: pass")
-    
-        full_code = "\n".join([
-            reset_code,
-            pre_import_code,        
-            "\n".join(inject_code), 
-            code,                   
-            INTROSPECTION_CODE      
-        ])
+        previous_exports = STORE.clear_file_exports(project_id, filename)
+        project_globals = STORE.get_globals(project_id)
+        fingerprint = snapshots.fingerprint(code, pre_import_code, project_globals)
+        limits = project_limits(project_id)
+        imports_code = code if filename == 'imports.py' else pre_import_code
+        full_code = build_run_code(project_globals, code, pre_import_code, profile=profile,
+                                   filename=filename, mesh_encoding=mesh_encoding(project_id),
+                                   cache_mb=limits['cache_mb'],
+                                   parallel=parallel_endpoint(project_id, kdata, code, imports_code, limits))
+        if apply_limits(kdata, limits):
+            full_code = CPU_LIMIT_HANDLER + full_code
+        apply_priority(kdata, priority)
         
         try:
+            t0 = time.time()
             msg_id = kc.execute(full_code)
-            result = collect_kernel_output(kc, msg_id)
+            result = collect_kernel_output(kc, msg_id, timeout=limits['timeout_seconds'], km=kdata['km'])
+            timed_out = result.pop('timed_out', False)
+            kernel_died = result.pop('kernel_died', False)
+            if timed_out or kernel_died:
+                # Runaway or crashed run: free the kernel first
+                outcome = recover_kernel(f"{project_id}/{filename}", kdata, msg_id)
+                result['error'] += f"\n[Server] The kernel was {outcome}; globals from the previous run were kept."
+            if timed_out or kernel_died or CPU_LIMIT_MESSAGE in result['error']:
+                # Stopped by a limit: keep the file's last good exports
+                STORE.set_file_exports(project_id, filename, previous_exports)
+                print(f"[Limits] {project_id}/{filename}: run stopped by a limit, previous exports restored")
+                result['success'] = False
+                return result
+            if profile:
+                attach_profile(result, (time.time() - t0) * 1000.0)
+            else:
+                result.pop('blocks', None)
             
             # Update Globals and Exports
             if result.get('globals'):
-                current_project_globals.update(result['globals'])
-                FILE_EXPORTS[project_id][filename] = list(result['globals'].keys())
+                STORE.set_file_exports(project_id, filename, result['globals'])
+            LAST_RESULTS[f"{project_id}/{filename}"] = {'fingerprint': fingerprint, 'result': result}
+            socketio.emit('execution_result', shared_result(project_id, filename, result), to=project_id)
                 
             return result
         except Exception as e:
@@ -233,30 +627,494 @@ def internal_execute(project_id, filename, code, pre_import_code):
     finally:
         exec_lock.release()
 
+def _run_scheduled(project_id, filename, *payload, priority=INTERACTIVE):
+    """Scheduler entry point: a file run, or a task (a sweep variant) that takes a run slot like one."""
+    if callable(payload[0]):
+        return payload[0](*payload[1:])
+    return _execute_in_kernel(project_id, filename, *payload, priority=priority)
+
+SCHEDULER = ExecutionScheduler(_run_scheduled, max_workers=MAX_CONCURRENT_RUNS,
+                               max_background=MAX_BACKGROUND_RUNS)
+
+def run_project(project_id, selection=None, overrides=None, priority=BACKGROUND):
+    """Run a project's files in glb_ dependency order, independent files in parallel.
+
+    selection limits the run to some files (imports.py always runs first);
+    overrides maps filenames to unsaved code. Runs are background work unless
+    the caller says otherwise. Yields a 'plan' event, one
+    'file' event per file as it finishes, then a 'done' summary.
+    """
+    overrides = overrides or {}
+    files = [(fname, overrides.get(fname, code)) for fname, code in find_project_files(project_id)]
+    if selection:
+        keep = set(selection) | {dependencies.IMPORTS_FILE}
+        files = [(fname, code) for fname, code in files if fname in keep]
+    code_by_file = dict(files)
+    graph = dependencies.build_graph(files)
+    yield {"type": "plan", "files": list(code_by_file),
+           "depends_on": {fname: sorted(deps) for fname, deps in graph.items()}}
+
+    start = time.time()
+    finished = queue.Queue()
+    pending = dict(graph)
+    status, durations = {}, {}
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+    running = 0
+
+    def _run(fname):
+        t0 = time.time()
+        try:
+            result = internal_execute(project_id, fname, code_by_file[fname], pre_import_for(fname, files),
+                                      priority=priority)
+        except Exception as e:
+            print(f"[Batch] Error running {fname}: {e}")
+            result = None
+        finished.put((fname, t0, time.time(), result))
+
+    def _event(fname, file_status, t0, t1, result):
+        status[fname] = file_status
+        counts[file_status] += 1
+        return {"type": "file", "filename": fname, "status": file_status,
+                "start_ms": round((t0 - start) * 1000.0, 1), "end_ms": round((t1 - start) * 1000.0, 1),
+                "duration_ms": round((t1 - t0) * 1000.0, 1), "result": result}
+
+    while pending or running:
+        # Start everything whose dependencies are done; skip files whose dependencies failed
+        progressed = True
+        while progressed:
+            progressed = False
+            for fname in [f for f, deps in pending.items() if all(d in status for d in deps)]:
+                del pending[fname]
+                progressed = True
+                failed = sorted(d for d in graph[fname] if status[d] != 'ok')
+                if failed:
+                    now = time.time()
+                    yield _event(fname, 'skipped', now, now,
+                                 {"success": False, "error": f"Skipped: {', '.join(failed)} failed", "output": "", "geometry": []})
+                else:
+                    threading.Thread(target=_run, args=(fname,), daemon=True).start()
+                    running += 1
+        if not running:
+            break
+        fname, t0, t1, result = finished.get()
+        running -= 1
+        durations[fname] = t1 - t0
+        ok = bool(result and result.get('success'))
+        yield _event(fname, 'ok' if ok else 'error', t0, t1,
+                     result or {"success": False, "error": "Internal execution failed", "output": "", "geometry": []})
+
+    total = time.time() - start
+    path, path_seconds = dependencies.critical_path(graph, durations)
+    serial = sum(durations.values())
+    yield {"type": "done", "counts": counts,
+           "total_ms": round(total * 1000.0, 1),
+           "serial_ms": round(serial * 1000.0, 1),
+           "parallelism": round(serial / total, 2) if total else None,
+           "critical_path": {"files": path, "ms": round(path_seconds * 1000.0, 1)}}
+
+# --- PARAMETRIC SWEEPS ---
+SWEEP_WORKERS = int(os.environ.get('SWEEP_WORKERS', max(1, MAX_CONCURRENT_RUNS // 2)))
+SWEEP_STORES = {}  # { project_id: SweepStore }
+SWEEP_JOBS = {}    # { sweep_id: SweepJob } - sweeps running in this process
+
+def sweep_store(project_id):
+    with BASE_LOCK:
+        if project_id not in SWEEP_STORES:
+            SWEEP_STORES[project_id] = sweeps.SweepStore(os.path.join(PROJECTS_DIR, project_id, sweeps.SWEEP_DB))
+        return SWEEP_STORES[project_id]
+
+def start_sweep_kernel():
+    km, kc = KERNEL_POOL.take() or start_local_kernel()
+    # Sweep kernels are shut down afterwards, so they can be niced for good
+    pid = resources.kernel_pid(km)
+    try:
+        if pid: resources.set_cpu_priority(pid, BACKGROUND_NICE, batch=True)
+    except OSError as e:
+        print(f"[Priority] Could not reprioritize sweep kernel {pid}: {e}")
+    return {"km": km, "kc": kc}
+
+def stop_sweep_kernel(kdata):
+    try:
+        kdata['kc'].stop_channels()
+        kdata['km'].shutdown_kernel(now=True)
+    except Exception as e:
+        print(f"[Sweeps] Error shutting down sweep kernel: {e}")
+
+def start_sweep(project_id, filename, code, plan, outputs=(), geometry=True, workers=None):
+    """Start a sweep of one file over its slider values. Returns the sweep info.
+
+    Variants run on kernels of their own, so the file's interactive kernel
+    and the project's globals are left alone. Every variant sees the
+    project's current globals, minus the file's own exports. Each variant
+    takes a background slot of the scheduler, and at most SWEEP_WORKERS
+    kernels run a sweep.
+    """
+    if workers is None:
+        workers = SWEEP_WORKERS
+    elif isinstance(workers, bool) or not isinstance(workers, int):
+        raise sweeps.SweepError("workers must be an integer")
+    workers = max(1, min(workers, SWEEP_WORKERS))
+    params = sweeps.parse_parameters(code)
+    if not params:
+        raise sweeps.SweepError(f"{filename} has no range() or switch() parameters")
+    variants = sweeps.expand_plan(params, plan)
+    if not variants:
+        raise sweeps.SweepError("The plan has no variants")
+
+    files = find_project_files(project_id)
+    pre_import_code = pre_import_for(filename, files)
+    own_exports = set(STORE.get_exports(project_id).get(filename, []))
+    project_globals = {k: v for k, v in STORE.get_globals(project_id).items() if k not in own_exports}
+    limits = project_limits(project_id)
+    tail = sweeps.outputs_code(outputs) if outputs else ""
+    encoding = mesh_encoding(project_id)
+    # Sweep kernels are local: their maps share the project's pool
+    pool = parallel_endpoint(project_id, {}, code, code if filename == 'imports.py' else pre_import_code, limits)
+
+    def make_code(values):
+        variant_code = sweeps.substitute(code, params, values) + "\n" + tail
+        return build_run_code(project_globals, variant_code, pre_import_code, introspect=geometry,
+                              mesh_encoding=encoding, cache_mb=limits['cache_mb'], parallel=pool)
+
+    def _run_variant(kdata, full_code):
+        if apply_limits(kdata, limits):
+            full_code = CPU_LIMIT_HANDLER + full_code
+        msg_id = kdata['kc'].execute(full_code)
+        result = collect_kernel_output(kdata['kc'], msg_id, timeout=limits['timeout_seconds'], km=kdata['km'])
+        timed_out = result.pop('timed_out', False)
+        kernel_died = result.pop('kernel_died', False)
+        if timed_out or kernel_died:
+            outcome = recover_kernel(f"{project_id}/{filename} (sweep)", kdata, msg_id)
+            result['error'] += f"\n[Server] The sweep kernel was {outcome}."
+        result['ok'] = result['success'] and not timed_out and not kernel_died
+        return result
+
+    runs = itertools.count()
+
+    def run_variant(kdata, full_code):
+        if not kdata['km'].is_alive():
+            kdata.update(start_sweep_kernel())
+        # Its own scheduler key per variant: variants never coalesce, and each holds a background slot
+        result = SCHEDULER.run(project_id, f"{filename} (sweep {sweep_id} #{next(runs)})", _run_variant, kdata,
+                               full_code, priority=BACKGROUND,
+                               timeout=limits['timeout_seconds'] + INTERRUPT_GRACE + 60)
+        if result is None:
+            return 'error', None, None, "The variant did not finish"
+        values = result.pop('blocks', {}).get('SWEEP')
+        return (('ok' if result['ok'] else 'error'), values, (result['geometry'] if geometry else None),
+                (result['error'] or None))
+
+    sweep_id = sweeps.new_id()
+    store = sweep_store(project_id)
+    store.create(sweep_id, filename, {name: {k: v for k, v in spec.items() if k != 'line'} for name, spec in params.items()},
+                 list(outputs), variants)
+    job = sweeps.SweepJob(store, sweep_id, variants, make_code, start_sweep_kernel, run_variant, stop_sweep_kernel,
+                          workers, on_finish=lambda: SWEEP_JOBS.pop(sweep_id, None))
+    SWEEP_JOBS[sweep_id] = job
+    job.start()
+    print(f"[Sweeps] {sweep_id}: {len(variants)} variants of {project_id}/{filename} on {job.workers} kernels")
+    return store.get(sweep_id)
+
+def build_run_code(project_globals, code, pre_import_code, profile=False, filename='<user>', introspect=True,
+                   mesh_encoding=None, cache_mb=None, parallel=None):
+    """Reset the namespace, run imports, inject project globals, run code, introspect.
+
+    With profile=True the user code runs under the sampling profiler from
+    kernel_profile.py and the introspection step is timed on its own.
+    introspect=False leaves out geometry and globals extraction (sweeps that
+    only want scalar outputs). mesh_encoding is read by the serializer in
+    kernel_utils.py. cache_mb bounds the `studio` cache of kernel_studio.py
+    (STUDIO_CACHE_MB when None); parallel is the worker pool endpoint of
+    studio.parallel_map (see parallel_endpoint).
+    """
+    # Underscore names survive the reset, so the settings are set on every run.
+    # The first run after a checkpoint restore keeps the restored names if it
+    # runs the code they were saved from (see checkpoints.py).
+    code_hash = checkpoints.code_hash(code, pre_import_code)
+    reset_code = (f"if globals().pop('_vp_restored_hash', None) != {code_hash!r}:\n"
+                  "    for n in [k for k in globals().keys() if not k.startswith('_')]: del globals()[n]\n"
+                  f"_vp_code_hash = {code_hash!r}\n"
+                  f"_vp_mesh_encoding = {mesh_encoding!r}\n"
+                  f"_vp_cache_mb = {STUDIO_CACHE_MB if cache_mb is None else cache_mb!r}\n"
+                  f"_vp_parallel = {parallel!r}\n"
+                  f"exec(compile({get_studio_code()!r}, 'studio', 'exec'))")
+    inject_code = ["import pickle, base64", "_injected_globals = set()"]
+    for name, b64_str in project_globals.items():
+        inject_code.append(f"try:\n    {name} = pickle.loads(base64.b64decode('{b64_str}'.encode('ascii')))\n    _injected_globals.add('{name}')\nexcept: pass")
+
+    if not profile:
+        return "\n".join([
+            reset_code,
+            pre_import_code,        
+            "\n".join(inject_code), 
+            code,                   
+            get_introspection_code() if introspect else "",
+            "studio._report()"
+        ])
+
+    # Compile the user code under its own filename so the profiler can tell
+    # user frames from compas and kernel frames. On error the profile of the
+    # partial run is still reported before the exception propagates.
+    return "\n".join([
+        reset_code,
+        pre_import_code,
+        "\n".join(inject_code),
+        get_profile_code(),
+        f"_vp_source = {code!r}",
+        f"_vp_profiler = _VPProfiler({filename!r}, _vp_source)",
+        "_vp_profiler.start()",
+        "try:",
+        f"    exec(compile(_vp_source, {filename!r}, 'exec'), globals())",
+        "except BaseException:",
+        "    _vp_profiler.stop(); _vp_profiler.emit()",
+        "    raise",
+        "_vp_profiler.stop()",
+        "_vp_profiler.begin_introspection()",
+        get_introspection_code(),
+        "_vp_profiler.end_introspection()",
+        "_vp_profiler.emit()",
+        "studio._report()",
+    ])
+
+def attach_profile(result, run_ms):
+    """Move the kernel's profile block into result['profile']."""
+    profile = result.pop('blocks', {}).get('PROFILE')
+    result['profile'] = profile or {}
+    result['profile']['run_ms'] = round(run_ms, 2) # Kernel round trip as seen by the server
+    return result
+
+def project_rss(project_id):
+    """Resident memory of a project's local kernels in bytes (remote kernels count 0)."""
+    prefix = f"{project_id}/"
+    return sum(resources.process_rss(resources.kernel_pid(kdata['km'])) or 0
+               for key, kdata in list(KERNELS.items()) if key.startswith(prefix))
+
+def memory_state():
+    """('pressure' | 'normal' | 'plentiful', available fraction or None, bytes to free)."""
+    info = resources.memory_info()
+    if not info:
+        return 'normal', None, 0
+    available, total = info
+    fraction = available / total
+    if fraction < MEMORY_LOW_WATERMARK:
+        return 'pressure', fraction, int(MEMORY_LOW_WATERMARK * total) - available
+    if fraction > MEMORY_HIGH_WATERMARK:
+        return 'plentiful', fraction, 0
+    return 'normal', fraction, 0
+
+def idle_timeout(mode):
+    return HIBERNATION_RELAXED_TIMEOUT if mode == 'plentiful' else HIBERNATION_TIMEOUT
+
+def hibernation_candidates():
+    """Projects this process may hibernate, as [(project_id, idle_seconds)]."""
+    now = time.time()
+    # Each worker only hibernates the projects whose kernels it owns
+    owned = set(STORE.owned_projects(WORKER_ID)) if WORKER_ID else None
+    return [(pid, now - last_active) for pid, last_active in list(STORE.activity().items())
+            if owned is None or pid in owned]
+
+def check_hibernation():
+    """One pass of the hibernation policy. Returns [(project_id, reason)]."""
+    mode, fraction, to_free = memory_state()
+    memory = f"{fraction:.0%} memory available" if fraction is not None else "memory unknown"
+    timeout = idle_timeout(mode)
+    decisions = []
+
+    candidates = hibernation_candidates()
+    for pid, idle in candidates:
+        if idle > timeout:
+            decisions.append((pid, f"idle {idle:.0f}s > {timeout}s, {mode}: {memory}"))
+
+    if mode == 'pressure':
+        # Most idle and largest first, until the estimated freed memory covers the deficit
+        chosen = {pid for pid, _ in decisions}
+        sized = [(pid, idle, project_rss(pid)) for pid, idle in candidates
+                 if pid not in chosen and idle > HIBERNATION_MIN_IDLE]
+        sized = [c for c in sized if c[2] > 0] # Nothing to gain from projects without local kernels
+        sized.sort(key=lambda c: c[1] * max(c[2], 1), reverse=True)
+        freed = 0
+        for pid, idle, rss in sized:
+            if freed >= to_free:
+                break
+            decisions.append((pid, f"memory pressure: {memory} < {MEMORY_LOW_WATERMARK:.0%}, "
+                                   f"idle {idle:.0f}s, kernels {rss / 2**20:.0f} MB"))
+            freed += rss
+
+    for pid, reason in decisions:
+        hibernate_project(pid, reason)
+    return decisions
+
 def hibernation_monitor():
-    """Background thread to check for idle projects."""
+    """Background thread to check for idle projects and memory pressure."""
     while True:
         time.sleep(HIBERNATION_CHECK_INTERVAL)
-        now = time.time()
-        
-        # Identify idle projects
-        # Note: We must be careful iterating while modifying
-        active_projects = list(PROJECT_ACTIVITY.items())
-        
-        for pid, last_active in active_projects:
-            if now - last_active > HIBERNATION_TIMEOUT:
-                hibernate_project(pid)
+        try:
+            save_activity()
+            check_hibernation()
+        except Exception as e:
+            print(f"[Hibernation] Check failed: {e}")
+
+# --- KERNEL WARM-UP ---
+def load_activity():
+    """{ project_id: last activity } as saved by save_activity, or {}."""
+    try:
+        with open(os.path.join(PROJECTS_DIR, ACTIVITY_FILE), 'r') as f:
+            return {k: float(v) for k, v in json.load(f).items()}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+def save_activity():
+    """Merge live activity into the activity file. Hibernated projects keep their last time."""
+    activity = load_activity()
+    live = STORE.activity()
+    if all(activity.get(pid) == ts for pid, ts in live.items()):
+        return
+    activity.update(live)
+    activity = {pid: ts for pid, ts in activity.items() if os.path.isdir(os.path.join(PROJECTS_DIR, pid))}
+    tmp = os.path.join(PROJECTS_DIR, f"{ACTIVITY_FILE}.{os.getpid()}.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(activity, f)
+    os.replace(tmp, os.path.join(PROJECTS_DIR, ACTIVITY_FILE))
+
+def likely_files(project_id):
+    """Files a user will probably run next: active tab, live tabs, open tabs, then imports.py."""
+    existing = [fname for fname, _ in find_project_files(project_id)]
+    workspace = {}
+    try:
+        with open(os.path.join(PROJECTS_DIR, project_id, '.workspace.json'), 'r') as f:
+            workspace = json.load(f)
+    except (OSError, ValueError):
+        pass
+    open_files = workspace.get('openFiles') or []
+    states = workspace.get('nodeStates') or {}
+    ranked = [workspace.get('activeFile')]
+    ranked += [f for f in open_files if (states.get(f) or {}).get('isLive')]
+    ranked += open_files + ['imports.py']
+    ordered = []
+    for fname in ranked:
+        if fname in existing and fname not in ordered:
+            ordered.append(fname)
+    return ordered[:WARMUP_MAX_FILES]
+
+def warm_project(project_id, files=None, forwarded=False):
+    """Start kernels for the files a user is likely to run, in the background."""
+    owner = None if forwarded else project_owner_address(project_id)
+    if owner:
+        threading.Thread(target=forward_to_owner, args=(owner, f"/project/{project_id}/warm", {"files": files}),
+                         daemon=True).start()
+        return
+    threading.Thread(target=_warm_project, args=(project_id, files), daemon=True).start()
+
+def _warm_project(project_id, files=None):
+    ensure_project_active(project_id)
+    if memory_state()[0] == 'pressure':
+        print(f"[Warmup] Skipping {project_id}: memory pressure")
+        return
+    existing = dict(find_project_files(project_id))
+    files = [f for f in (files or likely_files(project_id)) if f in existing][:WARMUP_MAX_FILES]
+    todo = [f for f in files if f"{project_id}/{f}" not in KERNELS]
+    if not todo:
+        return
+    print(f"[Warmup] {project_id}: starting kernels for {', '.join(todo)}")
+    for fname in todo:
+        threading.Thread(target=_warm_kernel, args=(project_id, fname, existing.get('imports.py', '')),
+                         daemon=True).start()
+
+def _warm_kernel(project_id, filename, imports_code):
+    """Start one file's kernel and load the project's imports into it (modules stay cached)."""
+    kdata = get_kernel(project_id, filename)
+    if not kdata or not imports_code or not kdata['exec_lock'].acquire(blocking=False):
+        return # A real run got there first
+    try:
+        apply_priority(kdata, BACKGROUND) # Speculative; the first real run restores it
+        collect_kernel_output(kdata['kc'], kdata['kc'].execute(imports_code, silent=True), timeout=60)
+    except Exception as e:
+        print(f"[Warmup] Preloading imports for {project_id}/{filename} failed: {e}")
+    finally:
+        kdata['exec_lock'].release()
+
+def warm_recent_projects():
+    """At boot: warm the projects used most recently before the restart."""
+    now = time.time()
+    activity = load_activity()
+    recent = sorted((ts, pid) for pid, ts in activity.items() if now - ts < WARMUP_BOOT_WINDOW)
+    for _, pid in reversed(recent[-WARMUP_BOOT_PROJECTS:] if WARMUP_BOOT_PROJECTS else []):
+        print(f"[Warmup] Warming recently active project {pid}")
+        warm_project(pid)
+
+# --- BACKGROUND SERVICES ---
+# Started by start_server() (or workers.py), never on import, so tools that
+# only import the package stay fast and thread-free.
+SERVICES_STARTED = False
+SERVICES_LOCK = threading.Lock()
 
-# Start Monitor
-threading.Thread(target=hibernation_monitor, daemon=True).start()
+def start_background_services():
+    global SERVICES_STARTED
+    with SERVICES_LOCK:
+        if SERVICES_STARTED: return
+        threading.Thread(target=hibernation_monitor, daemon=True).start()
+        KERNEL_POOL.start()
+        assets.ensure_loaded()
+        warm_recent_projects()
+        SERVICES_STARTED = True
+    startup.mark('background_services')
 
-# Load the introspection code from the separate file
-try:
-    with open(os.path.join(os.path.dirname(__file__), 'kernel_utils.py'), 'r') as f:
-        INTROSPECTION_CODE = f.read()
-except FileNotFoundError:
-    print("Warning: kernel_utils.py not found. Introspection will fail.")
-    INTROSPECTION_CODE = ""
+# Load the introspection code from the separate file (on first run)
+INTROSPECTION_CODE = None
+
+def get_introspection_code():
+    global INTROSPECTION_CODE
+    if INTROSPECTION_CODE is None:
+        try:
+            with open(os.path.join(os.path.dirname(__file__), 'kernel_utils.py'), 'r') as f:
+                INTROSPECTION_CODE = f.read()
+        except FileNotFoundError:
+            print("Warning: kernel_utils.py not found. Introspection will fail.")
+            INTROSPECTION_CODE = ""
+    return INTROSPECTION_CODE
+
+# Profiler injected only into runs that ask for it (see build_run_code)
+PROFILE_CODE = None
+
+def get_profile_code():
+    global PROFILE_CODE
+    if PROFILE_CODE is None:
+        with open(os.path.join(os.path.dirname(__file__), 'kernel_profile.py'), 'r') as f:
+            PROFILE_CODE = f.read()
+    return PROFILE_CODE
+
+# The `studio` helpers, set up at the start of every run (see build_run_code)
+STUDIO_CODE = None
+
+def get_studio_code():
+    global STUDIO_CODE
+    if STUDIO_CODE is None:
+        with open(os.path.join(os.path.dirname(__file__), 'kernel_studio.py'), 'r') as f:
+            STUDIO_CODE = f.read()
+    return STUDIO_CODE
+
+def start_local_kernel():
+    km = get_kernel_manager_class()(kernel_name='python3')
+    km.start_kernel()
+    kc = km.client()
+    kc.start_channels()
+    kc.wait_for_ready(timeout=60)
+    return km, kc
+
+KERNEL_POOL = KernelPool(start_local_kernel, KERNEL_POOL_SIZE, KERNEL_POOL_PRELOAD)
+
+def get_kernel_manager_class():
+    global KernelManager
+    if KernelManager is None:
+        if EXECUTION_BACKEND == 'process':
+            from .process_kernel import ProcessKernelManager
+            KernelManager = ProcessKernelManager
+        elif EXECUTION_BACKEND == 'jupyter':
+            from jupyter_client import KernelManager as JupyterKernelManager
+            KernelManager = JupyterKernelManager
+        else:
+            raise ValueError(f"Unsupported EXECUTION_BACKEND: {EXECUTION_BACKEND}")
+    return KernelManager
 
 # --- KERNEL MANAGEMENT ---
 def get_kernel(project_id, filename):
@@ -282,18 +1140,24 @@ def get_kernel(project_id, filename):
             if KERNELS[unique_key]['km'].is_alive():
                  return KERNELS[unique_key]
 
-        print(f"Starting new kernel for {unique_key}...")
+        host = KERNEL_RING.get(project_id)
+        print(f"Starting new kernel for {unique_key}{f' on {host}' if host else ''}...")
         try:
-            km = KernelManager(kernel_name='python3')
-            km.start_kernel()
-            kc = km.client()
-            kc.start_channels()
-            kc.wait_for_ready(timeout=60)
+            if host:
+                km = RemoteKernelManager(host, unique_key)
+                km.start_kernel()
+                kc = km.client()
+                kc.start_channels()
+                kc.wait_for_ready(timeout=60)
+            else:
+                km, kc = KERNEL_POOL.take() or start_local_kernel()
+            restore_checkpoint(project_id, filename, kc)
             
             KERNELS[unique_key] = {
                 "km": km, 
                 "kc": kc,
-                "exec_lock": threading.Lock() 
+                "exec_lock": threading.Lock(),
+                "host": host
             }
             print(f"Kernel for {unique_key} ready!")
             return KERNELS[unique_key]
@@ -302,8 +1166,29 @@ def get_kernel(project_id, filename):
             if unique_key in KERNELS: del KERNELS[unique_key]
             return None
 
+def rebalance_kernels():
+    """Move kernels whose project now hashes to a different host."""
+    moved = []
+    for key, kdata in list(KERNELS.items()):
+        project_id, filename = key.split('/', 1)
+        target = KERNEL_RING.get(project_id)
+        if not kdata.get('host') or kdata['host'] == target:
+            continue
+        # Wait for the current run, then start the replacement before stopping the old one
+        with kdata['exec_lock']:
+            if KERNELS.get(key) is kdata:
+                del KERNELS[key]
+            get_kernel(project_id, filename)
+            try:
+                kdata['km'].shutdown_kernel()
+            except Exception as e:
+                print(f"Error shutting down kernel {key} on {kdata['host']}: {e}")
+        print(f"[KernelHosts] Moved {key}: {kdata['host']} -> {target}")
+        moved.append(key)
+    return moved
+
 def shutdown_all_kernels():
-    global KERNELS, GLOBAL_VARIABLES, FILE_EXPORTS, KERNEL_LOCKS
+    global KERNELS
     
     # We should probably lock creation of new kernels while shutting down
     with BASE_LOCK:
@@ -315,53 +1200,74 @@ def shutdown_all_kernels():
             except Exception as e:
                 print(f"Error shutting down kernel {fname}: {e}")
         
+        parallel.shutdown_all()
+
         # Then clear
         KERNELS = {}
-        GLOBAL_VARIABLES = {} 
-        FILE_EXPORTS = {}
+        STORE.reset()
+        LAST_RESULTS.clear()
         # KERNEL_LOCKS = {} # We can clear locks too, or keep them. Safer to keep locks or re-init?
         # If threads are waiting on locks, they will wake up and see KERNELS is empty, so they will start new kernels.
         # This is acceptable for a restart.
 
 # --- ROUTING ---
+@app.route('/ready', methods=['GET'])
+def readiness():
+    """Readiness probe with the startup-time breakdown."""
+    checks = {"services": SERVICES_STARTED}
+    try:
+        STORE.activity()
+        checks["store"] = True
+    except Exception:
+        checks["store"] = False
+    ready = all(checks.values())
+    return jsonify({"ready": ready, "checks": checks, "startup": startup.report(),
+                    "kernel_pool": KERNEL_POOL.stats()}), 200 if ready else 503
+
+def asset_response(name):
+    """A listed static asset (see assets.py), compressed if the client accepts it."""
+    served = assets.serve(name, request.headers.get('Accept-Encoding', ''), request.headers.get('If-None-Match', ''),
+                          check_sources=app.debug)
+    if served is None:
+        abort(404)
+    status, headers, body = served
+    return Response(body, status=status, headers=headers)
+
 @app.route('/')
 def index():
-    return send_from_directory(STATIC_FOLDER, 'index.html')
+    return asset_response('index.html')
 
 @app.route('/<path:filename>')
 def serve_static(filename):
     # Check if this is a project key (5 digits)
     if filename.isdigit() and len(filename) == 5:
          if os.path.exists(os.path.join(PROJECTS_DIR, filename)):
-             return send_from_directory(STATIC_FOLDER, 'editor.html')
-    return send_from_directory(STATIC_FOLDER, filename)
+             return asset_response('editor.html')
+    return asset_response(filename)
+
+CATALOG = None # catalog.ProjectCatalog of PROJECTS_DIR, opened on first use
+
+def project_catalog():
+    global CATALOG
+    with BASE_LOCK:
+        if CATALOG is None:
+            CATALOG = ProjectCatalog(PROJECTS_DIR)
+        return CATALOG
 
 @app.route('/projects', methods=['GET'])
 def list_projects():
-    if not os.path.exists(PROJECTS_DIR):
-        os.makedirs(PROJECTS_DIR)
-    
-    projects = []
-    for entry in os.scandir(PROJECTS_DIR):
-        if entry.is_dir() and not entry.name.startswith('.'):
-            # Try to load metadata
-            meta_path = os.path.join(entry.path, 'project.json')
-            name = entry.name
-            if os.path.exists(meta_path):
-                try:
-                    with open(meta_path, 'r') as f:
-                        meta = json.load(f)
-                        name = meta.get('name', entry.name)
-                except:
-                    pass
-            
-            projects.append({
-                "key": entry.name,
-                "name": name,
-                "created": entry.stat().st_ctime
-            })
-    projects.sort(key=lambda x: x['created'], reverse=True)
-    return jsonify(projects)
+    """All projects, newest first; or one page: ?offset=&limit=&sort=created|name|key&order=asc|desc&q=."""
+    args = request.args
+    if not any(k in args for k in ('offset', 'limit', 'sort', 'order', 'q')):
+        return jsonify(project_catalog().list()[1])
+    sort = args.get('sort', 'created')
+    if sort not in ('created', 'name', 'key'):
+        return jsonify({"success": False, "error": f"Unknown sort: {sort}"}), 400
+    offset = max(0, args.get('offset', 0, type=int))
+    limit = min(1000, max(1, args.get('limit', 100, type=int)))
+    descending = args.get('order', 'desc' if sort == 'created' else 'asc') == 'desc'
+    total, projects = project_catalog().list(offset, limit, sort, descending, args.get('q', '').strip())
+    return jsonify({"success": True, "total": total, "offset": offset, "limit": limit, "projects": projects})
 
 @app.route('/projects/create', methods=['POST'])
 def create_project():
@@ -370,22 +1276,20 @@ def create_project():
     if not name:
         return jsonify({"success": False, "error": "Name required"}), 400
     
-    # Generate unique 5-digit key
-    attempts = 0
-    while attempts < 100:
-        key = str(random.randint(10000, 99999))
-        path = os.path.join(PROJECTS_DIR, key)
-        if not os.path.exists(path):
-            break
-        attempts += 1
-    else:
+    # Unique 5-digit key from the catalog's pre-shuffled free keys
+    catalog = project_catalog()
+    key = catalog.allocate_key()
+    if key is None:
         return jsonify({"success": False, "error": "Failed to generate unique key"}), 500
-        
+    path = os.path.join(PROJECTS_DIR, key)
+
     try:
         os.makedirs(path)
         # Create metadata
+        created = time.time()
         with open(os.path.join(path, 'project.json'), 'w') as f:
-            json.dump({"name": name, "created": time.time()}, f)
+            json.dump({"name": name, "created": created}, f)
+        catalog.add(key, name, created)
 
         # Create default files
         with open(os.path.join(path, 'imports.py'), 'w') as f:
@@ -402,6 +1306,8 @@ def create_project():
             
         return jsonify({"success": True, "key": key, "name": name})
     except Exception as e:
+        if not os.path.exists(path):
+            catalog.release_key(key)
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/projects/delete', methods=['POST'])
@@ -417,6 +1323,9 @@ def delete_project():
         
     try:
         shutil.rmtree(path)
+        SWEEP_STORES.pop(key, None)
+        parallel.shutdown(key)
+        project_catalog().remove(key)
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -443,7 +1352,8 @@ def rename_project():
         meta['name'] = name
         with open(meta_path, 'w') as f:
             json.dump(meta, f)
-            
+        project_catalog().rename(key, name)
+
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -454,7 +1364,7 @@ def open_project(project_key):
     if project_key.isdigit() and len(project_key) == 5:
          path = os.path.join(PROJECTS_DIR, project_key)
          if os.path.exists(path):
-             return send_from_directory(STATIC_FOLDER, 'editor.html')
+             return asset_response('editor.html')
     
     # Otherwise treat as static file fallback or 404
     # But wait, serve_static below handles generic filenames. 
@@ -631,6 +1541,45 @@ def restart_kernels():
     shutdown_all_kernels()
     return jsonify({"status": "restarted"})
 
+@app.route('/kernel_hosts', methods=['GET'])
+def list_kernel_hosts():
+    placement = {host: [] for host in sorted(KERNEL_RING.nodes)}
+    for key, kdata in list(KERNELS.items()):
+        if kdata.get('host'):
+            placement.setdefault(kdata['host'], []).append(key)
+    return jsonify({"hosts": sorted(KERNEL_RING.nodes), "kernels": placement})
+
+@app.route('/kernel_hosts/add', methods=['POST'])
+def add_kernel_host():
+    address = (request.get_json(silent=True) or {}).get('address')
+    if not address:
+        return jsonify({"success": False, "error": "Address required"}), 400
+    try:
+        rpc(address, {"op": "ping"}, timeout=5)
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Host unreachable: {e}"}), 502
+    KERNEL_RING.add(address)
+    return jsonify({"success": True, "moved": rebalance_kernels()})
+
+@app.route('/kernel_hosts/drain', methods=['POST'])
+def drain_kernel_host():
+    address = (request.get_json(silent=True) or {}).get('address')
+    if not address:
+        return jsonify({"success": False, "error": "Address required"}), 400
+    if address not in KERNEL_RING.nodes:
+        return jsonify({"success": False, "error": "Unknown host"}), 404
+    KERNEL_RING.remove(address)
+    try:
+        rpc(address, {"op": "drain"}, timeout=5)
+    except Exception as e:
+        print(f"[KernelHosts] Could not mark {address} as draining: {e}")
+    return jsonify({"success": True, "moved": rebalance_kernels()})
+
+@app.route('/scheduler', methods=['GET'])
+def scheduler_stats():
+    """Queue depth and wait times of the execution scheduler."""
+    return jsonify(SCHEDULER.stats())
+
 @app.route('/execute', methods=['POST'])
 def execute_code_route():
     data = request.json
@@ -638,20 +1587,171 @@ def execute_code_route():
     code = data.get('code')
     pre_import_code = data.get('pre_import_code', '')
     project_id = data.get('project', 'default')
+    profile = bool(data.get('profile', False))
+    priority = data.get('priority', INTERACTIVE)
 
     if not filename or code is None:
         return jsonify({"success": False, "error": "Missing filename or code"}), 400
+    if priority not in PRIORITIES:
+        return jsonify({"success": False, "error": f"priority must be one of {', '.join(PRIORITIES)}"}), 400
+
+    # Kernels for this project may live in another worker process
+    if not request.headers.get('X-Studio-Forwarded'):
+        owner = project_owner_address(project_id)
+        if owner:
+            body, status = forward_to_owner(owner, '/execute', data)
+            return jsonify(body), status
     
     # Check if project was asleep or loading
     ensure_project_active(project_id)
     
-    result = internal_execute(project_id, filename, code, pre_import_code)
+    result = internal_execute(project_id, filename, code, pre_import_code, profile, priority)
     
     if result:
         return jsonify(result)
     else:
         return jsonify({"success": False, "error": "Internal execution failed"}), 500
 
+@app.route('/project/<project_name>/run', methods=['POST'])
+def run_project_route(project_name):
+    """Run a whole project (or some files of it), streaming NDJSON events."""
+    data = request.get_json(silent=True) or {}
+    if not os.path.exists(os.path.join(PROJECTS_DIR, project_name)):
+        return jsonify({"success": False, "error": "Project not found"}), 404
+
+    if not request.headers.get('X-Studio-Forwarded'):
+        owner = project_owner_address(project_name)
+        if owner:
+            return Response(forward_stream_to_owner(owner, f"/project/{project_name}/run", data),
+                            mimetype='application/x-ndjson')
+
+    selection = data.get('files')
+    priority = data.get('priority', BACKGROUND)
+    if priority not in PRIORITIES:
+        return jsonify({"success": False, "error": f"priority must be one of {', '.join(PRIORITIES)}"}), 400
+    # A full run recomputes every file anyway, so waking only restores state
+    ensure_project_active(project_name, rerun=bool(selection))
+
+    def stream():
+        for event in run_project(project_name, selection, data.get('code'), priority):
+            yield json.dumps(event) + '\n'
+    return Response(stream(), mimetype='application/x-ndjson')
+
+@app.route('/project/<project_name>/sweeps', methods=['GET', 'POST'])
+def project_sweeps(project_name):
+    """List the sweeps of a project, or start one.
+
+    POST body: filename, optional unsaved code, a plan ("grid": {name: values |
+    {"steps": n} | "all"} or "samples": n with optional "seed" and
+    "parameters"), "outputs" (expressions recorded per variant), "geometry"
+    (default true) and "workers".
+    """
+    if not os.path.exists(os.path.join(PROJECTS_DIR, project_name)):
+        return jsonify({"success": False, "error": "Project not found"}), 404
+    if request.method == 'GET':
+        return jsonify({"success": True, "sweeps": sweep_store(project_name).list()})
+
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename')
+    if not filename:
+        return jsonify({"success": False, "error": "Missing filename"}), 400
+    if not request.headers.get('X-Studio-Forwarded'):
+        owner = project_owner_address(project_name)
+        if owner:
+            body, status = forward_to_owner(owner, f"/project/{project_name}/sweeps", data)
+            return jsonify(body), status
+
+    code = data.get('code')
+    if code is None:
+        code = dict(find_project_files(project_name)).get(filename)
+        if code is None:
+            return jsonify({"success": False, "error": "File not found"}), 404
+    # Variants read the globals of the other files
+    ensure_project_active(project_name)
+    plan = {k: data[k] for k in ('grid', 'samples', 'seed', 'parameters') if k in data}
+    try:
+        info = start_sweep(project_name, filename, code, plan, data.get('outputs') or [],
+                           bool(data.get('geometry', True)), data.get('workers'))
+    except sweeps.SweepError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "sweep": info})
+
+@app.route('/project/<project_name>/sweeps/<sweep_id>', methods=['GET'])
+def sweep_status(project_name, sweep_id):
+    """Progress of a sweep."""
+    info = sweep_store(project_name).get(sweep_id) if os.path.exists(os.path.join(PROJECTS_DIR, project_name)) else None
+    if not info:
+        return jsonify({"success": False, "error": "Sweep not found"}), 404
+    return jsonify({"success": True, "sweep": info})
+
+@app.route('/project/<project_name>/sweeps/<sweep_id>/results', methods=['GET'])
+def sweep_results(project_name, sweep_id):
+    """One page of variant results: ?offset=&limit=&status=&geometry=1.
+
+    Geometry is referenced by id (identical results share one) unless
+    geometry=1 inlines it.
+    """
+    store = sweep_store(project_name) if os.path.exists(os.path.join(PROJECTS_DIR, project_name)) else None
+    info = store.get(sweep_id) if store else None
+    if not info:
+        return jsonify({"success": False, "error": "Sweep not found"}), 404
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = min(1000, max(1, request.args.get('limit', 100, type=int)))
+    page = store.results(sweep_id, offset, limit, request.args.get('geometry') == '1', request.args.get('status'))
+    return jsonify({"success": True, "total": info['total'], "offset": offset, "limit": limit, "results": page})
+
+@app.route('/project/<project_name>/sweeps/<sweep_id>/geometry/<geometry_id>', methods=['GET'])
+def sweep_geometry(project_name, sweep_id, geometry_id):
+    geometry = sweep_store(project_name).geometry(geometry_id) if os.path.exists(os.path.join(PROJECTS_DIR, project_name)) else None
+    if geometry is None:
+        return jsonify({"success": False, "error": "Geometry not found"}), 404
+    return jsonify({"success": True, "geometry": geometry})
+
+@app.route('/project/<project_name>/sweeps/<sweep_id>/cancel', methods=['POST'])
+def cancel_sweep(project_name, sweep_id):
+    """Stop a sweep. Finished variants are kept; pending ones never run."""
+    if not os.path.exists(os.path.join(PROJECTS_DIR, project_name)):
+        return jsonify({"success": False, "error": "Project not found"}), 404
+    # The flag lives in the sweep database, so whichever process runs the sweep sees it
+    if not sweep_store(project_name).request_cancel(sweep_id):
+        return jsonify({"success": False, "error": "Sweep not running"}), 409
+    job = SWEEP_JOBS.get(sweep_id)
+    if job:
+        job.interrupt()
+    return jsonify({"success": True})
+
+@app.route('/project/<project_name>/activate', methods=['POST'])
+def activate_project_route(project_name):
+    """Wake a project up on the worker that owns its kernels."""
+    if not os.path.exists(os.path.join(PROJECTS_DIR, project_name)):
+        return jsonify({"success": False, "error": "Project not found"}), 404
+    activate_project(project_name, forwarded=bool(request.headers.get('X-Studio-Forwarded')))
+    return jsonify({"success": True})
+
+def activate_project(project_id, forwarded=False):
+    owner = None if forwarded else project_owner_address(project_id)
+    if owner:
+        forward_to_owner(owner, f"/project/{project_id}/activate", {})
+    else:
+        ensure_project_active(project_id)
+
+@app.route('/project/<project_name>/warm', methods=['POST'])
+def warm_project_route(project_name):
+    """Start kernels for the given files (default: the likely ones from .workspace.json)."""
+    if not os.path.exists(os.path.join(PROJECTS_DIR, project_name)):
+        return jsonify({"success": False, "error": "Project not found"}), 404
+    data = request.get_json(silent=True) or {}
+    warm_project(project_name, data.get('files'), forwarded=bool(request.headers.get('X-Studio-Forwarded')))
+    return jsonify({"success": True})
+
+@app.route('/project/<project_name>/snapshots', methods=['GET'])
+def project_snapshots(project_name):
+    """Last output and geometry of every unchanged file. Never starts a kernel."""
+    if not os.path.exists(os.path.join(PROJECTS_DIR, project_name)):
+        return jsonify({"success": False, "error": "Project not found"}), 404
+    update_activity(project_name)
+    return jsonify({"success": True, "files": fresh_snapshots(project_name)})
+
 @app.route('/project/<project_name>/workspace', methods=['GET', 'POST'])
 def workspace_state(project_name):
     update_activity(project_name) # Keep alive
@@ -680,36 +1780,49 @@ def workspace_state(project_name):
         try:
             with open(workspace_file, 'w') as f:
                 json.dump(data, f)
+            # Tabs just opened are likely to run soon
+            warm_project(project_name)
             return jsonify({"success": True})
         except Exception as e:
             return jsonify({"success": False, "error": str(e)}), 500
 
 
 
-def collect_kernel_output(kc, msg_id):
+def collect_kernel_output(kc, msg_id, timeout=None, km=None):
+    """Gather the IOPub output of one run until the kernel goes idle.
+
+    Gives up after `timeout` seconds (result['timed_out']) or, when km is
+    given, as soon as the kernel process dies (result['kernel_died']).
+    """
+    if timeout is None:
+        timeout = EXECUTION_TIMEOUT
+    timed_out = kernel_died = False
     # Buffer lists
     output_text_parts = []
     error_text_parts = []
-    geometry_data = [] 
-    new_globals = {}
     
-    # Stream accumulator for potential split JSON messages
-    stream_buffer = []
+    # Stream output, split into marker blocks and (bounded) user output as it arrives
+    stream = OutputBuffer()
     
     start_time = time.time()
     next_log_time = start_time + 1.0
     
     while True:
         try:
-            # 30s Timeout for safety, increased to allow imports/startups
-            if time.time() - start_time > 30:
+            # Timeout for safety, long enough to allow imports/startups
+            if time.time() - start_time > timeout:
                 print(f"[DEBUG] MsgID {msg_id} TIMEOUT")
-                error_text_parts.append("[Server Timeout] Execution took too long.")
+                error_text_parts.append(f"[Server Timeout] Execution took longer than {timeout:g}s.")
+                timed_out = True
                 break
                 
             if time.time() > next_log_time:
                 # print(f"[DEBUG] Waiting for output... {time.time()-start_time:.1f}s")
                 next_log_time += 1.0
+                if km is not None and not km.is_alive():
+                    error_text_parts.append("[Kernel Died] The kernel process exited during execution.")
+                    kernel_died = True
+                    break
 
             msg = kc.get_iopub_msg(timeout=0.1)  # Faster polling
             content = msg['content']
@@ -721,11 +1834,7 @@ def collect_kernel_output(kc, msg_id):
                 continue 
             
             if msg_type == 'stream':
-                text = content['text']
-                stream_buffer.append(text)
-                # Don't process immediately, wait for idle to process full buffer?
-                # Or process incrementally?
-                # Best is to append to buffer.
+                stream.write(content['text'])
                     
             elif msg_type == 'execute_result':
                 data = content['data']
@@ -749,99 +1858,94 @@ def collect_kernel_output(kc, msg_id):
             error_text_parts.append(f"[Server Error]: {str(e)}")
             break
 
-    # Process buffered stream output at the end
-    full_stream_text = "".join(stream_buffer)
-    
-    # 1. Extract Geometry Data
-    if '<<<VP_DATA_START>>>' in full_stream_text:
-        full_stream_text, data = extract_json_block(full_stream_text, '<<<VP_DATA_START>>>', '<<<VP_DATA_END>>>')
-        if data: geometry_data = data
-    
-    # 2. Extract Globals Data
-    if '<<<GLOBALS_START>>>' in full_stream_text:
-        full_stream_text, data = extract_json_block(full_stream_text, '<<<GLOBALS_START>>>', '<<<GLOBALS_END>>>')
-        if data: new_globals = data
+    # Marker blocks were split off on arrival; assemble the result
+    result = build_result(stream, output_text_parts, error_text_parts)
+    if timed_out: result['timed_out'] = True
+    if kernel_died: result['kernel_died'] = True
+    return result
 
-    # 3. Remaining text is user output
-    if full_stream_text:
-        output_text_parts.append(full_stream_text)
+def build_result(stream, output_text_parts, error_text_parts):
+    """Assemble the /execute result from a run's OutputBuffer.
 
-    return {
+    Geometry, spatial index, globals and studio cache counts come from their
+    marker blocks; other blocks (profile, checkpoint, sweep outputs) are left
+    in result['blocks'] for the caller. A spilled log is referenced by
+    result['output_log'].
+    """
+    stream.close()
+    blocks = stream.blocks
+    geometry_data = blocks.pop('VP_DATA', None) or []
+    spatial = blocks.pop('VP_INDEX', None) or {}
+    new_globals = blocks.pop('GLOBALS', None) or {}
+    cache = blocks.pop('CACHE', None)
+
+    text = stream.text()
+    if text:
+        output_text_parts.append(text)
+
+    result = {
         "success": len(error_text_parts) == 0,
         "output": "".join(output_text_parts),
         "error": "\n".join(error_text_parts),
         "geometry": geometry_data,
+        "spatial": spatial,
         "globals": new_globals
     }
+    if stream.info():
+        result['output_log'] = stream.info()
+    if cache:
+        result['cache'] = cache
+    if blocks:
+        result['blocks'] = blocks
+    return result
 
-def extract_json_block(text, start_tag, end_tag):
-    """Refined extraction of JSON blocks from text stream."""
-    extracted_data = None
-    clean_text = text
-    
-    # Simple algorithm: Find start, find end after start
-    s = text.find(start_tag)
-    if s != -1:
-        e = text.find(end_tag, s) # Look for end AFTER start
-        
-        if e != -1:
-            json_str = text[s + len(start_tag) : e].strip()
-            try:
-                extracted_data = json.loads(json_str)
-            except json.JSONDecodeError:
-                pass # Malformed JSON
-                
-            # Remove the whole block including tags and optional trailing newline
-            block_end = e + len(end_tag)
-            
-            # Check for trailing newline
-            if block_end < len(text) and text[block_end] == '\n':
-                block_end += 1
-            elif block_end + 1 < len(text) and text[block_end:block_end+2] == '\r\n':
-                block_end += 2
-                
-            clean_text = text[:s] + text[block_end:]
-        
-    return clean_text, extracted_data
+@app.route('/output/<log_id>', methods=['GET'])
+def output_log(log_id):
+    """A byte range of a run's full output once it outgrew memory: ?offset=&length=."""
+    offset = max(0, request.args.get('offset', 0, type=int))
+    length = min(8 * 1024 * 1024, max(1, request.args.get('length', 1024 * 1024, type=int)))
+    found = read_log(log_id, offset, length)
+    if found is None:
+        return jsonify({"success": False, "error": "Output not found"}), 404
+    data, total = found
+    return Response(data, mimetype='text/plain; charset=utf-8',
+                    headers={"X-Output-Size": str(total), "X-Output-Offset": str(offset)})
 
 # --- AI ENDPOINTS ---
 
+AI_JOBS = None # ai.AIJobs, built on first use (the backend may be slow to import)
+
+def ai_jobs():
+    global AI_JOBS
+    with BASE_LOCK:
+        if AI_JOBS is None:
+            AI_JOBS = ai.AIJobs(ai.load_backend())
+        return AI_JOBS
+
 @app.route('/api/ai_edit', methods=['POST'])
 def ai_edit():
-    """
-    Mock AI Editor Endpoint.
-    Replace the logic here with a call to OpenAI, Anthropic, or local LLM.
-    """
-    data = request.json
-    prompt = data.get('prompt', '')
-    context = data.get('context', '')
-    selection = data.get('selection', '')
-    
-    # ---------------------------------------------------------
-    # Example using OpenAI (pseudo-code):
-    # response = openai.ChatCompletion.create(
-    #     model="gpt-4",
-    #     messages=[
-    #         {"role": "system", "content": "You are a Python coding assistant. Return only the code block."},
-    #         {"role": "user", "content": f"Context:\n{context}\n\nSelection:\n{selection}\n\nTask: {prompt}"}
-    #     ]
-    # )
-    # return jsonify({"code": response.choices[0].message.content})
-    # ---------------------------------------------------------
-    
-    # mock response for now
-    time.sleep(1) # Simulate network latency
-    
-    if "box" in prompt.lower():
-        mock_code = "box = Box(Frame.worldXY(), 5, 5, 5)\n"
-    elif "sphere" in prompt.lower():
-        mock_code = "sphere = Sphere(Point(0,0,0), 3.0)\n"
-    elif "test" in prompt.lower():
-        mock_code = "# This is a test response from the AI assistant.\nprint('Hello from AI!')\n"
-    else:
-        mock_code = f"# AI Generated Code for: {prompt}\n# Please configure API Key in server.py\n"
+    """Whole completion in one response, for clients without a socket (see ai.py)."""
+    data = request.json or {}
+    events = queue.Queue()
+    request_id = uuid.uuid4().hex
+    if not ai_jobs().submit(request_id, None, data.get('prompt', ''), data.get('context', ''),
+                            data.get('selection', ''), lambda event, payload: events.put((event, payload))):
+        return jsonify({"success": False, "error": "AI is busy, try again shortly"}), 503
+    deadline = time.time() + ai.AI_TIMEOUT
+    while True:
+        try:
+            event, payload = events.get(timeout=max(0.0, deadline - time.time()))
+        except queue.Empty:
+            ai_jobs().cancel(request_id)
+            return jsonify({"success": False, "error": f"AI did not finish within {ai.AI_TIMEOUT:g}s"}), 504
+        if event == 'ai_done':
+            return jsonify({"code": payload['code']})
+        if event == 'ai_error':
+            return jsonify({"success": False, "error": payload['error']}), 502
 
-    return jsonify({"code": mock_code})
+@app.route('/api/ai_stats', methods=['GET'])
+def ai_stats():
+    return jsonify(ai_jobs().stats())
 
 # --- SOCKET EVENTS ---
 @socketio.on('join')
@@ -850,12 +1954,8 @@ def on_join(data):
     if project:
         join_room(project)
         update_activity(project)
-        # Ensure project is awake when user joins
-        # We do this asynchronously or fast?
-        # Ideally synchronous so they see state, but it might block the socket handshake.
-        # Let's trust the client will call loadWorkspace/loadFiles soon which triggers activity too.
-        # But to be safe:
-        ensure_project_active(project)
+        # Wake and warm in the background (on the owning worker); the join does not wait for kernels
+        warm_project(project)
         print(f"User joined project room: {project}")
 
 @socketio.on('leave')
@@ -876,5 +1976,31 @@ def on_code_change(data):
         # Broadcast to everyone in the room EXCEPT sender (include_self=False)
         emit('code_update', data, room=project, include_self=False)
 
+@socketio.on('ai_edit')
+def on_ai_edit(data):
+    """Stream a completion back to the requesting client (see ai.py)."""
+    request_id = str(data.get('request_id') or '')
+    sid = request.sid
+    if not request_id:
+        return
+    def send(event, payload):
+        socketio.emit(event, payload, to=sid)
+    if not ai_jobs().submit(request_id, sid, data.get('prompt', ''), data.get('context', ''),
+                            data.get('selection', ''), send):
+        emit('ai_error', {"request_id": request_id, "error": "AI is busy, try again shortly"})
+
+@socketio.on('ai_cancel')
+def on_ai_cancel(data):
+    ai_jobs().cancel(str(data.get('request_id') or ''), request.sid)
+
+@socketio.on('disconnect')
+def on_disconnect(*args):
+    if AI_JOBS is not None:
+        AI_JOBS.cancel_owner(request.sid)
+
+startup.mark('register_routes')
+
 if __name__ == '__main__':
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true': # Not in the reloader's parent process
+        start_background_services()
     socketio.run(app, host=HOST, port=PORT, debug=True)
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import os
+import re
+import time
+
+# --- GEOMETRY SNAPSHOTS ---
+# The last result (output + geometry) of each file, written to
+# projects/<id>/.snapshots/ when a project hibernates. A snapshot is only
+# served while its fingerprint still matches:
+#   code     hash of the file's source
+#   imports  hash of the pre-import code it ran with
+#   inputs   hash of the project globals it references (by name, minus its own exports)
+# If nothing changed since hibernation the viewport can show the snapshot
+# without starting a kernel.
+
+SNAPSHOT_DIR = '.snapshots'
+SNAPSHOT_FIELDS = ('success', 'output', 'error', 'geometry', 'spatial')
+GLOBAL_NAME = re.compile(r'\bglb_\w+')
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def fingerprint(code, pre_import_code, project_globals, own_exports=()):
+    """Fingerprint of one file's run inputs. project_globals is { name: b64 pickle }."""
+    referenced = set(GLOBAL_NAME.findall(code)) | set(GLOBAL_NAME.findall(pre_import_code or ''))
+    referenced -= set(own_exports)
+    inputs = sorted((k, v) for k, v in project_globals.items() if k in referenced)
+    return {
+        "code": _digest(code),
+        "imports": _digest(pre_import_code or ''),
+        "inputs": _digest(json.dumps(inputs)),
+    }
+
+
+def _path(project_dir, filename):
+    # Flat directory, one file per source file; the name is kept inside the snapshot
+    return os.path.join(project_dir, SNAPSHOT_DIR, _digest(filename)[:24] + '.json')
+
+
+def save(project_dir, filename, fp, result):
+    os.makedirs(os.path.join(project_dir, SNAPSHOT_DIR), exist_ok=True)
+    path = _path(project_dir, filename)
+    snapshot = {
+        "filename": filename,
+        "fingerprint": fp,
+        "created": time.time(),
+        "result": {k: result.get(k) for k in SNAPSHOT_FIELDS},
+    }
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, path)
+
+
+def load(project_dir, filename):
+    try:
+        with open(_path(project_dir, filename), 'r') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return snapshot if snapshot.get('filename') == filename else None
@@ -0,0 +1,39 @@
+import os
+import time
+
+# --- STARTUP TIMING ---
+# Records how long each cold-start phase took, for /ready and the start log.
+# Kept free of heavy imports so it can be loaded before everything else.
+
+PHASES = []    # [(name, seconds)]
+_last = time.perf_counter()
+
+
+def mark(name):
+    """Close the current phase under `name` and start the next one."""
+    global _last
+    now = time.perf_counter()
+    PHASES.append((name, now - _last))
+    _last = now
+
+
+def process_age():
+    """Seconds since this process was started (Linux), including interpreter startup."""
+    try:
+        with open('/proc/self/stat', 'r') as f:
+            # Field 22 is the start time in clock ticks since boot; comm (field 2) may contain spaces
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime', 'r') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def report():
+    phases = {name: round(seconds * 1000.0, 1) for name, seconds in PHASES}
+    return {
+        "phases_ms": phases,
+        "total_ms": round(sum(seconds for _, seconds in PHASES) * 1000.0, 1),
+        "process_age_s": process_age(),
+    }
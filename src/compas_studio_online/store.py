@@ -0,0 +1,252 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- STATE STORE ---
+# Server state that must be shared between worker processes:
+#   globals   { project_id: { var: b64, ... } }     pickled glb_ variables
+#   exports   { project_id: { file: [vars], ... } } which file exported what
+#   activity  { project_id: timestamp }             last activity, for hibernation
+#   loaded    set(project_id)                       projects currently awake
+#   workers / affinity                              which process owns a project's kernels
+#
+# Kernel objects themselves stay in the owning process (server.KERNELS).
+#
+# STATE_STORE selects the backend:
+#   memory://               in-process dicts (default, single process)
+#   sqlite:///path/to/db    file-backed, shared by worker processes on one machine
+
+
+class LocalStore:
+    """In-process store. Same behaviour as the original module-level dicts."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.globals = {}
+        self.exports = {}
+        self.activity_map = {}
+        self.workers = {}
+        self.affinity = {}
+
+    # --- PROJECT STATE ---
+    def is_loaded(self, project_id):
+        return project_id in self.globals
+
+    def load_project(self, project_id, variables=None, exports=None):
+        with self.lock:
+            self.globals[project_id] = dict(variables or {})
+            self.exports[project_id] = {k: list(v) for k, v in (exports or {}).items()}
+
+    def drop_project(self, project_id):
+        with self.lock:
+            self.globals.pop(project_id, None)
+            self.exports.pop(project_id, None)
+            self.activity_map.pop(project_id, None)
+
+    def reset(self):
+        """Forget every project's globals and exports (kernel restart)."""
+        with self.lock:
+            self.globals = {}
+            self.exports = {}
+
+    def get_globals(self, project_id):
+        with self.lock:
+            return dict(self.globals.get(project_id, {}))
+
+    def get_exports(self, project_id):
+        with self.lock:
+            return {k: list(v) for k, v in self.exports.get(project_id, {}).items()}
+
+    def clear_file_exports(self, project_id, filename):
+        """Remove the globals a file exported on its previous run. Returns them."""
+        with self.lock:
+            project_globals = self.globals.setdefault(project_id, {})
+            project_exports = self.exports.setdefault(project_id, {})
+            removed = {}
+            for name in project_exports.get(filename, []):
+                if name in project_globals:
+                    removed[name] = project_globals.pop(name)
+            project_exports[filename] = []
+            return removed
+
+    def set_file_exports(self, project_id, filename, values):
+        """Record the globals a file exported on this run."""
+        with self.lock:
+            self.globals.setdefault(project_id, {}).update(values)
+            self.exports.setdefault(project_id, {})[filename] = list(values.keys())
+
+    # --- ACTIVITY ---
+    def touch(self, project_id, timestamp=None):
+        self.activity_map[project_id] = timestamp or time.time()
+
+    def activity(self):
+        return dict(self.activity_map)
+
+    # --- WORKERS / AFFINITY ---
+    def register_worker(self, worker_id, address):
+        with self.lock:
+            self.workers[worker_id] = {'address': address, 'heartbeat': time.time()}
+
+    def heartbeat(self, worker_id):
+        with self.lock:
+            if worker_id in self.workers:
+                self.workers[worker_id]['heartbeat'] = time.time()
+
+    def claim_project(self, project_id, worker_id, stale_after=15.0):
+        """Return (owner_id, owner_address); takes over from a dead owner."""
+        with self.lock:
+            now = time.time()
+            owner = self.affinity.get(project_id)
+            info = self.workers.get(owner)
+            if owner is None or info is None or now - info['heartbeat'] > stale_after:
+                self.affinity[project_id] = owner = worker_id
+                info = self.workers.get(worker_id, {'address': None})
+            return owner, info['address']
+
+    def release_project(self, project_id, worker_id):
+        with self.lock:
+            if self.affinity.get(project_id) == worker_id:
+                del self.affinity[project_id]
+
+    def owned_projects(self, worker_id):
+        with self.lock:
+            return [pid for pid, owner in self.affinity.items() if owner == worker_id]
+
+
+class SQLiteStore:
+    """File-backed store; every worker process opens the same database."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS loaded   (project_id TEXT PRIMARY KEY);
+    CREATE TABLE IF NOT EXISTS globals  (project_id TEXT, name TEXT, value TEXT, PRIMARY KEY (project_id, name));
+    CREATE TABLE IF NOT EXISTS exports  (project_id TEXT, filename TEXT, names TEXT, PRIMARY KEY (project_id, filename));
+    CREATE TABLE IF NOT EXISTS activity (project_id TEXT PRIMARY KEY, ts REAL);
+    CREATE TABLE IF NOT EXISTS workers  (worker_id TEXT PRIMARY KEY, address TEXT, heartbeat REAL);
+    CREATE TABLE IF NOT EXISTS affinity (project_id TEXT PRIMARY KEY, worker_id TEXT);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def _tx(self):
+        return _Transaction(self._conn())
+
+    # --- PROJECT STATE ---
+    def is_loaded(self, project_id):
+        row = self._conn().execute("SELECT 1 FROM loaded WHERE project_id=?", (project_id,)).fetchone()
+        return row is not None
+
+    def load_project(self, project_id, variables=None, exports=None):
+        with self._tx() as db:
+            db.execute("INSERT OR IGNORE INTO loaded VALUES (?)", (project_id,))
+            db.execute("DELETE FROM globals WHERE project_id=?", (project_id,))
+            db.execute("DELETE FROM exports WHERE project_id=?", (project_id,))
+            db.executemany("INSERT INTO globals VALUES (?, ?, ?)", [(project_id, k, v) for k, v in (variables or {}).items()])
+            db.executemany("INSERT INTO exports VALUES (?, ?, ?)", [(project_id, k, json.dumps(v)) for k, v in (exports or {}).items()])
+
+    def drop_project(self, project_id):
+        with self._tx() as db:
+            for table in ('loaded', 'globals', 'exports', 'activity'):
+                db.execute(f"DELETE FROM {table} WHERE project_id=?", (project_id,))
+
+    def reset(self):
+        with self._tx() as db:
+            for table in ('loaded', 'globals', 'exports'):
+                db.execute(f"DELETE FROM {table}")
+
+    def get_globals(self, project_id):
+        rows = self._conn().execute("SELECT name, value FROM globals WHERE project_id=?", (project_id,))
+        return dict(rows.fetchall())
+
+    def get_exports(self, project_id):
+        rows = self._conn().execute("SELECT filename, names FROM exports WHERE project_id=?", (project_id,))
+        return {fname: json.loads(names) for fname, names in rows.fetchall()}
+
+    def clear_file_exports(self, project_id, filename):
+        with self._tx() as db:
+            row = db.execute("SELECT names FROM exports WHERE project_id=? AND filename=?", (project_id, filename)).fetchone()
+            removed = {}
+            for name in json.loads(row[0]) if row else []:
+                value = db.execute("SELECT value FROM globals WHERE project_id=? AND name=?", (project_id, name)).fetchone()
+                if value:
+                    removed[name] = value[0]
+                db.execute("DELETE FROM globals WHERE project_id=? AND name=?", (project_id, name))
+            db.execute("INSERT OR REPLACE INTO exports VALUES (?, ?, '[]')", (project_id, filename))
+            return removed
+
+    def set_file_exports(self, project_id, filename, values):
+        with self._tx() as db:
+            db.executemany("INSERT OR REPLACE INTO globals VALUES (?, ?, ?)", [(project_id, k, v) for k, v in values.items()])
+            db.execute("INSERT OR REPLACE INTO exports VALUES (?, ?, ?)", (project_id, filename, json.dumps(list(values.keys()))))
+
+    # --- ACTIVITY ---
+    def touch(self, project_id, timestamp=None):
+        self._conn().execute("INSERT OR REPLACE INTO activity VALUES (?, ?)", (project_id, timestamp or time.time()))
+
+    def activity(self):
+        return dict(self._conn().execute("SELECT project_id, ts FROM activity").fetchall())
+
+    # --- WORKERS / AFFINITY ---
+    def register_worker(self, worker_id, address):
+        self._conn().execute("INSERT OR REPLACE INTO workers VALUES (?, ?, ?)", (worker_id, address, time.time()))
+
+    def heartbeat(self, worker_id):
+        self._conn().execute("UPDATE workers SET heartbeat=? WHERE worker_id=?", (time.time(), worker_id))
+
+    def claim_project(self, project_id, worker_id, stale_after=15.0):
+        with self._tx() as db:
+            row = db.execute(
+                "SELECT a.worker_id, w.address, w.heartbeat FROM affinity a LEFT JOIN workers w ON a.worker_id = w.worker_id WHERE a.project_id=?",
+                (project_id,)
+            ).fetchone()
+            if row and row[2] is not None and time.time() - row[2] <= stale_after:
+                return row[0], row[1]
+            db.execute("INSERT OR REPLACE INTO affinity VALUES (?, ?)", (project_id, worker_id))
+            address = db.execute("SELECT address FROM workers WHERE worker_id=?", (worker_id,)).fetchone()
+            return worker_id, address[0] if address else None
+
+    def release_project(self, project_id, worker_id):
+        self._conn().execute("DELETE FROM affinity WHERE project_id=? AND worker_id=?", (project_id, worker_id))
+
+    def owned_projects(self, worker_id):
+        rows = self._conn().execute("SELECT project_id FROM affinity WHERE worker_id=?", (worker_id,))
+        return [r[0] for r in rows.fetchall()]
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, so read-modify-write is atomic across processes."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def create_store(url=None):
+    """Build the store selected by a STATE_STORE url."""
+    url = url or 'memory://'
+    if url.startswith('memory://'):
+        return LocalStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteStore(url[len('sqlite:///'):])
+    raise ValueError(f"Unsupported STATE_STORE: {url}")
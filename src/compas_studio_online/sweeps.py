@@ -0,0 +1,371 @@
+import hashlib
+import itertools
+import json
+import os
+import queue
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+# --- PARAMETRIC SWEEPS ---
+# Runs one file over many combinations of its slider values, headless:
+#
+#   a = 3 # range(1, 10)
+#   mode = 'x' # switch('x', 'y')
+#
+# A plan is either a grid (cartesian product) or a number of samples
+# (Latin hypercube over ranges, uniform over switches). Each variant runs
+# with the value text on those lines replaced. Its geometry (zlib JSON,
+# stored once per distinct result) and the requested scalar outputs go to
+# projects/<id>/.sweeps.sqlite. Progress, pages of results and cancellation
+# all go through that file, so any worker process can serve them.
+
+RANGE_LINE = re.compile(r'([a-zA-Z0-9_]+)\s*=\s*([-+]?[0-9]*\.?[0-9]+)\s*#\s*range\(\s*([-+]?[0-9]*\.?[0-9]+)\s*,\s*([-+]?[0-9]*\.?[0-9]+)\s*\)')
+SWITCH_LINE = re.compile(r'([a-zA-Z0-9_]+)\s*=\s*(.+?)\s*#\s*switch\s*\((.+)\)')
+
+SWEEP_DB = '.sweeps.sqlite'
+MAX_VARIANTS = int(os.environ.get('SWEEP_MAX_VARIANTS', 10000))
+STALE_AFTER = 300 # seconds without progress before a running sweep counts as interrupted
+DEFAULT_STEPS = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sweeps (
+    id TEXT PRIMARY KEY, filename TEXT, created REAL, updated REAL, finished REAL, status TEXT,
+    total INTEGER, done INTEGER DEFAULT 0, failed INTEGER DEFAULT 0,
+    parameters TEXT, outputs TEXT, cancel INTEGER DEFAULT 0, error TEXT
+);
+CREATE TABLE IF NOT EXISTS variants (
+    sweep_id TEXT, idx INTEGER, params TEXT, status TEXT, outputs TEXT,
+    geometry TEXT, error TEXT, duration_ms REAL,
+    PRIMARY KEY (sweep_id, idx)
+);
+CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, data BLOB);
+"""
+
+
+class SweepError(ValueError):
+    pass
+
+
+def new_id():
+    return time.strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6]
+
+
+# --- PARAMETERS ---
+def parse_parameters(code):
+    """{ name: spec } for every slider and switch line of a file."""
+    params = {}
+    for lineno, line in enumerate(code.splitlines()):
+        m = RANGE_LINE.search(line)
+        if m:
+            lo, hi = float(m.group(3)), float(m.group(4))
+            integer = all(v.lstrip('+-').isdigit() for v in (m.group(2), m.group(3), m.group(4)))
+            params[m.group(1)] = {"kind": "range", "line": lineno, "min": lo, "max": hi,
+                                  "integer": integer, "default": float(m.group(2))}
+            continue
+        m = SWITCH_LINE.search(line)
+        if m:
+            options = [o.strip() for o in m.group(3).split(',')]
+            params[m.group(1)] = {"kind": "switch", "line": lineno, "options": options,
+                                  "default": m.group(2).strip()}
+    return params
+
+
+def _format(spec, value):
+    if spec['kind'] == 'switch':
+        # Options are kept as source text ("'a'", "2"); other values become literals
+        return value if isinstance(value, str) and value in spec['options'] else repr(value)
+    if spec['integer']:
+        return str(int(round(value)))
+    return repr(float(value))
+
+
+def substitute(code, params, values):
+    """The file's code with the given slider values written into their lines."""
+    lines = code.splitlines()
+    for name, value in values.items():
+        spec = params[name]
+        line = lines[spec['line']]
+        pattern = RANGE_LINE if spec['kind'] == 'range' else SWITCH_LINE
+        m = pattern.search(line)
+        lines[spec['line']] = line[:m.start(2)] + _format(spec, value) + line[m.end(2):]
+    return '\n'.join(lines) + ('\n' if code.endswith('\n') else '')
+
+
+# --- PLANS ---
+def _axis(name, spec, choice):
+    """Values of one parameter for a grid: a list, {"steps": n}, or "all"."""
+    if isinstance(choice, list):
+        return choice
+    if spec['kind'] == 'switch':
+        if choice in (None, 'all'):
+            return list(spec['options'])
+        raise SweepError(f"Invalid values for switch {name}")
+    steps = DEFAULT_STEPS
+    if isinstance(choice, dict):
+        try:
+            steps = int(choice.get('steps', DEFAULT_STEPS))
+        except (TypeError, ValueError):
+            raise SweepError(f"Invalid steps for range {name}") from None
+    elif choice not in (None, 'all'):
+        raise SweepError(f"Invalid values for range {name}")
+    lo, hi = spec['min'], spec['max']
+    if spec['integer'] and (choice == 'all' or hi - lo + 1 <= steps):
+        return list(range(int(lo), int(hi) + 1))
+    if steps < 2:
+        return [lo]
+    return [lo + (hi - lo) * i / (steps - 1) for i in range(steps)]
+
+
+def expand_plan(params, plan):
+    """List of { name: value } variants for a grid or sample plan."""
+    if 'grid' in plan:
+        grid = plan['grid']
+        if not isinstance(grid, dict):
+            raise SweepError("grid must map parameter names to values")
+        unknown = set(grid) - set(params)
+        if unknown:
+            raise SweepError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+        names = list(grid)
+        axes = [_axis(n, params[n], grid[n]) for n in names]
+        total = 1
+        for axis in axes:
+            total *= len(axis)
+        if total > MAX_VARIANTS:
+            raise SweepError(f"Grid has {total} variants, the limit is {MAX_VARIANTS}")
+        return [dict(zip(names, combo)) for combo in itertools.product(*axes)]
+
+    if 'samples' in plan:
+        try:
+            count = int(plan['samples'])
+        except (TypeError, ValueError):
+            raise SweepError("samples must be an integer") from None
+        if count > MAX_VARIANTS:
+            raise SweepError(f"{count} samples requested, the limit is {MAX_VARIANTS}")
+        names = plan.get('parameters') or list(params)
+        rng = random.Random(plan.get('seed'))
+        variants = [{} for _ in range(count)]
+        for name in names:
+            spec = params.get(name)
+            if spec is None:
+                raise SweepError(f"Unknown parameter: {name}")
+            if spec['kind'] == 'switch':
+                for v in variants:
+                    v[name] = rng.choice(spec['options'])
+                continue
+            # Latin hypercube: one sample per stratum, strata shuffled per parameter
+            strata = list(range(count))
+            rng.shuffle(strata)
+            for v, s in zip(variants, strata):
+                value = spec['min'] + (spec['max'] - spec['min']) * (s + rng.random()) / count
+                v[name] = int(round(value)) if spec['integer'] else value
+        return variants
+
+    raise SweepError("Plan needs 'grid' or 'samples'")
+
+
+def outputs_code(expressions):
+    """Kernel code that evaluates the requested outputs and prints them in a SWEEP block."""
+    return f"""
+import json as _vp_json
+_vp_sweep_outputs = {{}}
+for _vp_expr in {list(expressions)!r}:
+    try:
+        _vp_val = eval(_vp_expr, globals())
+        if not isinstance(_vp_val, (int, float, str, bool, type(None))):
+            _vp_val = float(_vp_val)
+    except Exception:
+        _vp_val = None
+    _vp_sweep_outputs[_vp_expr] = _vp_val
+print('<<<SWEEP_START>>>')
+print(_vp_json.dumps(_vp_sweep_outputs))
+print('<<<SWEEP_END>>>')
+"""
+
+
+# --- STORAGE ---
+class SweepStore:
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.row_factory = sqlite3.Row
+            self.local.conn = conn
+        return conn
+
+    def create(self, sweep_id, filename, parameters, outputs, variants):
+        with self._conn() as conn:
+            now = time.time()
+            conn.execute("INSERT INTO sweeps (id, filename, created, updated, status, total, parameters, outputs) "
+                         "VALUES (?, ?, ?, ?, 'running', ?, ?, ?)",
+                         (sweep_id, filename, now, now, len(variants), json.dumps(parameters), json.dumps(outputs)))
+            conn.executemany("INSERT INTO variants (sweep_id, idx, params, status) VALUES (?, ?, ?, 'pending')",
+                             ((sweep_id, i, json.dumps(v)) for i, v in enumerate(variants)))
+
+    def record(self, sweep_id, idx, status, outputs, geometry, error, duration_ms):
+        """Store one variant's result. Identical geometry is stored once."""
+        geometry_hash = None
+        if geometry is not None:
+            raw = json.dumps(geometry, separators=(',', ':')).encode('utf-8')
+            geometry_hash = hashlib.sha256(raw).hexdigest()
+        with self._conn() as conn:
+            if geometry_hash:
+                conn.execute("INSERT OR IGNORE INTO blobs (hash, data) VALUES (?, ?)",
+                             (geometry_hash, zlib.compress(raw, 6)))
+            conn.execute("UPDATE variants SET status = ?, outputs = ?, geometry = ?, error = ?, duration_ms = ? "
+                         "WHERE sweep_id = ? AND idx = ?",
+                         (status, json.dumps(outputs), geometry_hash, error, duration_ms, sweep_id, idx))
+            column = 'done' if status == 'ok' else 'failed'
+            conn.execute(f"UPDATE sweeps SET {column} = {column} + 1, updated = ? WHERE id = ?",
+                         (time.time(), sweep_id))
+
+    def finish(self, sweep_id, status, error=None):
+        with self._conn() as conn:
+            conn.execute("UPDATE sweeps SET status = ?, finished = ?, error = ? WHERE id = ?",
+                         (status, time.time(), error, sweep_id))
+
+    def request_cancel(self, sweep_id):
+        with self._conn() as conn:
+            return conn.execute("UPDATE sweeps SET cancel = 1 WHERE id = ? AND status = 'running'",
+                                (sweep_id,)).rowcount > 0
+
+    def cancel_requested(self, sweep_id):
+        row = self._conn().execute("SELECT cancel FROM sweeps WHERE id = ?", (sweep_id,)).fetchone()
+        return bool(row and row['cancel'])
+
+    def get(self, sweep_id):
+        row = self._conn().execute("SELECT * FROM sweeps WHERE id = ?", (sweep_id,)).fetchone()
+        if not row:
+            return None
+        info = dict(row)
+        info['parameters'] = json.loads(info['parameters'])
+        info['outputs'] = json.loads(info['outputs'])
+        info['cancel'] = bool(info['cancel'])
+        if info['status'] == 'running' and time.time() - info['updated'] > STALE_AFTER:
+            info['status'] = 'interrupted' # The process running it went away
+        end = info['finished'] or time.time()
+        completed = info['done'] + info['failed']
+        info['elapsed_s'] = round(end - info['created'], 1)
+        info['progress'] = round(completed / info['total'], 4) if info['total'] else 1.0
+        if info['status'] == 'running' and completed:
+            info['eta_s'] = round(info['elapsed_s'] / completed * (info['total'] - completed), 1)
+        return info
+
+    def list(self):
+        rows = self._conn().execute("SELECT id FROM sweeps ORDER BY created DESC").fetchall()
+        return [self.get(r['id']) for r in rows]
+
+    def results(self, sweep_id, offset=0, limit=100, with_geometry=False, status=None):
+        sql = "SELECT idx, params, status, outputs, geometry, error, duration_ms FROM variants WHERE sweep_id = ?"
+        args = [sweep_id]
+        if status:
+            sql += " AND status = ?"
+            args.append(status)
+        sql += " ORDER BY idx LIMIT ? OFFSET ?"
+        args += [limit, offset]
+        conn = self._conn()
+        page = []
+        for row in conn.execute(sql, args).fetchall():
+            item = {"index": row['idx'], "params": json.loads(row['params']), "status": row['status'],
+                    "outputs": json.loads(row['outputs']) if row['outputs'] else None,
+                    "geometry_id": row['geometry'], "error": row['error'], "duration_ms": row['duration_ms']}
+            if with_geometry and row['geometry']:
+                item['geometry'] = self.geometry(row['geometry'])
+            page.append(item)
+        return page
+
+    def geometry(self, geometry_hash):
+        row = self._conn().execute("SELECT data FROM blobs WHERE hash = ?", (geometry_hash,)).fetchone()
+        return json.loads(zlib.decompress(row['data'])) if row else None
+
+
+# --- EXECUTION ---
+class SweepJob:
+    """Runs the variants of one sweep on `workers` kernels of its own."""
+
+    def __init__(self, store, sweep_id, variants, make_code, start_kernel, run_variant, stop_kernel, workers,
+                 on_finish=None):
+        self.store = store
+        self.sweep_id = sweep_id
+        self.make_code = make_code        # variant values -> kernel code
+        self.start_kernel = start_kernel  # () -> kdata
+        self.run_variant = run_variant    # (kdata, code) -> (status, outputs, geometry, error)
+        self.stop_kernel = stop_kernel    # (kdata) -> None
+        self.on_finish = on_finish
+        self.workers = max(1, min(workers, len(variants)))
+        self.todo = queue.Queue()
+        for item in enumerate(variants):
+            self.todo.put(item)
+        self.remaining = self.workers
+        self.lock = threading.Lock()
+        self.kernels = []
+
+    def start(self):
+        for _ in range(self.workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def interrupt(self):
+        """Stop the variants running right now (after a cancel)."""
+        with self.lock:
+            kernels = list(self.kernels)
+        for kdata in kernels:
+            try:
+                kdata['km'].interrupt_kernel()
+            except Exception as e:
+                print(f"[Sweeps] Could not interrupt a kernel of {self.sweep_id}: {e}")
+
+    def _worker(self):
+        kdata = None
+        try:
+            kdata = self.start_kernel()
+            with self.lock:
+                self.kernels.append(kdata)
+            while not self.store.cancel_requested(self.sweep_id):
+                try:
+                    idx, values = self.todo.get_nowait()
+                except queue.Empty:
+                    break
+                t0 = time.time()
+                try:
+                    status, outputs, geometry, error = self.run_variant(kdata, self.make_code(values))
+                except Exception as e:
+                    status, outputs, geometry, error = 'error', None, None, str(e)
+                if status != 'ok' and self.store.cancel_requested(self.sweep_id):
+                    break # Interrupted by the cancel: leave the variant pending
+                self.store.record(self.sweep_id, idx, status, outputs, geometry, error,
+                                  round((time.time() - t0) * 1000.0, 1))
+        except Exception as e:
+            print(f"[Sweeps] Worker for {self.sweep_id} failed: {e}")
+        finally:
+            with self.lock:
+                if kdata in self.kernels:
+                    self.kernels.remove(kdata)
+            if kdata:
+                self.stop_kernel(kdata)
+            with self.lock:
+                self.remaining -= 1
+                last = self.remaining == 0
+            if last:
+                self._finish()
+
+    def _finish(self):
+        if self.store.cancel_requested(self.sweep_id):
+            self.store.finish(self.sweep_id, 'cancelled')
+        elif not self.todo.empty():
+            self.store.finish(self.sweep_id, 'failed', 'All sweep kernels failed')
+        else:
+            self.store.finish(self.sweep_id, 'finished')
+        print(f"[Sweeps] {self.sweep_id} {self.store.get(self.sweep_id)['status']}")
+        if self.on_finish:
+            self.on_finish()
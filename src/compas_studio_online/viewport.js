@@ -12,6 +12,7 @@ class ViewportManager {
         
         // State
         this.fileObjects = new Map(); // filename -> Array<THREE.Mesh>
+        this.fileIndex = new Map();   // filename -> { bounds, nodes, items, meshByItem } (kernel BVH)
         this.visibleFiles = new Set();
         this.selectedObject = null;
 
@@ -46,6 +47,13 @@ class ViewportManager {
         requestAnimationFrame(this.animate);
 
         window.addEventListener('resize', () => this.onWindowResize());
+
+        // Scratch objects for BVH culling and picking
+        this._frustum = new THREE.Frustum();
+        this._projScreen = new THREE.Matrix4();
+        this._lastView = new THREE.Matrix4();
+        this._box = new THREE.Box3();
+        this._cullDirty = true;
     }
 
     _addLights() {
@@ -179,6 +187,16 @@ class ViewportManager {
            updateCamera();
         }, { passive: false });
         
+        // Double-click on the viewport: fit the camera to what is shown
+        this.container.addEventListener('dblclick', () => this.fitToView());
+
+        // Used by fitToView to move the orbit
+        this.setOrbit = (target, r) => {
+            this.target.copy(target);
+            radius = r;
+            updateCamera();
+        };
+
         // Initial setup
         updateCamera();
     }
@@ -191,7 +209,7 @@ class ViewportManager {
         this.refreshVisibility();
     }
 
-    updateFileGeometry(filename, geometryData) {
+    updateFileGeometry(filename, geometryData, spatial) {
         // Clear Old
         const oldMeshes = this.fileObjects.get(filename) || [];
         oldMeshes.forEach(m => {
@@ -202,19 +220,34 @@ class ViewportManager {
 
         // Add New
         const newMeshes = [];
-        geometryData.forEach(item => {
+        const meshByItem = [];
+        geometryData.forEach((item, i) => {
             if (item.type === 'Mesh') {
                 const mesh = this.createMesh(item.data, item.name);
                 if (mesh) {
                     mesh.userData.filename = filename;
                     mesh.userData.isGlobal = item.isGlobal;
+                    if (item.bbox) {
+                        // Bounds from the kernel: no per-mesh recomputation
+                        const b = item.bbox;
+                        mesh.geometry.boundingBox = new THREE.Box3(new THREE.Vector3(b[0], b[1], b[2]), new THREE.Vector3(b[3], b[4], b[5]));
+                        mesh.geometry.boundingSphere = mesh.geometry.boundingBox.getBoundingSphere(new THREE.Sphere());
+                    }
                     this.scene.add(mesh);
                     newMeshes.push(mesh);
+                    meshByItem[i] = mesh;
                 }
             }
         });
 
         this.fileObjects.set(filename, newMeshes);
+        if (spatial && spatial.bvh) {
+            // The BVH culls these meshes, three.js need not test them one by one
+            newMeshes.forEach(m => { m.frustumCulled = false; });
+            this.fileIndex.set(filename, { bounds: spatial.bounds, nodes: spatial.bvh.nodes, items: spatial.bvh.items, meshByItem });
+        } else {
+            this.fileIndex.delete(filename);
+        }
         this.refreshVisibility();
     }
 
@@ -222,22 +255,155 @@ class ViewportManager {
         this.fileObjects.forEach((meshes, fname) => {
             const isVisible = this.visibleFiles.has(fname);
             meshes.forEach(m => {
-                m.visible = isVisible || !!m.userData.isGlobal;
+                m.userData.shown = isVisible || !!m.userData.isGlobal;
+                m.visible = m.userData.shown && !m.userData.culled;
             });
         });
+        this._cullDirty = true;
     }
 
-    createMesh(data, name) {
-        if (!data.vertices || !data.faces) return null;
+    _nodeBox(n) {
+        this._box.min.set(n[0], n[1], n[2]);
+        this._box.max.set(n[3], n[4], n[5]);
+        return this._box;
+    }
 
-        const geometry = new THREE.BufferGeometry();
-        const vertices = new Float32Array(data.vertices.flat());
-        const indices = [];
+    // Walk a file's BVH: visit(leafMeshes) for leaves whose box passes test(box).
+    // Subtrees that fail go to reject(mesh) without being opened.
+    _walkIndex(index, test, visit, reject) {
+        const stack = [0];
+        while (stack.length) {
+            const n = index.nodes[stack.pop()];
+            const pass = test(this._nodeBox(n));
+            if (n[6] >= 0) {
+                if (pass) stack.push(n[6], n[7]);
+                else if (reject) this._leafMeshes(index, n, true).forEach(reject);
+                continue;
+            }
+            this._leafMeshes(index, n, false).forEach(pass ? visit : (reject || (() => {})));
+        }
+    }
+
+    _leafMeshes(index, n, subtree) {
+        // For an inner node (subtree=true) collect every leaf below it
+        if (!subtree || n[6] < 0) {
+            const start = -1 - n[6];
+            return index.items.slice(start, start + n[7]).map(i => index.meshByItem[i]).filter(Boolean);
+        }
+        return this._leafMeshes(index, index.nodes[n[6]], true).concat(this._leafMeshes(index, index.nodes[n[7]], true));
+    }
+
+    // Hierarchical frustum culling for files with a BVH, only when the view changed
+    _cullFiles() {
+        if (!this.fileIndex.size) return;
+        this.camera.updateMatrixWorld();
+        this._projScreen.multiplyMatrices(this.camera.projectionMatrix, this.camera.matrixWorldInverse);
+        if (!this._cullDirty && this._projScreen.equals(this._lastView)) return;
+        this._lastView.copy(this._projScreen);
+        this._cullDirty = false;
+        this._frustum.setFromProjectionMatrix(this._projScreen);
+
+        const show = (m) => { m.userData.culled = false; m.visible = !!m.userData.shown; };
+        const hide = (m) => { m.userData.culled = true; m.visible = false; };
+        this.fileIndex.forEach((index) => {
+            this._walkIndex(index, (box) => this._frustum.intersectsBox(box), (m) => {
+                if (this._frustum.intersectsBox(m.geometry.boundingBox)) show(m); else hide(m);
+            }, hide);
+        });
+    }
 
-        data.faces.forEach(f => {
-            if (f.length === 3) indices.push(f[0], f[1], f[2]);
-            else if (f.length === 4) indices.push(f[0], f[1], f[2], f[0], f[2], f[3]);
+    // Move the camera so the visible geometry fills the view
+    fitToView() {
+        const bounds = new THREE.Box3();
+        this.fileObjects.forEach((meshes, fname) => {
+            const index = this.fileIndex.get(fname);
+            const shown = meshes.filter(m => m.userData.shown);
+            if (!shown.length) return;
+            if (index && index.bounds && shown.length === meshes.length) {
+                const b = index.bounds;
+                bounds.expandByPoint(new THREE.Vector3(b[0], b[1], b[2])).expandByPoint(new THREE.Vector3(b[3], b[4], b[5]));
+            } else {
+                shown.forEach(m => {
+                    if (!m.geometry.boundingBox) m.geometry.computeBoundingBox();
+                    bounds.union(m.geometry.boundingBox);
+                });
+            }
         });
+        if (bounds.isEmpty()) return;
+
+        const sphere = bounds.getBoundingSphere(new THREE.Sphere());
+        const r = Math.max(sphere.radius, 0.1) / Math.sin(THREE.MathUtils.degToRad(this.camera.fov) / 2) * 1.1;
+        if (r * 3 > this.camera.far) {
+            this.camera.far = r * 3;
+            this.camera.updateProjectionMatrix();
+        }
+        this.setOrbit(sphere.center, r);
+    }
+
+    // Quantized meshes (see kernel_utils.py): uint16 positions within [min, max],
+    // faces as varint(size) + zigzag varint index deltas. Returns flat arrays.
+    decodeMesh(data) {
+        const bytes = (b64) => {
+            const bin = atob(b64);
+            const out = new Uint8Array(bin.length);
+            for (let i = 0; i < bin.length; i++) out[i] = bin.charCodeAt(i);
+            return out;
+        };
+
+        const count = data.count * 3;
+        const q = new Uint16Array(bytes(data.positions).buffer, 0, count); // little-endian, as sent
+        const steps = (1 << data.bits) - 1;
+        const scale = [0, 1, 2].map(i => (data.max[i] - data.min[i]) / steps);
+        const vertices = new Float32Array(count);
+        for (let i = 0; i < count; i++) {
+            const axis = i % 3;
+            vertices[i] = data.min[axis] + q[i] * scale[axis];
+        }
+
+        const stream = bytes(data.faces);
+        let pos = 0;
+        const varint = () => {
+            let n = 0, shift = 0, b;
+            do {
+                b = stream[pos++];
+                n += (b & 0x7f) * Math.pow(2, shift);
+                shift += 7;
+            } while (b & 0x80);
+            return n;
+        };
+        const indices = [];
+        const face = [];
+        let prev = 0;
+        while (pos < stream.length) {
+            const size = varint();
+            face.length = 0;
+            for (let k = 0; k < size; k++) {
+                const z = varint();
+                prev += (z % 2) ? -(z + 1) / 2 : z / 2;
+                face.push(prev);
+            }
+            this._triangulate(face, indices);
+        }
+        return { vertices, indices };
+    }
+
+    _triangulate(f, indices) {
+        if (f.length === 3) indices.push(f[0], f[1], f[2]);
+        else if (f.length === 4) indices.push(f[0], f[1], f[2], f[0], f[2], f[3]);
+    }
+
+    createMesh(data, name) {
+        let vertices;
+        let indices = [];
+        if (data.encoding === 'quantized') {
+            ({ vertices, indices } = this.decodeMesh(data));
+        } else {
+            if (!data.vertices || !data.faces) return null;
+            vertices = new Float32Array(data.vertices.flat());
+            data.faces.forEach(f => this._triangulate(f, indices));
+        }
+
+        const geometry = new THREE.BufferGeometry();
 
         geometry.setAttribute('position', new THREE.BufferAttribute(vertices, 3));
         if (indices.length) geometry.setIndex(indices);
@@ -322,10 +488,17 @@ class ViewportManager {
 
         this.raycaster.setFromCamera(this.mouse, this.camera);
         
-        // Collect all visible meshes
+        // Candidate meshes: BVH-indexed files only offer leaves the ray passes through
+        const ray = this.raycaster.ray;
         const allMeshes = [];
-        this.scene.traverse(o => {
-            if (o.isMesh && o.visible && o.userData.variableName) allMeshes.push(o);
+        this.fileIndex.forEach((index) => {
+            this._walkIndex(index, (box) => ray.intersectsBox(box), (m) => {
+                if (m.visible && ray.intersectsBox(m.geometry.boundingBox)) allMeshes.push(m);
+            });
+        });
+        this.fileObjects.forEach((meshes, fname) => {
+            if (this.fileIndex.has(fname)) return;
+            meshes.forEach(m => { if (m.visible && m.userData.variableName) allMeshes.push(m); });
         });
 
         const intersects = this.raycaster.intersectObjects(allMeshes);
@@ -356,6 +529,7 @@ class ViewportManager {
 
     animate() {
         requestAnimationFrame(this.animate);
+        this._cullFiles();
         this.renderer.render(this.scene, this.camera);
     }
 
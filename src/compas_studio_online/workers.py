@@ -0,0 +1,114 @@
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+# --- MULTI-PROCESS SERVING ---
+# Runs several server processes on one machine behind one port:
+#
+#   python -m compas_studio_online.workers --workers 4
+#
+# - The parent binds the public port once; every worker accepts on the
+#   inherited socket, so the OS spreads connections between them.
+# - State shared between workers goes through a SQLite STATE_STORE.
+# - Each project's kernels live in one worker (affinity in the store); other
+#   workers forward /execute there over the worker's internal port.
+# - Socket.IO room broadcasts go through a local zmq message queue broker.
+#   Clients must use the websocket transport (no sticky sessions here).
+
+HEARTBEAT_INTERVAL = 5 # seconds
+
+
+def run_worker(worker_id, fd, internal_port, host):
+    from werkzeug.serving import make_server
+    from . import server
+
+    address = f"127.0.0.1:{internal_port}"
+    server.STORE.register_worker(worker_id, address)
+
+    def heartbeat():
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                server.STORE.heartbeat(worker_id)
+            except Exception as e:
+                print(f"[Workers] Heartbeat failed for {worker_id}: {e}")
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    server.start_background_services()
+
+    # Internal port: forwarded executions from the other workers
+    internal = make_server('127.0.0.1', internal_port, server.app, threaded=True)
+    threading.Thread(target=internal.serve_forever, daemon=True).start()
+
+    print(f"[Workers] Worker {worker_id} (pid {os.getpid()}) serving, internal {address}")
+    public = make_server(host, 0, server.app, threaded=True, fd=fd)
+    public.serve_forever()
+
+
+def start_workers(count, host='0.0.0.0', port=5001):
+    from .message_queue import run_broker
+
+    projects_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'projects')
+    env = dict(os.environ)
+    env.setdefault('STATE_STORE', 'sqlite:///' + os.path.join(projects_dir, '.state.sqlite'))
+    env.setdefault('SOCKETIO_MESSAGE_QUEUE', f"zmq+tcp://127.0.0.1:{port + 100}+{port + 101}")
+
+    if env['SOCKETIO_MESSAGE_QUEUE'].startswith('zmq+'):
+        threading.Thread(target=run_broker, args=(env['SOCKETIO_MESSAGE_QUEUE'],), daemon=True).start()
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(128)
+    listener.set_inheritable(True)
+    fd = listener.fileno()
+
+    procs = []
+    for i in range(count):
+        worker_env = dict(env, WORKER_ID=f"w{i}")
+        cmd = [
+            sys.executable, '-m', 'compas_studio_online.workers',
+            '--worker', str(i), '--fd', str(fd), '--internal-port', str(port + 1 + i), '--host', host,
+        ]
+        procs.append(subprocess.Popen(cmd, env=worker_env, pass_fds=(fd,)))
+
+    print(f"[Workers] {count} workers on {host}:{port} (store {env['STATE_STORE']})")
+    try:
+        while True:
+            for i, proc in enumerate(procs):
+                if proc.poll() is not None:
+                    print(f"[Workers] Worker w{i} exited with {proc.returncode}")
+                    return
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run compas-studio-online as several worker processes.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5001)))
+    # Used by the parent when spawning a worker
+    parser.add_argument('--worker', type=int)
+    parser.add_argument('--fd', type=int)
+    parser.add_argument('--internal-port', type=int)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        run_worker(f"w{args.worker}", args.fd, args.internal_port, args.host)
+    else:
+        start_workers(args.workers, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import gzip
+
+import pytest
+
+from compas_studio_online import assets
+
+
+@pytest.fixture
+def served(tmp_path, monkeypatch):
+    """Assets built from small sources in tmp_path and loaded, as at server startup."""
+    monkeypatch.setattr(assets, '_SERVED', {})
+    monkeypatch.setattr(assets, '_MTIMES', None)
+    source_dir = tmp_path / 'src'
+    source_dir.mkdir()
+    for name in assets.ASSETS:
+        if name in assets.PAGES:
+            text = '<script src="/editor.js"></script><script src="app.js"></script>' + '<p>studio</p>' * 100
+        else:
+            text = f"// {name}\n" + "console.log('studio');\n" * 100
+        (source_dir / name).write_text(text)
+    return assets.load(str(source_dir), str(tmp_path / 'build'))
+
+
+def test_accepted():
+    assert assets._accepted('gzip, deflate, br') == {'gzip', 'deflate', 'br'}
+    assert assets._accepted('br;q=0, GZIP;q=0.5') == {'gzip'}
+    assert assets._accepted('gzip;q=bad, *') == {'*'}
+    assert not assets._accepted(None) & {'gzip', 'br', '*'}
+
+
+def test_pages_reference_hashed_scripts(served):
+    status, headers, body = assets.serve('editor.html')
+    assert status == 200
+    assert headers['Cache-Control'] == assets.REVALIDATE
+    editor_js = served['files']['editor.js']['file']
+    assert f'src="/{editor_js}"'.encode() in body
+    assert f'src="/{served["files"]["app.js"]["file"]}"'.encode() in body
+    # Hashed names are immutable; plain names revalidate
+    assert assets.serve(editor_js)[1]['Cache-Control'] == assets.IMMUTABLE
+    assert assets.serve('editor.js')[1]['Cache-Control'] == assets.REVALIDATE
+    assert assets.serve('server.py') is None
+
+
+def test_encoding_negotiation(served):
+    status, headers, body = assets.serve('app.js', accept_encoding='gzip, deflate')
+    assert headers['Content-Encoding'] == 'gzip'
+    assert headers['Vary'] == 'Accept-Encoding'
+    plain = assets.serve('app.js')[2]
+    assert gzip.decompress(body) == plain
+    assert headers['Content-Length'] == str(len(body))
+
+    status, headers, body = assets.serve('app.js', accept_encoding='gzip;q=0')
+    assert 'Content-Encoding' not in headers and body == plain
+
+
+def test_etag_revalidation(served):
+    etag = served['files']['viewport.js']['etag']
+    _, plain_headers, _ = assets.serve('viewport.js')
+    _, gzip_headers, _ = assets.serve('viewport.js', accept_encoding='gzip')
+    assert plain_headers['ETag'] == f'"{etag}"'
+    assert gzip_headers['ETag'] == f'"{etag}-gzip"'
+
+    # Any encoding's tag of the same content matches, weak or strong, in a list
+    for tag in (f'"{etag}"', f'W/"{etag}-gzip"', f'"other", "{etag}-br"', '*'):
+        status, headers, body = assets.serve('viewport.js', accept_encoding='gzip', if_none_match=tag)
+        assert (status, body) == (304, b'')
+        assert headers['ETag'] == f'"{etag}-gzip"'
+    assert assets.serve('viewport.js', if_none_match='"stale"')[0] == 200
@@ -0,0 +1,83 @@
+import json
+
+from compas_studio_online.catalog import KEY_RANGE, ProjectCatalog
+
+
+def make_project(projects_dir, key, name, created):
+    path = projects_dir / key
+    path.mkdir()
+    (path / 'project.json').write_text(json.dumps({"name": name, "created": created}))
+
+
+def test_rebuild_indexes_existing_projects(tmp_path):
+    make_project(tmp_path, '10001', 'Bridge', 100.0)
+    make_project(tmp_path, '10002', 'Tower', 200.0)
+    (tmp_path / '10003').mkdir() # No project.json: named after its directory
+
+    catalog = ProjectCatalog(str(tmp_path))
+    total, rows = catalog.list(sort='key', descending=False)
+    assert total == 3
+    assert [(r['key'], r['name']) for r in rows] == [('10001', 'Bridge'), ('10002', 'Tower'), ('10003', '10003')]
+    assert catalog.free_keys() == len(KEY_RANGE) - 3
+
+
+def test_allocate_and_release(tmp_path):
+    make_project(tmp_path, '10001', 'Bridge', 100.0)
+    catalog = ProjectCatalog(str(tmp_path))
+    free = catalog.free_keys()
+
+    keys = {catalog.allocate_key() for _ in range(50)}
+    assert len(keys) == 50
+    assert '10001' not in keys
+    assert all(k.isdigit() and int(k) in KEY_RANGE for k in keys)
+    assert catalog.free_keys() == free - 50
+
+    key = keys.pop()
+    catalog.release_key(key)
+    assert catalog.free_keys() == free - 49
+
+
+def test_allocate_skips_directories_made_behind_its_back(tmp_path):
+    catalog = ProjectCatalog(str(tmp_path))
+    with catalog._conn() as conn:
+        first = conn.execute("SELECT key FROM free_keys ORDER BY slot LIMIT 1").fetchone()['key']
+    (tmp_path / first).mkdir()
+    assert catalog.allocate_key() not in (None, first)
+
+
+def test_add_rename_remove(tmp_path):
+    catalog = ProjectCatalog(str(tmp_path))
+    key = catalog.allocate_key()
+    catalog.add(key, 'Shell', 50.0)
+    catalog.rename(key, 'Gridshell')
+    assert catalog.list() == (1, [{"key": key, "name": 'Gridshell', "created": 50.0}])
+
+    free = catalog.free_keys()
+    catalog.remove(key)
+    assert catalog.list() == (0, [])
+    assert catalog.free_keys() == free + 1
+
+
+def test_list_sorts_pages_and_searches(tmp_path):
+    catalog = ProjectCatalog(str(tmp_path))
+    for i, name in enumerate(['beta', 'Alpha', 'gamma', '50%_off', 'delta']):
+        catalog.add(str(20000 + i), name, float(i))
+
+    total, rows = catalog.list(offset=1, limit=2)
+    assert total == 5
+    assert [r['name'] for r in rows] == ['50%_off', 'gamma'] # Newest first by default
+
+    _, rows = catalog.list(sort='name', descending=False)
+    assert [r['name'] for r in rows] == ['50%_off', 'Alpha', 'beta', 'delta', 'gamma']
+
+    assert catalog.list(query='ALPHA')[0] == 1
+    assert [r['name'] for r in catalog.list(query='%_')[1]] == ['50%_off'] # LIKE wildcards are literal
+    assert [r['key'] for r in catalog.list(query='20002')[1]] == ['20002']
+
+
+def test_catalog_persists(tmp_path):
+    catalog = ProjectCatalog(str(tmp_path))
+    key = catalog.allocate_key()
+    catalog.add(key, 'Saved', 1.0)
+    # Reopened: no rebuild, so the project (which has no directory) is still listed
+    assert ProjectCatalog(str(tmp_path)).list()[0] == 1
@@ -0,0 +1,49 @@
+from compas_studio_online.dependencies import build_graph, critical_path, global_names
+
+
+def test_global_names():
+    produced, consumed = global_names("glb_a = glb_b + 1\nprint(glb_a, glb_c)")
+    assert produced == {'glb_a'}
+    assert consumed == {'glb_b', 'glb_c'}
+    # Unparseable files count every mention as a read
+    assert global_names("glb_x = (") == (set(), {'glb_x'})
+
+
+def test_graph_follows_globals():
+    graph = build_graph([
+        ('imports.py', "import math"),
+        ('a.py', "glb_a = 1"),
+        ('b.py', "glb_b = glb_a * 2"),
+        ('c.py', "print(glb_b)"),
+        ('d.py', "print('alone')"),
+    ])
+    assert graph == {
+        'imports.py': set(),
+        'a.py': {'imports.py'},
+        'b.py': {'imports.py', 'a.py'},
+        'c.py': {'imports.py', 'b.py'},
+        'd.py': {'imports.py'},
+    }
+
+
+def test_cycles_are_broken_inside_their_component_only():
+    graph = build_graph([
+        ('late.py', "print(glb_x)"),  # Reads the cycle, listed before it
+        ('x.py', "glb_x = glb_z"),
+        ('y.py', "glb_y = glb_x"),
+        ('z.py', "glb_z = glb_y"),
+    ])
+    # x -> z -> y -> x: only the back edge x -> z (to a later file) is dropped
+    assert graph['x.py'] == set()
+    assert graph['y.py'] == {'x.py'}
+    assert graph['z.py'] == {'y.py'}
+    # A file depending on the cycle keeps its edge, even to a later file
+    assert graph['late.py'] == {'x.py'}
+
+
+def test_critical_path():
+    graph = {'a.py': set(), 'b.py': {'a.py'}, 'c.py': {'a.py'}, 'd.py': {'b.py', 'c.py'}}
+    path, total = critical_path(graph, {'a.py': 1.0, 'b.py': 5.0, 'c.py': 2.0, 'd.py': 1.0})
+    assert path == ['a.py', 'b.py', 'd.py']
+    assert total == 7.0
+    assert critical_path(graph, {}) == ([], 0.0)
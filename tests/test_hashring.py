@@ -0,0 +1,48 @@
+from compas_studio_online.hashring import HashRing
+
+HOSTS = [f"10.0.0.{i}:6001" for i in range(1, 5)]
+KEYS = [str(k) for k in range(10000, 20000)]
+
+
+def placement(ring):
+    return {key: ring.get(key) for key in KEYS}
+
+
+def test_empty_ring():
+    assert HashRing().get('12345') is None
+
+
+def test_placement_is_stable_and_spread():
+    before = placement(HashRing(HOSTS))
+    assert placement(HashRing(reversed(HOSTS))) == before # Independent of the order hosts were added
+    for host in HOSTS:
+        share = sum(1 for owner in before.values() if owner == host) / len(KEYS)
+        assert 0.1 < share < 0.4
+
+
+def test_adding_a_host_only_moves_keys_to_it():
+    ring = HashRing(HOSTS)
+    before = placement(ring)
+    ring.add('10.0.0.5:6001')
+    after = placement(ring)
+
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == '10.0.0.5:6001' for key in moved)
+    # About 1/5 of the keys, not a reshuffle
+    assert 0.1 < len(moved) / len(KEYS) < 0.35
+
+
+def test_removing_a_host_only_moves_its_keys():
+    ring = HashRing(HOSTS)
+    before = placement(ring)
+    ring.remove(HOSTS[0])
+    after = placement(ring)
+
+    for key in KEYS:
+        if before[key] == HOSTS[0]:
+            assert after[key] in HOSTS[1:]
+        else:
+            assert after[key] == before[key]
+
+    ring.add(HOSTS[0])
+    assert placement(ring) == before
@@ -0,0 +1,100 @@
+import os
+import queue
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+pytest.importorskip('jupyter_client')
+
+from compas_studio_online.hashring import HashRing
+from compas_studio_online.kernel_host import RemoteKernelManager, rpc
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def kernel_hosts():
+    """Two kernel host daemons on localhost, as 'host:port' addresses."""
+    env = dict(os.environ, PYTHONPATH=SRC_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    hosts, procs = [], []
+    for _ in range(2):
+        port = _free_port()
+        procs.append(subprocess.Popen([sys.executable, '-m', 'compas_studio_online.kernel_host', '--port', str(port)],
+                                      env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        hosts.append(f"127.0.0.1:{port}")
+    try:
+        for address in hosts:
+            deadline = time.time() + 30
+            while True:
+                try:
+                    rpc(address, {"op": "ping"}, timeout=1)
+                    break
+                except OSError:
+                    assert time.time() < deadline, f"Kernel host {address} did not start"
+                    time.sleep(0.2)
+        yield hosts
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait(30)
+
+
+def _run(km, code, timeout=60):
+    """(stdout, errors) of one run, read the way server.collect_kernel_output does."""
+    kc = km.client()
+    msg_id = kc.execute(code)
+    out, errors = [], []
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            msg = kc.get_iopub_msg(timeout=0.5)
+        except queue.Empty:
+            continue
+        if msg['parent_header'].get('msg_id') != msg_id:
+            continue
+        msg_type = msg['header']['msg_type']
+        if msg_type == 'stream':
+            out.append(msg['content']['text'])
+        elif msg_type == 'error':
+            errors.append('\n'.join(msg['content']['traceback']))
+        elif msg_type == 'status' and msg['content']['execution_state'] == 'idle':
+            return ''.join(out), errors
+    raise AssertionError("The run did not finish")
+
+
+def test_execute_on_two_hosts(kernel_hosts):
+    ring = HashRing(kernel_hosts)
+    # One project placed on each host
+    projects = {}
+    for project_id in (str(k) for k in range(10000, 10100)):
+        projects.setdefault(ring.get(project_id), project_id)
+    assert set(projects) == set(kernel_hosts)
+
+    managers = []
+    try:
+        for host, project_id in projects.items():
+            km = RemoteKernelManager(host, f"{project_id}/main.py")
+            km.start_kernel()
+            managers.append(km)
+            assert km.is_alive()
+            out, errors = _run(km, f"import os\nprint('{project_id}', os.getpid())")
+            assert not errors
+            assert out.split()[0] == project_id
+            assert rpc(host, {"op": "list"})['keys'] == [f"{project_id}/main.py"]
+
+        # Each host runs its own kernel process
+        pids = {_run(km, "import os\nprint(os.getpid())")[0] for km in managers}
+        assert len(pids) == 2
+    finally:
+        for km in managers:
+            km.shutdown_kernel()
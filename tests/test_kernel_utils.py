@@ -0,0 +1,128 @@
+import base64
+import json
+import os
+import random
+import struct
+
+import compas_studio_online
+
+KERNEL_UTILS = os.path.join(os.path.dirname(compas_studio_online.__file__), 'kernel_utils.py')
+
+
+class FakeMesh:
+    """Anything with to_vertices_and_faces() is drawn as a mesh."""
+
+    def __init__(self, vertices, faces):
+        self.vertices = vertices
+        self.faces = faces
+
+    def to_vertices_and_faces(self):
+        return self.vertices, self.faces
+
+
+def introspect(capsys, **user_globals):
+    """Run kernel_utils.py over the given globals, as the kernel does; {block: parsed JSON}."""
+    with open(KERNEL_UTILS) as f:
+        source = f.read()
+    exec(compile(source, KERNEL_UTILS, 'exec'), dict(user_globals))
+    lines = capsys.readouterr().out.splitlines()
+    blocks = {}
+    for block in ('VP_DATA', 'VP_INDEX', 'GLOBALS'):
+        start = lines.index(f"<<<{block}_START>>>")
+        blocks[block] = json.loads(lines[start + 1])
+    return blocks
+
+
+def decode_positions(data):
+    raw = base64.b64decode(data['positions'])
+    steps = (1 << data['bits']) - 1
+    q = struct.unpack(f"<{len(raw) // 2}H", raw)
+    return [[lo + (hi - lo) * q[i * 3 + k] / steps for k, (lo, hi) in enumerate(zip(data['min'], data['max']))]
+            for i in range(data['count'])]
+
+
+def decode_faces(data):
+    stream = base64.b64decode(data['faces'])
+    pos = 0
+
+    def varint():
+        nonlocal pos
+        n = shift = 0
+        while True:
+            byte = stream[pos]
+            pos += 1
+            n |= (byte & 0x7f) << shift
+            shift += 7
+            if byte < 0x80:
+                return n
+
+    faces, prev = [], 0
+    while pos < len(stream):
+        face = []
+        for _ in range(varint()):
+            z = varint()
+            prev += z // 2 if z % 2 == 0 else -(z + 1) // 2
+            face.append(prev)
+        faces.append(face)
+    return faces
+
+
+def test_quantized_mesh_round_trip(capsys):
+    rng = random.Random(1)
+    vertices = [[rng.uniform(-50, 50), rng.uniform(0, 2), rng.uniform(10, 11)] for _ in range(200)]
+    faces = [[rng.randrange(200) for _ in range(rng.choice((3, 4)))] for _ in range(300)]
+
+    blocks = introspect(capsys, mesh=FakeMesh(vertices, faces), _vp_mesh_encoding={'bits': 16})
+    item, = blocks['VP_DATA']
+    data = item['data']
+    assert data['encoding'] == 'quantized'
+    assert item['bbox'] == data['min'] + data['max']
+
+    assert decode_faces(data) == faces
+    for original, decoded in zip(vertices, decode_positions(data)):
+        for k in range(3):
+            step = (data['max'][k] - data['min'][k]) / ((1 << 16) - 1)
+            assert abs(original[k] - decoded[k]) <= step / 2 + 1e-9
+
+
+def test_plain_mesh_without_encoding(capsys):
+    vertices = [[0, 0, 0], [1, 0, 0], [0, 1, 0]]
+    blocks = introspect(capsys, mesh=FakeMesh(vertices, [[0, 1, 2]]))
+    item, = blocks['VP_DATA']
+    assert item['data'] == {'vertices': vertices, 'faces': [[0, 1, 2]]}
+    assert item['bbox'] == [0, 0, 0, 1, 1, 0]
+
+
+def test_spatial_index(capsys):
+    rng = random.Random(2)
+    meshes = {}
+    for i in range(40):
+        x, y = rng.uniform(-100, 100), rng.uniform(-100, 100)
+        meshes[f"m{i}"] = FakeMesh([[x, y, 0], [x + 1, y, 0], [x, y + 1, 2]], [[0, 1, 2]])
+
+    blocks = introspect(capsys, **meshes, _vp_mesh_encoding={'bits': 12})
+    items, index = blocks['VP_DATA'], blocks['VP_INDEX']
+    nodes = index['bvh']['nodes']
+    assert sorted(index['bvh']['items']) == list(range(len(items)))
+    assert index['bounds'] == nodes[0][:6]
+
+    def contains(outer, inner):
+        return all(outer[k] <= inner[k] for k in range(3)) and all(outer[k] >= inner[k] for k in range(3, 6))
+
+    # Every node encloses its children, every leaf its items, and each item is in exactly one leaf
+    seen = []
+    stack = [0]
+    while stack:
+        node = nodes[stack.pop()]
+        if node[6] < 0:
+            leaf_items = index['bvh']['items'][-1 - node[6]:-1 - node[6] + node[7]]
+            assert all(contains(node, items[i]['bbox']) for i in leaf_items)
+            seen.extend(leaf_items)
+        else:
+            assert all(contains(node, nodes[child]) for child in node[6:8])
+            stack.extend(node[6:8])
+    assert sorted(seen) == list(range(len(items)))
+
+
+def test_spatial_index_without_geometry(capsys):
+    assert introspect(capsys, value=3)['VP_INDEX'] == {}
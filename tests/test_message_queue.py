@@ -0,0 +1,49 @@
+import queue
+import socket
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('zmq')
+
+from compas_studio_online.message_queue import LocalQueueManager, parse_url, run_broker, socketio_options
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_parse_url():
+    assert parse_url('zmq+tcp://127.0.0.1:5555+5556') == ('tcp://127.0.0.1:5555', 'tcp://127.0.0.1:5556')
+    with pytest.raises(ValueError):
+        parse_url('zmq+tcp://127.0.0.1:5555')
+
+
+def test_socketio_options():
+    assert socketio_options(None) == {}
+    assert socketio_options('redis://localhost:6379') == {'message_queue': 'redis://localhost:6379'}
+
+
+def test_forwards_between_workers():
+    url = f"zmq+tcp://127.0.0.1:{_free_port()}+{_free_port()}"
+    threading.Thread(target=run_broker, args=(url,), daemon=True).start()
+
+    # Two workers, as in workers.py: each publishes to the broker and listens to it
+    first = LocalQueueManager(url)
+    second = LocalQueueManager(url)
+    received = queue.Queue()
+    threading.Thread(target=lambda: [received.put(m) for m in second._listen()], daemon=True).start()
+
+    # A subscriber misses what is published before it has connected; retry until it arrives
+    message = {'method': 'emit', 'event': 'execution_result', 'data': {'project': '12345'}, 'room': '12345'}
+    deadline = time.time() + 10
+    while True:
+        first._publish(message)
+        try:
+            assert received.get(timeout=0.2) == message
+            break
+        except queue.Empty:
+            assert time.time() < deadline, "The broker did not forward the message"
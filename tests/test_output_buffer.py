@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from compas_studio_online import output_buffer
+from compas_studio_online.output_buffer import OutputBuffer, read_log
+
+STREAM = ("hello <<<not a tag\n"
+          "<<<VP_DATA_START>>>\n" + json.dumps([{"name": "m", "data": {"faces": [[0, 1, 2]]}}]) + "\n<<<VP_DATA_END>>>\n"
+          "<<<GLOBALS_START>>>\n{\"glb_a\": \"QQ==\"}\n<<<GLOBALS_END>>>\n"
+          "bye <<\n")
+
+
+def feed(chunks):
+    buf = OutputBuffer()
+    for chunk in chunks:
+        buf.write(chunk)
+    buf.close()
+    return buf
+
+
+def test_markers_split_off():
+    buf = feed([STREAM])
+    assert buf.text() == "hello <<<not a tag\nbye <<\n"
+    assert buf.blocks == {"VP_DATA": [{"name": "m", "data": {"faces": [[0, 1, 2]]}}], "GLOBALS": {"glb_a": "QQ=="}}
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 19])
+def test_markers_split_across_chunks(size):
+    # Tags and blocks cut at every position give the same result as one write
+    whole = feed([STREAM])
+    buf = feed([STREAM[i:i + size] for i in range(0, len(STREAM), size)])
+    assert buf.text() == whole.text()
+    assert buf.blocks == whole.blocks
+
+
+def test_unterminated_block_is_user_output():
+    buf = feed(["a<<<PROFILE_START>>>{", "\"x\": 1"])
+    assert buf.blocks == {}
+    assert buf.text() == "a<<<PROFILE_START>>>{\"x\": 1"
+
+
+def test_malformed_block():
+    buf = feed(["<<<SWEEP_START>>>\nnot json\n<<<SWEEP_END>>>\nok"])
+    assert buf.blocks == {"SWEEP": None}
+    assert buf.text() == "ok"
+
+
+def test_spill_to_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(output_buffer, 'SPILL_DIR', str(tmp_path))
+    monkeypatch.setattr(output_buffer, 'MEMORY_LIMIT', 1000)
+    monkeypatch.setattr(output_buffer, 'HEAD_CHARS', 10)
+    monkeypatch.setattr(output_buffer, 'TAIL_CHARS', 10)
+
+    lines = [f"line {i:04d}\n" for i in range(500)]
+    buf = feed(lines + ["<<<GLOBALS_START>>>{}<<<GLOBALS_END>>>"])
+    assert buf.blocks == {"GLOBALS": {}}
+    assert buf.parts == [] # Nothing kept in memory but head and tail
+
+    text = buf.text()
+    assert text.startswith("line 0000\n")
+    assert text.endswith("line 0499\n")
+    assert f"/output/{buf.log_id}" in text
+    assert buf.info()['chars'] == len(''.join(lines))
+
+    data, total = read_log(buf.log_id)
+    assert data.decode('utf-8') == ''.join(lines)
+    assert read_log(buf.log_id, offset=total - 10) == (b"line 0499\n", total)
+    assert read_log('../../etc/passwd') is None
@@ -0,0 +1,70 @@
+import threading
+
+from compas_studio_online.scheduler import BACKGROUND, INTERACTIVE, ExecutionScheduler
+
+
+class Runs:
+    """run_fn for the scheduler: records each run; runs on 'block.py' wait until released."""
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, project_id, filename, code, priority=INTERACTIVE):
+        self.calls.append((project_id, filename, code, priority))
+        if filename == 'block.py':
+            self.started.set()
+            self.release.wait(10)
+        return {"output": code}
+
+
+def test_pending_runs_coalesce_latest_wins():
+    runs = Runs()
+    scheduler = ExecutionScheduler(runs, max_workers=1)
+    busy = scheduler.submit('p1', 'block.py', 'hold')
+    assert runs.started.wait(10)
+
+    # The only worker is busy: three edits to a.py become one run of the newest code
+    tickets = [scheduler.submit('p1', 'a.py', f"v{i}") for i in range(3)]
+    assert tickets[0] is tickets[1] is tickets[2]
+    assert tickets[0].callers == 3
+    assert scheduler.queue_depth('p1') == 1
+
+    runs.release.set()
+    assert busy.wait(10) == {"output": "hold"}
+    assert tickets[0].wait(10) == {"output": "v2"}
+    assert [c[2] for c in runs.calls] == ['hold', 'v2']
+    assert scheduler.stats()['projects']['p1']['coalesced'] == 2
+
+
+def test_each_caller_gets_its_own_copy():
+    runs = Runs()
+    scheduler = ExecutionScheduler(runs, max_workers=1)
+    scheduler.submit('p1', 'block.py', 'hold')
+    assert runs.started.wait(10)
+
+    results = []
+    callers = [threading.Thread(target=lambda: results.append(scheduler.run('p1', 'a.py', 'x'))) for _ in range(2)]
+    for t in callers:
+        t.start()
+    runs.release.set()
+    for t in callers:
+        t.join(10)
+
+    assert len(results) == 2 and results[0] is not results[1]
+    assert all(r['output'] == 'x' and r['queue']['callers'] == 2 for r in results)
+
+
+def test_interactive_runs_go_first():
+    runs = Runs()
+    scheduler = ExecutionScheduler(runs, max_workers=1)
+    scheduler.submit('p1', 'block.py', 'hold')
+    assert runs.started.wait(10)
+
+    background = scheduler.submit('p1', 'slow.py', 'batch', priority=BACKGROUND)
+    interactive = scheduler.submit('p2', 'edit.py', 'live')
+    runs.release.set()
+    background.wait(10)
+    interactive.wait(10)
+    assert [c[2] for c in runs.calls] == ['hold', 'live', 'batch']
@@ -0,0 +1,116 @@
+import multiprocessing
+import time
+
+import pytest
+
+from compas_studio_online.store import LocalStore, SQLiteStore, create_store
+
+
+@pytest.fixture(params=['local', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'local':
+        return LocalStore()
+    return SQLiteStore(str(tmp_path / 'state.sqlite'))
+
+
+def test_create_store(tmp_path):
+    assert isinstance(create_store(None), LocalStore)
+    assert isinstance(create_store('memory://'), LocalStore)
+    assert isinstance(create_store(f"sqlite:///{tmp_path / 'state.sqlite'}"), SQLiteStore)
+    with pytest.raises(ValueError):
+        create_store('redis://localhost')
+
+
+def test_load_and_drop_project(store):
+    assert not store.is_loaded('p1')
+    store.load_project('p1', {'glb_a': 'QQ=='}, {'a.py': ['glb_a']})
+    assert store.is_loaded('p1')
+    assert store.get_globals('p1') == {'glb_a': 'QQ=='}
+    assert store.get_exports('p1') == {'a.py': ['glb_a']}
+
+    store.touch('p1', 100.0)
+    assert store.activity() == {'p1': 100.0}
+    store.drop_project('p1')
+    assert not store.is_loaded('p1')
+    assert store.get_globals('p1') == {}
+    assert store.activity() == {}
+
+
+def test_file_exports(store):
+    store.load_project('p1')
+    store.set_file_exports('p1', 'a.py', {'glb_a': '1', 'glb_b': '2'})
+    store.set_file_exports('p1', 'b.py', {'glb_c': '3'})
+    assert store.get_globals('p1') == {'glb_a': '1', 'glb_b': '2', 'glb_c': '3'}
+
+    # A new run of a.py first removes what its last run exported, and can put it back
+    removed = store.clear_file_exports('p1', 'a.py')
+    assert removed == {'glb_a': '1', 'glb_b': '2'}
+    assert store.get_globals('p1') == {'glb_c': '3'}
+    assert store.get_exports('p1')['a.py'] == []
+    store.set_file_exports('p1', 'a.py', removed)
+    assert store.get_globals('p1') == {'glb_a': '1', 'glb_b': '2', 'glb_c': '3'}
+
+    store.reset()
+    assert not store.is_loaded('p1')
+    assert store.get_globals('p1') == {}
+
+
+def test_claim_project(store):
+    store.register_worker('w0', '127.0.0.1:6000')
+    store.register_worker('w1', '127.0.0.1:6001')
+    assert store.claim_project('p1', 'w0') == ('w0', '127.0.0.1:6000')
+    # Live owner: others are sent to it
+    assert store.claim_project('p1', 'w1') == ('w0', '127.0.0.1:6000')
+    assert store.owned_projects('w0') == ['p1']
+
+    # Stale owner: the next claimant takes over
+    time.sleep(0.05)
+    store.heartbeat('w1')
+    assert store.claim_project('p1', 'w1', stale_after=0.01) == ('w1', '127.0.0.1:6001')
+    store.release_project('p1', 'w1')
+    assert store.owned_projects('w1') == []
+
+
+def _write_exports(path, worker, rounds):
+    store = SQLiteStore(path)
+    store.register_worker(worker, f"127.0.0.1/{worker}")
+    for i in range(rounds):
+        filename = f"{worker}.py"
+        store.clear_file_exports('shared', filename)
+        store.set_file_exports('shared', filename, {f"glb_{worker}_{i}": str(i)})
+        store.touch('shared')
+
+
+def _claim(path, worker, results):
+    store = SQLiteStore(path)
+    store.register_worker(worker, worker)
+    results.put(store.claim_project('contested', worker)[0])
+
+
+def test_sqlite_concurrent_writers(tmp_path):
+    path = str(tmp_path / 'state.sqlite')
+    SQLiteStore(path).load_project('shared')
+    ctx = multiprocessing.get_context('spawn')
+
+    workers = [f"w{i}" for i in range(4)]
+    procs = [ctx.Process(target=_write_exports, args=(path, w, 50)) for w in workers]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+
+    store = SQLiteStore(path)
+    # Every read-modify-write was atomic: each file holds exactly its last export
+    assert store.get_exports('shared') == {f"{w}.py": [f"glb_{w}_49"] for w in workers}
+    assert store.get_globals('shared') == {f"glb_{w}_49": '49' for w in workers}
+
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_claim, args=(path, w, results)) for w in workers]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+    owners = {results.get(timeout=5) for _ in workers}
+    assert len(owners) == 1 # Every process agrees on one owner
+    assert store.owned_projects(owners.pop()) == ['contested']
@@ -0,0 +1,65 @@
+import pytest
+
+from compas_studio_online.sweeps import SweepError, expand_plan, parse_parameters, substitute
+
+CODE = """count = 3 # range(1, 4)
+size = 0.5 # range(0, 1)
+mode = 'a' # switch('a', 'b')
+print(count, size, mode)
+"""
+
+
+@pytest.fixture
+def params():
+    return parse_parameters(CODE)
+
+
+def test_parse_parameters(params):
+    assert params['count'] == {"kind": "range", "line": 0, "min": 1.0, "max": 4.0, "integer": True, "default": 3.0}
+    assert params['size']['integer'] is False
+    assert params['mode']['options'] == ["'a'", "'b'"]
+
+
+def test_grid(params):
+    variants = expand_plan(params, {"grid": {"count": "all", "size": {"steps": 3}, "mode": None}})
+    assert len(variants) == 4 * 3 * 2
+    assert {v['count'] for v in variants} == {1, 2, 3, 4}
+    assert sorted({v['size'] for v in variants}) == [0.0, 0.5, 1.0]
+    assert {v['mode'] for v in variants} == {"'a'", "'b'"}
+    assert expand_plan(params, {"grid": {"count": [2, 3]}}) == [{"count": 2}, {"count": 3}]
+
+
+def test_samples(params):
+    plan = {"samples": 10, "seed": 7, "parameters": ["size", "mode"]}
+    variants = expand_plan(params, plan)
+    assert variants == expand_plan(params, plan) # Seeded
+    assert len(variants) == 10
+    # Latin hypercube: one sample in each tenth of the range
+    assert sorted(int(v['size'] * 10) for v in variants) == list(range(10))
+    assert all(v['mode'] in ("'a'", "'b'") for v in variants)
+
+
+@pytest.mark.parametrize('plan', [
+    {},
+    {"grid": {"unknown": "all"}},
+    {"grid": {"size": {"steps": "many"}}},
+    {"grid": {"mode": {"steps": 2}}},
+    {"grid": ["size"]},
+    {"samples": "ten"},
+    {"samples": None},
+    {"samples": 3, "parameters": ["unknown"]},
+    {"samples": 10 ** 9},
+])
+def test_invalid_plans(params, plan):
+    with pytest.raises(SweepError):
+        expand_plan(params, plan)
+
+
+def test_substitute(params):
+    code = substitute(CODE, params, {"count": 2.4, "size": 0.25, "mode": "'b'"})
+    assert code.splitlines()[:3] == [
+        "count = 2 # range(1, 4)",
+        "size = 0.25 # range(0, 1)",
+        "mode = 'b' # switch('a', 'b')",
+    ]
+    assert parse_parameters(code).keys() == params.keys()